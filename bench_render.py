@@ -0,0 +1,105 @@
+"""Micro-benchmark: filas crudas + format_results original frente a TransactionRow + renderizado por partes.
+
+Uso:
+    python bench_render.py [filas]
+"""
+import random
+import sys
+import timeit
+from decimal import Decimal
+from itertools import islice
+
+from config.settings import Config
+from bot.render import chunk_messages, render_rows
+from bot.rows import TransactionRow
+from utils.helpers import deep_sizeof, format_bytes
+
+ESTADOS = ['Compra Vigente', 'Compra Rechazada Fondos insuficientes', 'Pago Anulado', 'Pago Reversado']
+
+
+def raw_rows(n, seed=7):
+    """Filas como las devuelve pyodbc: cadenas nuevas por fila y Decimal para el valor"""
+    rnd = random.Random(seed)
+    return [
+        (
+            ''.join(['KFC', '004']),
+            str(rnd.choice([13356886, 46913810, 55120931])),
+            ''.join(['19/10/', '2026']),
+            ''.join(rnd.choice(ESTADOS)),
+            str(100000 + i),
+            f"{rnd.randrange(10**6):06d}",
+            Decimal(f"{rnd.uniform(1, 80):.2f}"),
+        )
+        for i in range(n)
+    ]
+
+
+def legacy_format_results(results):
+    """format_results anterior: un f-string por fila con float(valor) y el mensaje completo en memoria"""
+    if not results:
+        return "❌ No se encontraron transacciones con los criterios especificados."
+
+    formatted_results = []
+    for row in results:
+        codigo_comercio, tid_red, fecha, estado, referencia, autorizacion, valor = row
+
+        formatted_result = f"""
+🏪 **Local:** {codigo_comercio}
+🆔 **TID:** {tid_red}
+📅 **Fecha:** {fecha}
+📊 **Estado:** {estado}
+🔢 **Referencia:** {referencia}
+✅ **Autorización:** {autorizacion}
+💰 **Valor:** ${float(valor) if valor else 0:,.2f}
+{'-' * 30}
+            """
+        formatted_results.append(formatted_result)
+
+    return "\n".join(formatted_results)
+
+
+def legacy_response(results):
+    return f"""
+📊 **Resultados de la Consulta**
+
+{legacy_format_results(results)}
+
+🔄 ¿Quieres hacer otra consulta? Usa /start
+            """
+
+
+def streaming_response(rows):
+    return list(chunk_messages(render_rows(rows), "📊 **Resultados de la Consulta**\n",
+                               "🔄 ¿Quieres hacer otra consulta? Usa /start"))
+
+
+def bench(nombre, fn, repeticiones=5):
+    mejor = min(timeit.repeat(fn, number=1, repeat=repeticiones))
+    print(f"  {nombre:<40} {mejor * 1000:8.2f} ms")
+    return mejor
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    raw = raw_rows(n)
+    compact = [TransactionRow.from_db(row) for row in raw]
+
+    print(f"📏 Memoria de {n:,} filas en caché")
+    print(f"  {'tuplas crudas (Decimal)':<40} {format_bytes(deep_sizeof(raw)):>11}")
+    print(f"  {'TransactionRow (centavos, internadas)':<40} {format_bytes(deep_sizeof(compact)):>11}")
+
+    print(f"\n⏱️ Renderizado de {n:,} filas (mejor de 5)")
+    bench("format_results original", lambda: legacy_response(raw))
+    bench("conversión a TransactionRow", lambda: [TransactionRow.from_db(row) for row in raw])
+    bench("render_rows + chunk_messages", lambda: streaming_response(compact))
+    bench("primer mensaje (streaming)", lambda: next(chunk_messages(render_rows(compact))))
+    bench(f"{Config.RESULTADOS_MAX_FILAS} filas mostradas (como el bot)",
+          lambda: streaming_response(islice(compact, Config.RESULTADOS_MAX_FILAS)))
+
+    mensajes = streaming_response(compact)
+    print(f"\n✉️ {len(mensajes)} mensajes de hasta {max(len(m) for m in mensajes):,} caracteres "
+          f"(original: un único mensaje de {len(legacy_response(raw)):,})")
+
+
+if __name__ == '__main__':
+    main()
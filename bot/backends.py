@@ -0,0 +1,155 @@
+import re
+import sqlite3
+
+from config.settings import Config
+
+# Mensajes de sqlite3.OperationalError que indican un problema del archivo y no de la consulta
+_SQLITE_CONNECTION_ERRORS = ('unable to open', 'database is locked', 'disk i/o', 'not a database', 'malformed')
+
+# Traducción de las construcciones de SQL Server usadas por DatabaseManager al dialecto de SQLite.
+# Así las pruebas locales ejecutan exactamente el mismo texto SQL que producción.
+_SQLITE_REWRITES = [
+    (re.compile(r"\s+WITH\s*\(NOLOCK\)", re.IGNORECASE), ""),
+    (re.compile(r"FORMAT\(\s*CONVERT\(\s*date\s*,\s*([\w.]+)\s*,\s*112\s*\)\s*,\s*'dd/MM/yyyy'\s*\)",
+                re.IGNORECASE), r"strftime('%d/%m/%Y', \1)"),
+    (re.compile(r"CONVERT\(\s*varchar\s*,\s*([\w.]+)\s*,\s*112\s*\)", re.IGNORECASE), r"strftime('%Y%m%d', \1)"),
+    (re.compile(r"\bSUBSTRING\(", re.IGNORECASE), "substr("),
+    (re.compile(r"('[^']*')\s*\+\s*"), r"\1 || "),
+]
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS TB_MENSAJE_02 (
+    idExterno TEXT PRIMARY KEY,
+    descripcion TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS TB_LOG_TRANSACCION (
+    Id_Log INTEGER PRIMARY KEY,
+    Merchantid TEXT NOT NULL,
+    tid_red TEXT NOT NULL,
+    Fecha_Transaccion TEXT NOT NULL,
+    tipo_transaccion TEXT NOT NULL,
+    estado INTEGER NOT NULL,
+    Resultado_Externo TEXT NOT NULL,
+    numero_referencia TEXT NOT NULL,
+    Numero_Autorizacion TEXT,
+    Face_Value NUMERIC
+);
+"""
+
+SQLITE_INDEXES = """
+CREATE INDEX IF NOT EXISTS ix_log_merchant_fecha ON TB_LOG_TRANSACCION (Merchantid, Fecha_Transaccion);
+CREATE INDEX IF NOT EXISTS ix_log_referencia ON TB_LOG_TRANSACCION (numero_referencia);
+CREATE INDEX IF NOT EXISTS ix_log_autorizacion ON TB_LOG_TRANSACCION (Numero_Autorizacion);
+"""
+
+
+def to_sqlite(query):
+    """Adapta una consulta escrita para SQL Server al dialecto de SQLite"""
+    for pattern, replacement in _SQLITE_REWRITES:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+class SQLServerBackend:
+    """Backend de producción: SQL Server mediante ODBC Driver 17"""
+
+    name = 'sqlserver'
+
+    def __init__(self, server=None):
+        self.server = server or Config.DB_SERVER
+        self.connection_string = (
+            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+            f"SERVER={self.server};"
+            f"DATABASE={Config.DB_NAME};"
+            f"UID={Config.DB_USER};"
+            f"PWD={Config.DB_PASSWORD};"
+            f"Trusted_Connection=no;"
+        )
+
+    def connect(self):
+        """Abre una conexión; pyodbc se importa aquí para no cargarlo al iniciar el bot"""
+        import pyodbc
+        return pyodbc.connect(self.connection_string, timeout=Config.DB_CONNECT_TIMEOUT)
+
+    def describe(self):
+        return f"SQL Server {self.server}/{Config.DB_NAME}"
+
+    @staticmethod
+    def is_connection_error(error):
+        """Fallos de conexión o tiempo de espera (SQLSTATE 08xxx, HYT00...); no errores del SQL"""
+        import pyodbc
+        return isinstance(error, (pyodbc.OperationalError, pyodbc.InterfaceError))
+
+
+class _SQLiteCursor:
+    """Cursor de sqlite3 con la interfaz usada por DatabaseManager (incluido cancel())"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn.cursor()
+
+    def execute(self, query, params=()):
+        self._cursor.execute(to_sqlite(query), params)
+        return self
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def cancel(self):
+        # Equivalente a cursor.cancel() de pyodbc: interrumpe la sentencia desde otro hilo
+        self._conn.interrupt()
+
+
+class _SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _SQLiteCursor(self._conn)
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteBackend:
+    """Base local con los esquemas de TB_LOG_TRANSACCION y TB_MENSAJE_02 para pruebas y mediciones"""
+
+    name = 'sqlite'
+
+    def __init__(self, path=None):
+        self.path = path or Config.DB_SQLITE_PATH
+
+    def connect(self):
+        # El pool entrega la conexión a distintos hilos de asyncio.to_thread
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=Config.DB_CONNECT_TIMEOUT,
+                               check_same_thread=False)
+        return _SQLiteConnection(conn)
+
+    def describe(self):
+        return f"SQLite {self.path}"
+
+    @staticmethod
+    def is_connection_error(error):
+        """sqlite3 usa OperationalError también para errores del SQL: se distinguen por el mensaje"""
+        if isinstance(error, sqlite3.InterfaceError):
+            return True
+        return isinstance(error, sqlite3.OperationalError) and any(
+            texto in str(error).lower() for texto in _SQLITE_CONNECTION_ERRORS
+        )
+
+
+BACKENDS = {
+    SQLServerBackend.name: SQLServerBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
+def get_backend(name=None, target=None):
+    """Crea el backend configurado en DB_BACKEND; target es el servidor (o archivo SQLite) a usar"""
+    name = (name or Config.DB_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"DB_BACKEND desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+    return BACKENDS[name](target)
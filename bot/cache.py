@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from config.settings import Config
+
+
+class ResultCache:
+    """Caché en memoria de resultados de consultas con expiración y límite de tamaño"""
+
+    def __init__(self, max_entries=None, ttl=None, ttl_hoy=None):
+        self.max_entries = max_entries or Config.RESULT_CACHE_MAX_ENTRIES
+        self.ttl = ttl or Config.RESULT_CACHE_TTL
+        self.ttl_hoy = ttl_hoy or Config.RESULT_CACHE_TTL_HOY
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(local, fecha, referencia=None, autorizacion=None):
+        """Construye la clave de caché a partir de los parámetros de la consulta"""
+        return (local.upper(), fecha, referencia or None, autorizacion or None)
+
+    def _ttl_for(self, key):
+        """Las consultas del día en curso caducan antes que las de días cerrados"""
+        if key[1] == datetime.now().strftime("%Y%m%d"):
+            return self.ttl_hoy
+        return self.ttl
+
+    def get(self, key):
+        """Devuelve el valor si existe y no ha expirado, o None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at, ttl = entry
+            if time.monotonic() - stored_at > ttl:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key, max_age=None):
+        """Devuelve (valor, antigüedad en segundos) aunque haya expirado, o None"""
+        max_age = max_age or Config.RESULT_CACHE_STALE_MAX
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, stored_at, _ = entry
+            age = time.monotonic() - stored_at
+            if age > max_age:
+                return None
+            return value, age
+
+    def set(self, key, value):
+        """Guarda un valor, desalojando las entradas menos usadas si se supera el límite"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic(), self._ttl_for(key))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Elimina una entrada de la caché"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def memory_objects(self):
+        """(entradas, objeto a medir) para el reporte de memoria"""
+        return len(self._entries), self._entries
+
+    def stats(self):
+        """Estadísticas básicas de uso de la caché"""
+        return {
+            'entradas': len(self._entries),
+            'aciertos': self.hits,
+            'fallos': self.misses,
+        }
+
+
+# Instancia global de la caché de resultados
+result_cache = ResultCache()
@@ -0,0 +1,126 @@
+import bisect
+import difflib
+import threading
+import time
+
+from config.settings import Config
+from utils.logger import logger
+
+
+class MerchantCatalog:
+    """Índice en memoria de los locales válidos, refrescado periódicamente en segundo plano"""
+
+    def __init__(self, loader=None, refresh_seconds=None):
+        self._loader = loader
+        self.refresh_seconds = refresh_seconds or Config.CATALOG_REFRESH_SECONDS
+        self._locales = frozenset()
+        self._ordenados = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.loaded_at = None
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def refresh(self):
+        """Recarga el catálogo; si falla se conserva la versión anterior"""
+        if self._loader is None:
+            logger.logger.error("Catálogo de locales sin función de carga")
+            return False
+        try:
+            locales = {str(local).strip().upper() for local in self._loader() if local}
+        except Exception as e:
+            logger.logger.error(f"Error cargando catálogo de locales: {e}")
+            return False
+
+        ordenados = sorted(locales)
+        with self._lock:
+            self._locales = frozenset(locales)
+            self._ordenados = ordenados
+            self.loaded_at = time.time()
+
+        logger.logger.info(f"Catálogo de locales actualizado: {len(ordenados)} locales")
+        return True
+
+    def start(self, loader=None):
+        """Carga el catálogo y lo refresca periódicamente en un hilo en segundo plano.
+
+        loader devuelve los códigos de local; normalmente fetch_merchant_ids del DatabaseManager
+        compartido, para usar sus conexiones, circuit breaker y réplicas.
+        """
+        if loader is not None:
+            self._loader = loader
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="merchant-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_seconds)
+
+    @staticmethod
+    def normalize(text):
+        """Normaliza la entrada del usuario: 'kfc4' o '4' -> 'KFC004'"""
+        text = text.strip().upper().replace(" ", "")
+        digits = text[3:] if text.startswith("KFC") else text
+        if digits.isdigit() and 0 < len(digits) <= 3:
+            return f"KFC{int(digits):03d}"
+        return text
+
+    def __contains__(self, local):
+        return local.strip().upper() in self._locales
+
+    def __len__(self):
+        return len(self._locales)
+
+    def all(self):
+        """Lista ordenada de locales del catálogo"""
+        return list(self._ordenados)
+
+    def suggest(self, text, limit=6):
+        """Sugerencias por prefijo y, si no alcanzan, por similitud"""
+        text = text.strip().upper()
+        ordenados = self._ordenados
+
+        sugerencias = []
+        normalizado = self.normalize(text)
+        if normalizado in self._locales:
+            sugerencias.append(normalizado)
+
+        inicio = bisect.bisect_left(ordenados, text)
+        for local in ordenados[inicio:]:
+            if len(sugerencias) >= limit or not local.startswith(text):
+                break
+            if local not in sugerencias:
+                sugerencias.append(local)
+
+        if len(sugerencias) < limit:
+            for local in difflib.get_close_matches(normalizado, ordenados, n=limit, cutoff=0.6):
+                if local not in sugerencias:
+                    sugerencias.append(local)
+
+        return sugerencias[:limit]
+
+    def memory_objects(self):
+        """(locales, objeto a medir) para el reporte de memoria"""
+        return len(self._locales), (self._locales, self._ordenados)
+
+    def stats(self):
+        return {
+            'locales': len(self._locales),
+            'actualizado': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.loaded_at))
+            if self.loaded_at else None,
+        }
+
+
+# Instancia global del catálogo de locales
+merchant_catalog = MerchantCatalog()
@@ -0,0 +1,80 @@
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+from config.settings import Config
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Procesa en paralelo updates de distintos chats y en orden de llegada los de un mismo chat.
+
+    El semáforo de la clase base limita los updates aceptados (en ejecución o esperando su turno);
+    el límite de ejecución simultánea se aplica después de obtener el turno del chat para que los
+    mensajes en cola de un mismo usuario no ocupen los cupos de los demás.
+    """
+
+    def __init__(self, max_concurrent=None, max_pending=None):
+        self.max_concurrent = max_concurrent or Config.CONCURRENT_UPDATES
+        super().__init__(max(max_pending or Config.UPDATES_MAX_PENDING, self.max_concurrent))
+        self._cupos = asyncio.Semaphore(self.max_concurrent)
+        # clave del chat -> [lock, updates esperando o en ejecución]
+        self._chats = {}
+        self.running = 0
+        self.waiting = 0
+        self.processed = 0
+
+    @staticmethod
+    def _clave(update):
+        """Chat del update; las consultas inline (sin chat) se ordenan por usuario"""
+        if getattr(update, 'effective_chat', None) is not None:
+            return update.effective_chat.id
+        if getattr(update, 'effective_user', None) is not None:
+            return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        clave = self._clave(update)
+        if clave is None:
+            await self._ejecutar(coroutine)
+            return
+
+        entrada = self._chats.setdefault(clave, [asyncio.Lock(), 0])
+        entrada[1] += 1
+        try:
+            async with entrada[0]:
+                await self._ejecutar(coroutine)
+        finally:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                del self._chats[clave]
+
+    async def _ejecutar(self, coroutine):
+        self.waiting += 1
+        try:
+            await self._cupos.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            await coroutine
+        finally:
+            self.running -= 1
+            self.processed += 1
+            self._cupos.release()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self):
+        return {
+            'en_ejecucion': self.running,
+            # Esperando cupo más los que esperan el turno de su chat
+            'en_espera': self.waiting + sum(n - 1 for lock, n in self._chats.values() if lock.locked()),
+            'chats_activos': len(self._chats),
+            'limite': self.max_concurrent,
+            'procesados': self.processed,
+        }
@@ -1,34 +1,192 @@
-import pyodbc
+import threading
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Importaciones corregidas
 from config.settings import Config
+from bot.backends import get_backend
+from bot.render import SIN_RESULTADOS, render_rows
+from bot.resilience import CircuitOpenError
+from bot.routing import Endpoint, EndpointRouter, parse_endpoints
+from bot.rows import TransactionRow
+from bot.summary import dia_cerrado
 from utils.logger import logger
 
 
-class DatabaseManager:
-    def __init__(self):
-        self.connection_string = self._build_connection_string()
-
-    def _build_connection_string(self):
-        """Construye la cadena de conexión para SQL Server"""
-        return (
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={Config.DB_SERVER};"
-            f"DATABASE={Config.DB_NAME};"
-            f"UID={Config.DB_USER};"
-            f"PWD={Config.DB_PASSWORD};"
-            f"Trusted_Connection=no;"
+class QueryCancelledError(Exception):
+    """La consulta fue cancelada por el usuario o por superar su tiempo máximo"""
+
+    def __init__(self, reason):
+        super().__init__(
+            "La consulta superó el tiempo máximo" if reason == QueryHandle.DEADLINE else "Consulta cancelada"
         )
+        self.reason = reason
+
+
+class QueryHandle:
+    """Referencia a una consulta en curso que puede cancelarse desde otro hilo"""
+
+    USUARIO = 'usuario'
+    DEADLINE = 'deadline'
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.cursor = None
+        self.cancelled = False
+        self.reason = None
+        self._lock = threading.Lock()
+
+    def attach(self, cursor):
+        """Asocia el cursor; devuelve False si la consulta ya fue cancelada"""
+        with self._lock:
+            self.cursor = cursor
+            return not self.cancelled
+
+    def cancel(self, reason=USUARIO):
+        """Cancela la sentencia en SQL Server con cursor.cancel()"""
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            self.reason = reason
+            cursor = self.cursor
+
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except Exception as e:
+                logger.logger.warning(f"No se pudo cancelar la consulta: {e}")
+
+
+def _rango_dia(fecha):
+    """[inicio, fin) del día YYYYMMDD para comparar Fecha_Transaccion sin convertirla"""
+    inicio = datetime.strptime(fecha, "%Y%m%d")
+    return inicio, inicio + timedelta(days=1)
+
+
+class DatabaseManager:
+    def __init__(self, backend=None, replicas=None):
+        # SQL Server en producción o la base SQLite local de pruebas (DB_BACKEND)
+        self.backend = backend or get_backend()
+        if replicas is None:
+            replicas = [
+                Endpoint(destino, get_backend(target=destino), weight=peso)
+                for destino, peso in parse_endpoints(Config.DB_READ_REPLICAS)
+            ]
+        # Días cerrados a las réplicas y el día en curso al primario
+        self.router = EndpointRouter(Endpoint('primario', self.backend, primary=True), replicas)
+        self.breaker = self.router.primary.breaker
+        self.pool = self.router.primary.pool
+        # owner -> consultas en curso de ese usuario/tarea
+        self._running = {}
+        self._running_lock = threading.Lock()
+
+    def cancel_owner(self, owner):
+        """Cancela todas las consultas en curso de un usuario (p. ej. al usar /cancel)"""
+        with self._running_lock:
+            handles = list(self._running.get(owner, ()))
+        for handle in handles:
+            handle.cancel()
+        return len(handles)
+
+    def running_queries(self):
+        with self._running_lock:
+            return sum(len(handles) for handles in self._running.values())
+
+    def _run(self, query, params, owner=None, deadline=None, historico=False):
+        """Ejecuta la consulta en el endpoint elegido por el router.
+
+        Con historico=True puede atenderla una réplica; si la réplica falla por conexión se reintenta
+        una vez en otro servidor. Cada endpoint registra sus éxitos y fallos en su circuit breaker.
+        """
+        endpoint = self.router.acquire(historico)
+        try:
+            return self._run_on(endpoint, query, params, owner, deadline)
+        except Exception as e:
+            # Un error del SQL fallaría igual en otro servidor: solo se reintentan fallos de conexión
+            if endpoint.primary or not endpoint.backend.is_connection_error(e):
+                raise
+            logger.logger.warning(f"Réplica {endpoint.name} falló ({e}); reintentando en otro servidor")
+            try:
+                retry = self.router.acquire(historico, exclude=(endpoint,))
+            except CircuitOpenError:
+                raise e
+            return self._run_on(retry, query, params, owner, deadline)
+
+    def _run_on(self, endpoint, query, params, owner, deadline):
+        """Ejecuta una consulta con una conexión del pool del endpoint, cancelable y con tiempo máximo"""
+        handle = QueryHandle(owner)
+        with self._running_lock:
+            self._running.setdefault(owner, set()).add(handle)
+
+        timer = threading.Timer(deadline or Config.DB_QUERY_TIMEOUT, handle.cancel, args=(QueryHandle.DEADLINE,))
+        timer.daemon = True
+        conn = None
+        discard = False
+
+        try:
+            conn = endpoint.pool.acquire()
+            cursor = conn.cursor()
+            if not handle.attach(cursor):
+                raise QueryCancelledError(handle.reason)
+
+            timer.start()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            endpoint.breaker.record_success()
+            return rows
+
+        except QueryCancelledError as e:
+            self._record_error(endpoint, e)
+            raise
+        except Exception as e:
+            if handle.cancelled:
+                # La conexión sigue siendo válida: se devuelve al pool tras el rollback
+                error = QueryCancelledError(handle.reason)
+                self._record_error(endpoint, error)
+                raise error from e
+            # Solo los fallos de conexión o de tiempo de espera abren el circuito; un error del SQL
+            # (columna inexistente, parámetro inválido) no dice nada de la salud del servidor
+            if endpoint.backend.is_connection_error(e):
+                discard = True
+                endpoint.breaker.record_failure()
+            else:
+                endpoint.breaker.record_cancelled()
+            raise
+
+        finally:
+            timer.cancel()
+            with self._running_lock:
+                handles = self._running.get(owner)
+                handles.discard(handle)
+                if not handles:
+                    del self._running[owner]
+            if conn is not None:
+                endpoint.pool.release(conn, discard=discard)
+            self.router.release(endpoint)
+
+    @staticmethod
+    def _record_error(endpoint, error):
+        # Una cancelación del usuario no indica un fallo del servidor; superar el tiempo máximo sí
+        if error.reason == QueryHandle.USUARIO:
+            endpoint.breaker.record_cancelled()
+        else:
+            endpoint.breaker.record_failure()
 
-    def execute_query(self, merchant_id, fecha_transaccion, numero_referencia=None, numero_autorizacion=None):
-        """Ejecuta la consulta SQL con los parámetros proporcionados"""
+    def execute_query(self, merchant_id, fecha_transaccion, numero_referencia=None, numero_autorizacion=None,
+                      owner=None, deadline=None, registrar=True):
+        """Ejecuta la consulta SQL con los parámetros proporcionados.
+
+        owner identifica al usuario para poder cancelar la consulta con cancel_owner();
+        deadline (segundos) limita su duración, por defecto DB_QUERY_TIMEOUT; con registrar=False
+        la conexión no se anota en el log ni en el CSV de reportes (precargas especulativas).
+        """
         connection_id = str(uuid.uuid4())
 
         try:
             # Log de conexión
-            logger.log_connection("telegram_user", merchant_id, fecha_transaccion, connection_id, "attempt")
+            if registrar:
+                logger.log_connection("telegram_user", merchant_id, fecha_transaccion, connection_id, "attempt")
 
             # Construir merchantid completo
             merchantid_completo = f"000000{merchant_id}"
@@ -38,97 +196,217 @@ class DatabaseManager:
 
             print(f"🔍 Ejecutando consulta para local: {merchantid_completo}, fecha: {fecha_sql}")
 
-            # Conectar a la base de datos
-            with pyodbc.connect(self.connection_string) as conn:
-                cursor = conn.cursor()
-
-                # Construir consulta base
-                query = """
-                SELECT 
-                    SUBSTRING(t.Merchantid, 7, 6) AS Codigo_Comercio,
-                    t.tid_red,
-                    FORMAT(CONVERT(date, t.Fecha_Transaccion, 112), 'dd/MM/yyyy') AS Fecha,
-                    MAX(CASE 
-                            WHEN t.tipo_transaccion = '01' AND t.estado = 0 AND Resultado_Externo = '00'  
-                                THEN 'Compra Vigente'
-                            WHEN t.tipo_transaccion = '01' AND t.estado = 0 AND Resultado_Externo != '00'  
-                                THEN 'Compra Rechazada ' + m.descripcion
-                            WHEN t.tipo_transaccion = '01' AND t.estado = 1 
-                                THEN 'Pago Anulado'
-                            WHEN t.tipo_transaccion = '01' AND t.estado = 2 
-                                THEN 'Pago Reversado'
-                        END) AS estado_transaccion,
-                    t.numero_referencia,
-                    COALESCE(MAX(CASE WHEN t.tipo_transaccion = '01' THEN t.Numero_Autorizacion END), 
-                             MAX(t.Numero_Autorizacion)) AS Numero_Autorizacion_Final,  	
-                    max(t.Face_Value) as Valor 
-                FROM TB_LOG_TRANSACCION t WITH (NOLOCK)
-                INNER JOIN TB_MENSAJE_02 m ON m.idExterno = t.Resultado_Externo
-                WHERE t.Merchantid = ?
-                AND CONVERT(varchar, t.Fecha_Transaccion, 112) = ?
-                """
-
-                params = [merchantid_completo, fecha_sql]
-
-                # Agregar filtros opcionales
-                if numero_referencia:
-                    query += " AND t.numero_referencia = ?"
-                    params.append(numero_referencia)
-
-                if numero_autorizacion:
-                    query += " AND (t.Numero_Autorizacion = ? OR EXISTS (SELECT 1 FROM TB_LOG_TRANSACCION t2 WHERE t2.Numero_Autorizacion = ? AND t2.numero_referencia = t.numero_referencia))"
-                    params.extend([numero_autorizacion, numero_autorizacion])
-
-                # Agregar GROUP BY y ORDER BY
-                query += """
-                GROUP BY 
-                    SUBSTRING(t.Merchantid, 7, 6), 
-                    t.tid_red, 
-                    FORMAT(CONVERT(date, t.Fecha_Transaccion, 112), 'dd/MM/yyyy'),
-                    t.numero_referencia
-                ORDER BY FORMAT(CONVERT(date, t.Fecha_Transaccion, 112), 'dd/MM/yyyy')
-                """
-
-                print(f"📊 Ejecutando consulta SQL...")
-                # Ejecutar consulta
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-
-                print(f"✅ Consulta exitosa. Resultados: {len(results)}")
-
-                # Log de consulta exitosa
+            # Construir consulta base
+            query = """
+            SELECT 
+                SUBSTRING(t.Merchantid, 7, 6) AS Codigo_Comercio,
+                t.tid_red,
+                FORMAT(CONVERT(date, t.Fecha_Transaccion, 112), 'dd/MM/yyyy') AS Fecha,
+                MAX(CASE 
+                        WHEN t.tipo_transaccion = '01' AND t.estado = 0 AND Resultado_Externo = '00'  
+                            THEN 'Compra Vigente'
+                        WHEN t.tipo_transaccion = '01' AND t.estado = 0 AND Resultado_Externo != '00'  
+                            THEN 'Compra Rechazada ' + m.descripcion
+                        WHEN t.tipo_transaccion = '01' AND t.estado = 1 
+                            THEN 'Pago Anulado'
+                        WHEN t.tipo_transaccion = '01' AND t.estado = 2 
+                            THEN 'Pago Reversado'
+                    END) AS estado_transaccion,
+                t.numero_referencia,
+                COALESCE(MAX(CASE WHEN t.tipo_transaccion = '01' THEN t.Numero_Autorizacion END), 
+                         MAX(t.Numero_Autorizacion)) AS Numero_Autorizacion_Final,  	
+                max(t.Face_Value) as Valor 
+            FROM TB_LOG_TRANSACCION t WITH (NOLOCK)
+            INNER JOIN TB_MENSAJE_02 m ON m.idExterno = t.Resultado_Externo
+            WHERE t.Merchantid = ?
+            AND CONVERT(varchar, t.Fecha_Transaccion, 112) = ?
+            """
+
+            params = [merchantid_completo, fecha_sql]
+
+            # Agregar filtros opcionales
+            if numero_referencia:
+                query += " AND t.numero_referencia = ?"
+                params.append(numero_referencia)
+
+            if numero_autorizacion:
+                query += " AND (t.Numero_Autorizacion = ? OR EXISTS (SELECT 1 FROM TB_LOG_TRANSACCION t2 WHERE t2.Numero_Autorizacion = ? AND t2.numero_referencia = t.numero_referencia))"
+                params.extend([numero_autorizacion, numero_autorizacion])
+
+            # Agregar GROUP BY y ORDER BY
+            query += """
+            GROUP BY 
+                SUBSTRING(t.Merchantid, 7, 6), 
+                t.tid_red, 
+                FORMAT(CONVERT(date, t.Fecha_Transaccion, 112), 'dd/MM/yyyy'),
+                t.numero_referencia
+            ORDER BY FORMAT(CONVERT(date, t.Fecha_Transaccion, 112), 'dd/MM/yyyy')
+            """
+
+            print(f"📊 Ejecutando consulta SQL...")
+            # Ejecutar consulta (conexión del pool, cancelable)
+            # Los días cerrados pueden atenderse desde una réplica
+            rows = self._run(query, params, owner=owner, deadline=deadline,
+                             historico=dia_cerrado(fecha_sql))
+            # Filas compactas (tuplas con el valor en centavos) para la caché y el renderizado
+            results = [TransactionRow.from_db(row) for row in rows]
+
+            print(f"✅ Consulta exitosa. Resultados: {len(results)}")
+
+            # Log de consulta exitosa
+            if registrar:
                 logger.log_connection("telegram_user", merchant_id, fecha_transaccion, connection_id, "success")
                 logger.log_query("telegram_user", merchant_id, fecha_transaccion, numero_referencia,
                                  numero_autorizacion)
 
-                return results, connection_id
+            return results, connection_id
 
         except Exception as e:
             # Log de error
             error_msg = f"❌ Error en consulta: {str(e)}"
             print(error_msg)
-            logger.log_connection("telegram_user", merchant_id, fecha_transaccion, connection_id, f"error: {str(e)}")
+            if registrar:
+                logger.log_connection("telegram_user", merchant_id, fecha_transaccion, connection_id,
+                                      f"error: {str(e)}")
             raise e
 
+    def execute_summary(self, merchant_id, fecha_transaccion, owner=None, deadline=None):
+        """Cantidad y total por estado y TID de un local y día en una sola consulta agregada.
+
+        Usa el mismo CASE que execute_query (sin el motivo del rechazo) sobre cada referencia.
+        """
+
+        query = """
+        SELECT r.estado_transaccion, r.tid_red, COUNT(*) AS Cantidad, SUM(r.Valor) AS Total
+        FROM (
+            SELECT
+                t.tid_red,
+                t.numero_referencia,
+                MAX(CASE
+                        WHEN t.tipo_transaccion = '01' AND t.estado = 0 AND Resultado_Externo = '00'
+                            THEN 'Compra Vigente'
+                        WHEN t.tipo_transaccion = '01' AND t.estado = 0 AND Resultado_Externo != '00'
+                            THEN 'Compra Rechazada'
+                        WHEN t.tipo_transaccion = '01' AND t.estado = 1
+                            THEN 'Pago Anulado'
+                        WHEN t.tipo_transaccion = '01' AND t.estado = 2
+                            THEN 'Pago Reversado'
+                    END) AS estado_transaccion,
+                MAX(t.Face_Value) AS Valor
+            FROM TB_LOG_TRANSACCION t WITH (NOLOCK)
+            INNER JOIN TB_MENSAJE_02 m ON m.idExterno = t.Resultado_Externo
+            WHERE t.Merchantid = ?
+            AND CONVERT(varchar, t.Fecha_Transaccion, 112) = ?
+            GROUP BY t.tid_red, t.numero_referencia
+        ) r
+        GROUP BY r.estado_transaccion, r.tid_red
+        ORDER BY r.estado_transaccion, r.tid_red
+        """
+
+        fecha_sql = fecha_transaccion.replace("/", "")
+        rows = self._run(query, [f"000000{merchant_id}", fecha_sql], owner=owner, deadline=deadline,
+                         historico=dia_cerrado(fecha_sql))
+        logger.log_query("telegram_user", merchant_id, fecha_transaccion, None, None)
+        return rows
+
+    def _fetch_filas(self, condicion, params, columna, owner):
+        """Filas individuales (sin agrupar) que cumplen la condición; ver bot.watch.WatchRow"""
+        query = f"""
+        SELECT
+            SUBSTRING(t.Merchantid, 7, 6) AS Codigo_Comercio,
+            t.tid_red,
+            FORMAT(CONVERT(date, t.Fecha_Transaccion, 112), 'dd/MM/yyyy') AS Fecha,
+            CONVERT(varchar, t.Fecha_Transaccion, 112) AS Fecha_Sql,
+            CASE
+                WHEN t.tipo_transaccion = '01' AND t.estado = 0 AND Resultado_Externo = '00'
+                    THEN 'Compra Vigente'
+                WHEN t.tipo_transaccion = '01' AND t.estado = 0 AND Resultado_Externo != '00'
+                    THEN 'Compra Rechazada ' + m.descripcion
+                WHEN t.tipo_transaccion = '01' AND t.estado = 1
+                    THEN 'Pago Anulado'
+                WHEN t.tipo_transaccion = '01' AND t.estado = 2
+                    THEN 'Pago Reversado'
+            END AS estado_transaccion,
+            t.tipo_transaccion,
+            t.numero_referencia,
+            t.Numero_Autorizacion,
+            t.Face_Value,
+            t.{columna} AS Marca
+        FROM TB_LOG_TRANSACCION t WITH (NOLOCK)
+        INNER JOIN TB_MENSAJE_02 m ON m.idExterno = t.Resultado_Externo
+        WHERE {condicion}
+        """
+        # Siempre en el primario: se buscan datos recientes
+        return self._run(query, params, owner=owner)
+
+    def fetch_changes(self, columna, desde, locales, fecha=None, owner='espejo'):
+        """Filas individuales de los locales indicados con marca >= desde (todas si desde es None).
+
+        Una sola consulta para todos los locales del espejo del día (fecha YYYYMMDD); el agrupado
+        por referencia lo hace quien llama con el mismo MAX que execute_query.
+        """
+        condicion = f"t.Merchantid IN ({', '.join('?' * len(locales))})"
+        params = [f"000000{local}" for local in locales]
+
+        if fecha is not None:
+            condicion += " AND CONVERT(varchar, t.Fecha_Transaccion, 112) = ?"
+            params.append(fecha)
+        if desde is not None:
+            condicion += f" AND t.{columna} >= ?"
+            params.append(desde)
+
+        return self._fetch_filas(condicion, params, columna, owner)
+
+    def fetch_watched(self, busquedas, encontradas, owner='vigilancia'):
+        """Filas individuales de las transacciones vigiladas, en una sola consulta para todas las vigilancias.
+
+        busquedas: (local, fecha YYYYMMDD, referencia, autorización) de las vigilancias que aún no
+        encontraron su transacción; encontradas: {(local, fecha): referencias} ya encontradas (un
+        cambio de estado actualiza la fila original sin insertar otra). Cada rama queda acotada a
+        su local y su día, que se compara sin convertir la columna para usar el índice.
+        """
+        ramas = []
+        params = []
+        for local, fecha, referencia, autorizacion in busquedas:
+            rama = "t.Merchantid = ? AND t.Fecha_Transaccion >= ? AND t.Fecha_Transaccion < ?"
+            params.extend([f"000000{local}", *_rango_dia(fecha)])
+            if referencia:
+                rama += " AND t.numero_referencia = ?"
+                params.append(referencia)
+            if autorizacion:
+                rama += " AND t.Numero_Autorizacion = ?"
+                params.append(autorizacion)
+            ramas.append(f"({rama})")
+
+        for (local, fecha), referencias in encontradas.items():
+            ramas.append(
+                "(t.Merchantid = ? AND t.Fecha_Transaccion >= ? AND t.Fecha_Transaccion < ?"
+                f" AND t.numero_referencia IN ({', '.join('?' * len(referencias))}))"
+            )
+            params.extend([f"000000{local}", *_rango_dia(fecha), *referencias])
+
+        if not ramas:
+            return []
+        return self._fetch_filas(" OR ".join(ramas), params, 'Fecha_Transaccion', owner)
+
+    def fetch_merchant_ids(self):
+        """Obtiene los códigos de local con transacciones en los últimos días (catálogo)"""
+        # Medianoche de hoy menos CATALOG_DIAS: la columna se compara sin convertir para usar el índice
+        desde = (datetime.now() - timedelta(days=Config.CATALOG_DIAS)).replace(hour=0, minute=0, second=0,
+                                                                              microsecond=0)
+
+        query = """
+        SELECT DISTINCT SUBSTRING(t.Merchantid, 7, 6) AS Codigo_Comercio
+        FROM TB_LOG_TRANSACCION t WITH (NOLOCK)
+        WHERE t.Fecha_Transaccion >= ?
+        """
+
+        # Consulta de varios días: basta con una réplica
+        rows = self._run(query, [desde], owner='catalogo', historico=True)
+        return [row[0] for row in rows if row[0]]
+
     def format_results(self, results):
         """Formatea los resultados para una respuesta amigable"""
         if not results:
-            return "❌ No se encontraron transacciones con los criterios especificados."
-
-        formatted_results = []
-        for row in results:
-            codigo_comercio, tid_red, fecha, estado, referencia, autorizacion, valor = row
-
-            formatted_result = f"""
-🏪 **Local:** {codigo_comercio}
-🆔 **TID:** {tid_red}
-📅 **Fecha:** {fecha}
-📊 **Estado:** {estado}
-🔢 **Referencia:** {referencia}
-✅ **Autorización:** {autorizacion}
-💰 **Valor:** ${float(valor) if valor else 0:,.2f}
-{'-' * 30}
-            """
-            formatted_results.append(formatted_result)
-
-        return "\n".join(formatted_results)
\ No newline at end of file
+            return SIN_RESULTADOS
+        return "\n".join(render_rows(results))
@@ -1,11 +1,32 @@
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+from telegram import (
+    Update, ReplyKeyboardMarkup, KeyboardButton, InlineQueryResultArticle, InputTextMessageContent
+)
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
 from datetime import datetime, timedelta
+from itertools import islice
+import asyncio
 import re
 import os
 
 # Importaciones absolutas
-from bot.database import DatabaseManager
+from config.settings import Config
+from bot.cache import ResultCache, result_cache
+from bot.catalog import merchant_catalog
+from bot.database import DatabaseManager, QueryCancelledError, QueryHandle
+from bot.mirror import TodayMirror
+from bot.outbox import MessageOutbox
+from bot.prefetch import SpeculativePrefetcher
+from bot.render import SIN_RESULTADOS, chunk_messages, escape_markdown, format_centavos, render_row, render_rows
+from bot.resilience import CircuitOpenError
+from bot.rows import format_centavos
+from bot.subscriptions import TODOS, ReportScheduler, SubscriptionStore
+from bot.summary import dia_cerrado, resumir_filas, resumir_resultados, summary_snapshot
+from bot.watch import TransactionWatcher
+from utils.helpers import (
+    deep_sizeof, format_antiguedad, format_bytes, parse_consulta_inline, parse_fecha, process_rss_bytes
+)
+from utils.log_search import NIVELES, log_searcher
 from utils.logger import logger
 
 # Estados de la conversación
@@ -15,6 +36,54 @@ LOCAL, FECHA, REFERENCIA, AUTORIZACION = range(4)
 class BotHandlers:
     def __init__(self):
         self.db = DatabaseManager()
+        self.cache = result_cache
+        self.prefetcher = SpeculativePrefetcher(self.db, self.cache) if Config.PREFETCH_ENABLED else None
+        # Transacciones de hoy de los locales más consultados, sincronizadas en segundo plano
+        self.mirror = TodayMirror(self.db) if Config.MIRROR_ENABLED else None
+        # Última búsqueda inline pendiente por usuario (para debounce y cancelación)
+        self._inline_tasks = {}
+        # Consulta en curso por usuario (se ejecuta en segundo plano para poder cancelarla)
+        self._consultas = {}
+        # Todos los mensajes salientes pasan por la cola con límite de envío
+        self.outbox = MessageOutbox()
+        self.report_scheduler = ReportScheduler(SubscriptionStore(), self.outbox)
+        # Vigilancias de /vigilar atendidas por una sola consulta periódica
+        self.watcher = TransactionWatcher(self.db, self.outbox)
+
+    def _cancel_prefetch(self, update):
+        """Descarta las precargas especulativas del usuario"""
+        if self.prefetcher is not None and update.effective_user:
+            self.prefetcher.cancel_user(update.effective_user.id)
+
+    def _cancelar_consultas(self, update):
+        """Cancela precargas y la consulta en curso del usuario, incluida la sentencia en SQL Server"""
+        self._cancel_prefetch(update)
+        if not update.effective_user:
+            return
+
+        user_id = update.effective_user.id
+        self.db.cancel_owner(user_id)
+        task = self._consultas.pop(user_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    def _lanzar_consulta(self, update, context):
+        """Ejecuta la consulta en segundo plano para que /cancel y /start puedan detenerla"""
+        user_id = update.effective_user.id
+        # Copia de los datos: /start o /cancel limpian user_data mientras la consulta corre
+        consulta = dict(context.user_data)
+
+        task = context.application.create_task(self._consulta_en_segundo_plano(update, context, consulta),
+                                               update=update)
+        self._consultas[user_id] = task
+
+    async def _consulta_en_segundo_plano(self, update, context, consulta):
+        try:
+            await self.execute_query(update, context, consulta)
+        finally:
+            user_id = update.effective_user.id
+            if self._consultas.get(user_id) is asyncio.current_task():
+                del self._consultas[user_id]
 
     def _create_base_keyboard(self, include_back=True, include_cancel=True):
         """Crea teclado base con botones de navegación"""
@@ -45,10 +114,20 @@ class BotHandlers:
         ]
         return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
 
+    def _create_sugerencias_keyboard(self, sugerencias):
+        """Crea teclado con los locales sugeridos por el catálogo"""
+        keyboard = [
+            [KeyboardButton(local) for local in sugerencias[i:i + 3]]
+            for i in range(0, len(sugerencias), 3)
+        ]
+        keyboard.append([KeyboardButton("❌ Finalizar consulta")])
+        return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mensaje de bienvenida"""
         # Limpiar datos previos
         context.user_data.clear()
+        self._cancelar_consultas(update)
 
         welcome_message = """
 🤖 **Bienvenido al Bot de Consultas KFC** 🍗
@@ -58,7 +137,8 @@ Te ayudaré a consultar el estado de las transacciones de forma sencilla.
 Por favor, ingresa el número de local (ejemplo: kfc004):
         """
 
-        await update.message.reply_text(
+        await self.outbox.reply_text(
+            update,
             welcome_message,
             parse_mode='Markdown',
             reply_markup=self._create_base_keyboard(include_back=False)
@@ -75,9 +155,32 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
 
         local = user_input.upper().strip()
 
+        # Validar contra el catálogo de locales (si ya está cargado)
+        if merchant_catalog.is_loaded:
+            normalizado = merchant_catalog.normalize(local)
+            if normalizado not in merchant_catalog:
+                sugerencias = merchant_catalog.suggest(local)
+                if sugerencias:
+                    await self.outbox.reply_text(
+                        update,
+                        f"❌ El local {local} no existe.\n\n"
+                        "¿Quisiste decir alguno de estos?",
+                        reply_markup=self._create_sugerencias_keyboard(sugerencias)
+                    )
+                else:
+                    await self.outbox.reply_text(
+                        update,
+                        f"❌ El local {local} no existe.\n\n"
+                        "Por favor ingresa un local válido (ejemplo: kfc004):",
+                        reply_markup=self._create_base_keyboard(include_back=False)
+                    )
+                return LOCAL
+            local = normalizado
+
         # Validar formato del local
         if not re.match(r'^KFC\d{3}$', local):
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 "❌ Formato incorrecto. Por favor ingresa el local en el formato: kfc004\n\n"
                 "Ejemplos válidos: kfc001, kfc023, kfc156",
                 reply_markup=self._create_base_keyboard(include_back=False)
@@ -86,7 +189,12 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
 
         context.user_data['local'] = local
 
-        await update.message.reply_text(
+        # La mayoría elige "Hoy" o "Ayer": se adelantan esas consultas
+        if self.prefetcher is not None:
+            self.prefetcher.start(context.application, update.effective_user.id, local)
+
+        await self.outbox.reply_text(
+            update,
             f"🏪 **Local registrado:** {local}\n\n"
             "📅 Ahora selecciona la fecha de la transacción:",
             parse_mode='Markdown',
@@ -100,7 +208,9 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
 
         # Manejar botones de navegación
         if fecha_input == "↩️ Volver atrás":
-            await update.message.reply_text(
+            self._cancel_prefetch(update)
+            await self.outbox.reply_text(
+                update,
                 "↩️ Volviendo al ingreso de local...\n\n"
                 "Por favor, ingresa el número de local (ejemplo: kfc004):",
                 reply_markup=self._create_base_keyboard(include_back=False)
@@ -125,7 +235,8 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
             context.user_data['fecha'] = fecha_str
             context.user_data['fecha_display'] = fecha_display
         elif fecha_input == "📅 Ingresar fecha manual":
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 "📅 Por favor ingresa la fecha en formato **DD/MM/AAAA**\n"
                 "Ejemplo: 27/08/2024",
                 parse_mode='Markdown',
@@ -141,7 +252,8 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
                 context.user_data['fecha'] = fecha_str
                 context.user_data['fecha_display'] = fecha_display
             except ValueError:
-                await update.message.reply_text(
+                await self.outbox.reply_text(
+                    update,
                     "❌ Formato de fecha incorrecto. Usa **DD/MM/AAAA** (ejemplo: 27/08/2024)\n\n"
                     "Por favor ingresa la fecha nuevamente:",
                     parse_mode='Markdown',
@@ -149,7 +261,12 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
                 )
                 return FECHA
 
-        await update.message.reply_text(
+        if self.prefetcher is not None:
+            key = ResultCache.make_key(context.user_data['local'], context.user_data['fecha'])
+            self.prefetcher.keep(update.effective_user.id, key)
+
+        await self.outbox.reply_text(
+            update,
             f"📅 **Fecha seleccionada:** {context.user_data['fecha_display']}\n\n"
             "🔢 ¿Tienes un **número de referencia**? (Opcional)\n\n"
             "Si no tienes, presiona 'No tengo'",
@@ -164,7 +281,8 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
 
         # Manejar botones de navegación
         if user_input == "↩️ Volver atrás":
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 f"↩️ Volviendo a selección de fecha...\n\n"
                 f"🏪 Local actual: {context.user_data['local']}\n"
                 "📅 Selecciona la fecha de la transacción:",
@@ -184,7 +302,8 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
 
         context.user_data['referencia'] = referencia
 
-        await update.message.reply_text(
+        await self.outbox.reply_text(
+            update,
             f"🔢 **Referencia:** {referencia_msg}\n\n"
             "✅ ¿Tienes un **número de autorización**? (Opcional)\n\n"
             "Si no tienes, presiona 'No tengo'",
@@ -199,7 +318,8 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
 
         # Manejar botones de navegación
         if user_input == "↩️ Volver atrás":
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 f"↩️ Volviendo a ingreso de referencia...\n\n"
                 f"🏪 Local: {context.user_data['local']}\n"
                 f"📅 Fecha: {context.user_data['fecha_display']}\n\n"
@@ -233,21 +353,25 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
 🔍 **Procesando consulta...**
         """
 
-        await update.message.reply_text(
+        # Sin esperar la entrega: el resumen puede enviarse unido a los resultados si llegan enseguida
+        await self.outbox.reply_text(
+            update,
             resumen,
+            merge=True,
             parse_mode='Markdown',
             reply_markup=self._create_base_keyboard(include_back=True, include_cancel=False)
         )
 
         # Realizar consulta
-        await self.execute_query(update, context)
+        self._lanzar_consulta(update, context)
         return ConversationHandler.END
 
     async def skip_referencia(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Salta el ingreso de referencia (comando /skip)"""
         context.user_data['referencia'] = None
 
-        await update.message.reply_text(
+        await self.outbox.reply_text(
+            update,
             "🔢 Referencia: No especificada\n\n"
             "✅ ¿Tienes un **número de autorización**? (Opcional)\n\n"
             "Si no tienes, presiona 'No tengo'",
@@ -272,46 +396,82 @@ Por favor, ingresa el número de local (ejemplo: kfc004):
 🔍 **Procesando consulta...**
         """
 
-        await update.message.reply_text(
+        # Sin esperar la entrega: el resumen puede enviarse unido a los resultados si llegan enseguida
+        await self.outbox.reply_text(
+            update,
             resumen,
+            merge=True,
             parse_mode='Markdown',
             reply_markup=self._create_base_keyboard(include_back=True, include_cancel=False)
         )
 
-        await self.execute_query(update, context)
+        self._lanzar_consulta(update, context)
         return ConversationHandler.END
 
-    async def execute_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def execute_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE, consulta=None):
         """Ejecuta la consulta en la base de datos"""
-        user_data = context.user_data
+        user_data = consulta if consulta is not None else context.user_data
 
         try:
-            results, connection_id = self.db.execute_query(
-                merchant_id=user_data['local'],
-                fecha_transaccion=user_data['fecha'],
-                numero_referencia=user_data.get('referencia'),
-                numero_autorizacion=user_data.get('autorizacion')
+            results, connection_id, antiguedad = await self._consultar(
+                user_data['local'],
+                user_data['fecha'],
+                user_data.get('referencia'),
+                user_data.get('autorizacion'),
+                owner=update.effective_user.id
             )
 
-            formatted_results = self.db.format_results(results)
+            # Resultado guardado mostrado porque la base de datos no respondió
+            aviso = ""
+            if antiguedad is not None:
+                aviso = (
+                    f"⚠️ **Base de datos no disponible.** Mostrando el resultado guardado "
+                    f"hace {format_antiguedad(antiguedad)}.\n"
+                )
 
             # Agregar información de la consulta
-            response = f"""
+            header = f"""
 📊 **Resultados de la Consulta**
-
+{aviso}
 🔗 **ID de Conexión:** `{connection_id}`
-🏪 **Local:** {user_data['local']}
-📅 **Fecha:** {user_data['fecha_display']}
-🔢 **Referencia:** {user_data.get('referencia', 'No especificada')}
-✅ **Autorización:** {user_data.get('autorizacion', 'No especificada')}
-
-{formatted_results}
-
-🔄 ¿Quieres hacer otra consulta? Usa /start
-            """
+🏪 **Local:** {escape_markdown(user_data['local'])}
+📅 **Fecha:** {escape_markdown(user_data['fecha_display'])}
+🔢 **Referencia:** {escape_markdown(user_data.get('referencia') or 'No especificada')}
+✅ **Autorización:** {escape_markdown(user_data.get('autorizacion') or 'No especificada')}
+"""
+            footer = "🔄 ¿Quieres hacer otra consulta? Usa /start"
+            if len(results) > Config.RESULTADOS_MAX_FILAS:
+                footer = (
+                    f"ℹ️ Se muestran {Config.RESULTADOS_MAX_FILAS} de {len(results)} transacciones. "
+                    "Agrega la referencia o la autorización para acotar la búsqueda.\n\n" + footer
+                )
+            elif not results and (user_data.get('referencia') or user_data.get('autorizacion')):
+                comando = " ".join(filter(None, [
+                    "/vigilar", user_data['local'], user_data['fecha_display'],
+                    user_data.get('referencia') or '-', user_data.get('autorizacion')
+                ]))
+                footer = f"🔔 Para recibir un aviso cuando aparezca usa:\n{escape_markdown(comando)}\n\n" + footer
+
+            bloques = render_rows(islice(results, Config.RESULTADOS_MAX_FILAS)) if results else [SIN_RESULTADOS]
+            await self._enviar_mensajes(update, chunk_messages(bloques, header, footer))
+
+        except QueryCancelledError as e:
+            # Si la canceló el usuario ya recibió el mensaje de /cancel o /start
+            if e.reason == QueryHandle.DEADLINE:
+                await self.outbox.reply_text(
+                    update,
+                    "⏱️ **La consulta superó el tiempo máximo permitido**\n\n"
+                    "Prueba agregando la referencia o la autorización para acotar la búsqueda.\n\n"
+                    "🔄 **Intenta nuevamente con /start**",
+                    parse_mode='Markdown',
+                    reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
+                )
 
-            await update.message.reply_text(
-                response,
+        except CircuitOpenError as e:
+            await self.outbox.reply_text(
+                update,
+                f"⏳ **Servicio de consultas no disponible**\n\n{e}\n\n"
+                "🔄 **Intenta nuevamente en unos minutos con /start**",
                 parse_mode='Markdown',
                 reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
             )
@@ -329,16 +489,98 @@ No se pudo completar la consulta. Error: {str(e)}
 
 🔄 **Intenta nuevamente con /start**
             """
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 error_message,
                 parse_mode='Markdown',
                 reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
             )
 
+    async def _enviar_mensajes(self, update, mensajes):
+        """Envía los mensajes a medida que se generan; el teclado acompaña al último"""
+        anterior = None
+        for mensaje in mensajes:
+            if anterior is not None:
+                await self.outbox.reply_text(update, anterior, merge=True, parse_mode='Markdown')
+            anterior = mensaje
+
+        await self.outbox.reply_text(
+            update,
+            anterior,
+            parse_mode='Markdown',
+            reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
+        )
+
+    async def _consultar(self, local, fecha, referencia=None, autorizacion=None, owner=None):
+        """Obtiene (resultados, connection_id, antigüedad) desde la caché, una precarga o la base de datos.
+
+        La antigüedad es None salvo cuando la base de datos falla y se devuelve un resultado vencido.
+        """
+        if self.mirror is not None:
+            self.mirror.registrar(local, fecha)
+            espejo = self.mirror.lookup(local, fecha, referencia, autorizacion)
+            if espejo is not None:
+                # El ID indica que respondió el espejo y con qué antigüedad, contando la última recarga
+                # completa del local (como mucho MIRROR_MAX_LAG)
+                results, antiguedad = espejo
+                return results, f"espejo-{antiguedad:.0f}s", None
+
+        key = ResultCache.make_key(local, fecha, referencia, autorizacion)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            if self.prefetcher is not None:
+                await self.prefetcher.registrar_uso(key)
+            return (*cached, None)
+
+        if self.prefetcher is not None and self.prefetcher.pending(key):
+            value = await self.prefetcher.wait(key)
+            if value is not None:
+                await self.prefetcher.registrar_uso(key)
+                return (*value, None)
+
+        # Con solo referencia se puede filtrar el resultado completo del día,
+        # ya que la referencia forma parte del GROUP BY
+        if referencia and not autorizacion:
+            base_key = ResultCache.make_key(local, fecha)
+            base = self.cache.get(base_key)
+            if base is None and self.prefetcher is not None and self.prefetcher.pending(base_key):
+                base = await self.prefetcher.wait(base_key)
+
+            if base is not None:
+                results, connection_id = base
+                filtrados = [row for row in results if row.referencia == referencia]
+                if filtrados:
+                    if self.prefetcher is not None:
+                        await self.prefetcher.registrar_uso(base_key)
+                    return filtrados, connection_id, None
+
+        try:
+            value = await asyncio.to_thread(
+                self.db.execute_query,
+                merchant_id=local,
+                fecha_transaccion=fecha,
+                numero_referencia=referencia,
+                numero_autorizacion=autorizacion,
+                owner=owner
+            )
+        except Exception as e:
+            cancelada = isinstance(e, QueryCancelledError) and e.reason == QueryHandle.USUARIO
+            stale = None if cancelada else self.cache.get_stale(key)
+            if stale is None:
+                raise
+            logger.logger.warning(f"Sirviendo resultado guardado para {local} {fecha} tras error: {e}")
+            value, antiguedad = stale
+            return (*value, antiguedad)
+
+        self.cache.set(key, value)
+        return (*value, None)
+
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Cancela la conversación"""
         # Limpiar datos
         context.user_data.clear()
+        self._cancelar_consultas(update)
 
         cancel_message = """
 ❌ **Consulta finalizada**
@@ -350,13 +592,168 @@ Todos los datos han sido descartados.
 👋 ¡Hasta pronto!
         """
 
-        await update.message.reply_text(
+        await self.outbox.reply_text(
+            update,
             cancel_message,
             parse_mode='Markdown',
             reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
         )
         return ConversationHandler.END
 
+    async def conversation_timeout(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Se ejecuta cuando una conversación supera CONVERSATION_TIMEOUT sin respuesta"""
+        context.user_data.clear()
+        self._cancel_prefetch(update)
+
+        if update.effective_chat:
+            await self.outbox.send_message(
+                context.bot,
+                update.effective_chat.id,
+                "⌛ **La consulta expiró por inactividad**\n\n"
+                "No te preocupes, puedes empezar de nuevo cuando quieras con /start o /reportes.",
+                parse_mode='Markdown',
+                reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
+            )
+        return ConversationHandler.END
+
+    def _es_admin(self, update):
+        return update.effective_user is not None and update.effective_user.id in Config.ADMIN_IDS
+
+    def usuarios_ocupados(self):
+        """Usuarios con una consulta en curso (sus datos no deben liberarse)"""
+        return set(self._consultas)
+
+    def memory_report(self, application):
+        """Uso de memoria aproximado por subsistema"""
+        suscripciones = self.report_scheduler.store.of_all()
+        subsistemas = {
+            'user_data': (len(application.user_data), application.user_data),
+            'chat_data': (len(application.chat_data), application.chat_data),
+            'cache_resultados': self.cache.memory_objects(),
+            'catalogo_locales': merchant_catalog.memory_objects(),
+            'consultas_en_curso': (len(self._consultas), None),
+            'consultas_inline': (len(self._inline_tasks), None),
+            'pool_conexiones': (self.db.pool.stats()['libres'], None),
+            'suscripciones': (len(suscripciones), suscripciones),
+            'vigilancias': self.watcher.memory_objects(),
+            'cola_salida': self.outbox.memory_objects(),
+        }
+        if self.mirror is not None:
+            subsistemas['espejo_hoy'] = self.mirror.memory_objects()
+        if self.prefetcher is not None:
+            subsistemas['precarga'] = self.prefetcher.memory_objects()
+
+        return {
+            nombre: (cantidad, deep_sizeof(obj) if obj is not None else None)
+            for nombre, (cantidad, obj) in subsistemas.items()
+        }
+
+    async def memoria_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando de administración: memoria por subsistema (/memoria)"""
+        if not self._es_admin(update):
+            await self.outbox.reply_text(update, "⛔ Comando disponible solo para administradores.")
+            return
+
+        # Se calcula en el event loop: los diccionarios medidos se modifican desde él
+        report = self.memory_report(context.application)
+        lineas = [
+            f"• {nombre}: {cantidad} elementos"
+            + (f", ~{format_bytes(tamano)}" if tamano is not None else "")
+            for nombre, (cantidad, tamano) in report.items()
+        ]
+
+        rss = process_rss_bytes()
+        await self.outbox.reply_text(
+            update,
+            "🧠 Uso de memoria por subsistema\n\n"
+            + "\n".join(lineas)
+            + (f"\n\n📦 Memoria del proceso (RSS): {format_bytes(rss)}" if rss else "")
+        )
+
+    async def metricas_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando de administración: cola de salida, caché y base de datos (/metricas)"""
+        if not self._es_admin(update):
+            await self.outbox.reply_text(update, "⛔ Comando disponible solo para administradores.")
+            return
+
+        secciones = {
+            '📤 Cola de salida': self.outbox.stats(),
+            '🗄️ Caché de resultados': self.cache.stats(),
+            '🔔 Vigilancias': self.watcher.stats(),
+        }
+        if self.mirror is not None:
+            secciones['🪞 Espejo del día'] = self.mirror.stats()
+        for nombre, stats in self.db.router.stats().items():
+            secciones[f'🔌 Base de datos ({nombre})'] = stats
+        processor = context.application.update_processor
+        if hasattr(processor, 'stats'):
+            secciones['📥 Updates'] = processor.stats()
+        lineas = []
+        for titulo, stats in secciones.items():
+            lineas.append(titulo)
+            lineas.extend(f"• {clave}: {valor}" for clave, valor in stats.items())
+            lineas.append("")
+
+        await self.outbox.reply_text(update, "📈 Métricas del bot\n\n" + "\n".join(lineas).rstrip())
+
+    async def logs_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando de administración: últimos registros del log con filtros (/logs).
+
+        /logs [n] [error|warning|info] [id=<connection_id>] [local=kfc004] [desde=DD/MM/AAAA]
+        [hasta=DD/MM/AAAA] [texto libre]
+        """
+        if not self._es_admin(update):
+            await self.outbox.reply_text(update, "⛔ Comando disponible solo para administradores.")
+            return
+
+        limite, nivel, desde, hasta, textos, libres = Config.LOGS_LINEAS_DEFECTO, None, None, None, [], []
+        for arg in context.args or []:
+            clave, _, valor = arg.partition('=')
+            clave = clave.lower()
+            if arg.isdigit():
+                limite = min(int(arg), Config.LOGS_LINEAS_MAX)
+            elif not valor and arg.upper() in NIVELES:
+                nivel = arg.upper()
+            elif valor and clave in ('desde', 'hasta'):
+                fecha = parse_fecha(valor)
+                if fecha is None:
+                    await self.outbox.reply_text(update, f"❌ Fecha inválida: {valor} (usa hoy, ayer o DD/MM/AAAA)")
+                    return
+                if clave == 'desde':
+                    desde = fecha[0]
+                else:
+                    hasta = fecha[0]
+            elif valor and clave == 'nivel' and valor.upper() in NIVELES:
+                nivel = valor.upper()
+            elif valor and clave == 'local':
+                textos.insert(0, f"Local: {merchant_catalog.normalize(valor)}")
+            elif valor and clave == 'id':
+                # El connection_id es el filtro más selectivo: se usa para recorrer el archivo
+                textos.insert(0, valor)
+            else:
+                libres.append(arg)
+
+        # Las palabras sueltas se buscan como una sola frase
+        if libres:
+            textos.append(" ".join(libres))
+
+        try:
+            registros = await asyncio.to_thread(log_searcher.search, textos, nivel, desde, hasta, limite)
+        except Exception as e:
+            logger.logger.error(f"Error buscando en los logs: {e}")
+            await self.outbox.reply_text(update, f"❌ No se pudo buscar en los logs. Error: {e}")
+            return
+
+        if not registros:
+            await self.outbox.reply_text(update, "🔎 No hay registros que cumplan los filtros.")
+            return
+
+        # Texto plano: los registros pueden contener caracteres de Markdown
+        mensajes = list(chunk_messages(registros, f"🔎 {len(registros)} registros del log\n"))
+        for mensaje in mensajes[:-1]:
+            await self.outbox.reply_text(update, mensaje, merge=True)
+        await self.outbox.reply_text(update, mensajes[-1])
+
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Muestra la ayuda mejorada"""
         help_text = """
@@ -364,6 +761,10 @@ Todos los datos han sido descartados.
 
 /start - Iniciar una nueva consulta
 /reportes - Generar reportes de conexiones
+/resumen - Totales del día por estado y TID (ej: /resumen kfc004 ayer)
+/vigilar - Avisar cuando una transacción aparezca o cambie (ej: /vigilar kfc004 hoy 123456)
+/suscribir - Recibir cada día el reporte de un local (o todos)
+/desuscribir - Dejar de recibir reportes programados
 /help - Mostrar esta ayuda
 /cancel - Cancelar la consulta actual
 
@@ -373,6 +774,9 @@ Todos los datos han sido descartados.
 3. 🔢 Ingresa referencia (opcional)
 4. ✅ Ingresa autorización (opcional)
 
+⚡ **Consulta rápida (inline):**
+Escribe en cualquier chat: `@bot kfc004 06/10/2025 [referencia] [autorización]`
+
 📊 **Sistema de Reportes:**
 - Genera reportes CSV con todas las conexiones
 - Estadísticas por local y fecha
@@ -380,10 +784,303 @@ Todos los datos han sido descartados.
 
 🔧 **Soporte:** Si tienes problemas, contacta al administrador.
         """
-        await update.message.reply_text(help_text, parse_mode='Markdown')
+        await self.outbox.reply_text(update, help_text, parse_mode='Markdown')
+
+    # ========== CONSULTAS INLINE ==========
+
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Maneja '@bot kfc004 06/10/2025 [referencia] [autorizacion]' desde cualquier chat"""
+        user_id = update.inline_query.from_user.id
+
+        # Cada pulsación reemplaza la búsqueda anterior del mismo usuario
+        previous = self._inline_tasks.pop(user_id, None)
+        if previous is not None and not previous.done():
+            previous.cancel()
+            self.db.cancel_owner(('inline', user_id))
+
+        task = context.application.create_task(self._resolve_inline(update.inline_query), update=update)
+        self._inline_tasks[user_id] = task
+
+    async def _resolve_inline(self, inline_query):
+        """Espera el debounce, consulta (con caché) y responde la búsqueda inline"""
+        try:
+            await asyncio.sleep(Config.INLINE_DEBOUNCE_SECONDS)
+            await self._answer_inline(inline_query)
+        except TelegramError as e:
+            # p. ej. "Query is too old" si la respuesta llega después de que Telegram la descartó
+            logger.logger.warning(f"No se pudo responder la consulta inline de {inline_query.from_user.id}: {e}")
+        finally:
+            if self._inline_tasks.get(inline_query.from_user.id) is asyncio.current_task():
+                del self._inline_tasks[inline_query.from_user.id]
+
+    async def _answer_inline(self, inline_query):
+        """Responde la búsqueda inline con una tarjeta por transacción encontrada"""
+        consulta = parse_consulta_inline(inline_query.query)
+
+        if consulta is None:
+            if inline_query.query.strip():
+                await inline_query.answer([
+                    InlineQueryResultArticle(
+                        id="formato",
+                        title="Formato: kfc004 06/10/2025 [referencia] [autorización]",
+                        description="También puedes usar 'hoy' o 'ayer' como fecha",
+                        input_message_content=InputTextMessageContent(
+                            "ℹ️ Uso: @bot kfc004 06/10/2025 [referencia] [autorización]"
+                        )
+                    )
+                ], cache_time=0, is_personal=True)
+            return
+
+        local = consulta['local']
+        fecha = consulta['fecha']
+        es_hoy = fecha == datetime.now().strftime("%Y%m%d")
+
+        if merchant_catalog.is_loaded and local not in merchant_catalog:
+            await inline_query.answer([
+                InlineQueryResultArticle(
+                    id="local",
+                    title=f"❌ El local {local} no existe",
+                    input_message_content=InputTextMessageContent(f"❌ El local {local} no existe.")
+                )
+            ], cache_time=Config.INLINE_CACHE_TIME, is_personal=True)
+            return
+
+        try:
+            results, connection_id, antiguedad = await self._consultar(
+                local, fecha, consulta['referencia'], consulta['autorizacion'],
+                owner=('inline', inline_query.from_user.id)
+            )
+        except Exception as e:
+            logger.logger.error(f"Error en consulta inline: {e}")
+            await inline_query.answer([
+                InlineQueryResultArticle(
+                    id="error",
+                    title="❌ No se pudo completar la consulta",
+                    description="Intenta nuevamente en unos segundos",
+                    input_message_content=InputTextMessageContent("❌ No se pudo completar la consulta.")
+                )
+            ], cache_time=0, is_personal=True)
+            return
+
+        if results:
+            articles = []
+            for i, row in enumerate(results[:Config.INLINE_MAX_RESULTS]):
+                articles.append(InlineQueryResultArticle(
+                    id=f"{connection_id}-{i}",
+                    title=f"{'⚠️ ' if antiguedad is not None else ''}{row.estado} · Ref {row.referencia}",
+                    description=f"{row.local} · {row.fecha} · Aut {row.autorizacion} · "
+                                f"{format_centavos(row.centavos)}"
+                                + (f" · guardado hace {format_antiguedad(antiguedad)}" if antiguedad is not None else ""),
+                    input_message_content=InputTextMessageContent(
+                        render_row(row),
+                        parse_mode='Markdown'
+                    )
+                ))
+        else:
+            articles = [InlineQueryResultArticle(
+                id=f"{connection_id}-vacio",
+                title="Sin transacciones",
+                description=f"{local} · {consulta['fecha_display']}",
+                input_message_content=InputTextMessageContent(SIN_RESULTADOS)
+            )]
+
+        # Los días cerrados no cambian: Telegram puede reutilizar la respuesta más tiempo
+        cache_time = Config.INLINE_CACHE_TIME_HOY if es_hoy else Config.INLINE_CACHE_TIME
+        if antiguedad is not None:
+            # Resultado vencido servido por caída de la base de datos: que Telegram no lo guarde
+            cache_time = 0
+        await inline_query.answer(articles, cache_time=cache_time, is_personal=True)
+
+    # ========== RESUMEN DIARIO ==========
+
+    async def resumen_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cantidad y total por estado y TID de un local y día (/resumen kfc004 [hoy|ayer|DD/MM/AAAA])"""
+        args = context.args or []
+        local = merchant_catalog.normalize(args[0]) if args else ""
+        fecha = parse_fecha(args[1] if len(args) > 1 else "hoy")
+
+        if not re.match(r'^KFC\d{3}$', local) or fecha is None or len(args) > 2:
+            await self.outbox.reply_text(
+                update,
+                "❌ Uso: /resumen kfc004 [hoy | ayer | DD/MM/AAAA]\n\nSin fecha se muestra el día de hoy."
+            )
+            return
+        if merchant_catalog.is_loaded and local not in merchant_catalog:
+            await self.outbox.reply_text(update, f"❌ El local {local} no existe.")
+            return
+
+        try:
+            filas = await self._resumen(local, fecha[0], owner=update.effective_user.id)
+        except QueryCancelledError as e:
+            if e.reason == QueryHandle.DEADLINE:
+                await self.outbox.reply_text(update, "⏱️ El resumen superó el tiempo máximo permitido. "
+                                                     "Intenta nuevamente en unos minutos.")
+            return
+        except CircuitOpenError as e:
+            await self.outbox.reply_text(update, f"⏳ Servicio de consultas no disponible\n\n{e}")
+            return
+        except Exception as e:
+            logger.logger.error(f"Error en resumen {local} {fecha[0]}: {e}")
+            await self.outbox.reply_text(update, f"❌ No se pudo obtener el resumen. Error: {e}")
+            return
+
+        await self.outbox.reply_text(update, self._format_resumen(local, fecha[1], filas), parse_mode='Markdown')
+
+    async def _resumen(self, local, fecha, owner=None):
+        """Resumen desde el día materializado, el resultado completo en caché o una consulta agregada"""
+        if dia_cerrado(fecha):
+            filas = await asyncio.to_thread(summary_snapshot.get, local, fecha)
+            if filas is None:
+                # Lo que se materializa no sale de la caché: pudo guardarse antes del cierre del día
+                rows = await asyncio.to_thread(self.db.execute_summary, local, fecha, owner=owner)
+                filas = resumir_filas(rows)
+                await asyncio.to_thread(summary_snapshot.put, local, fecha, filas)
+            return filas
+
+        cached = self.cache.get(ResultCache.make_key(local, fecha))
+        if cached is not None:
+            return resumir_resultados(cached[0])
+        rows = await asyncio.to_thread(self.db.execute_summary, local, fecha, owner=owner)
+        return resumir_filas(rows)
+
+    def _format_resumen(self, local, fecha_display, filas):
+        if not filas:
+            return f"📊 **Resumen {local} - {fecha_display}**\n\n❌ No hay transacciones registradas."
+
+        por_estado = {}
+        for estado, tid, cantidad, total in filas:
+            por_estado.setdefault(estado, []).append((tid, cantidad, total))
+
+        lineas = [f"📊 **Resumen {local} - {fecha_display}**", ""]
+        for estado, tids in por_estado.items():
+            cantidad = sum(t[1] for t in tids)
+            total = sum(t[2] for t in tids)
+            lineas.append(f"**{estado}:** {cantidad} — {format_centavos(total)}")
+            lineas.extend(f"   🆔 {tid or 'sin TID'}: {n} — {format_centavos(centavos)}" for tid, n, centavos in tids)
+            lineas.append("")
+
+        lineas.append(f"🔢 **Total transacciones:** {sum(f[2] for f in filas)}")
+        return "\n".join(lineas)
+
+    # ========== VIGILANCIA DE TRANSACCIONES ==========
+
+    async def vigilar_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/vigilar kfc004 hoy <referencia> [autorización] · /vigilar (lista) · /vigilar parar"""
+        args = context.args or []
+        user_id = update.effective_user.id
+
+        if not args:
+            activas = self.watcher.of(user_id)
+            if not activas:
+                await self.outbox.reply_text(
+                    update,
+                    "🔔 No tienes vigilancias activas.\n\n"
+                    "Uso: /vigilar kfc004 hoy <referencia> [autorización]\n"
+                    "Solo por autorización: /vigilar kfc004 hoy - <autorización>"
+                )
+                return
+            await self.outbox.reply_text(
+                update,
+                "🔔 Vigilancias activas:\n" + "\n".join(f"• {watch.describe()}" for watch in activas)
+                + "\n\nUsa /vigilar parar para detenerlas."
+            )
+            return
+
+        if len(args) == 1 and args[0].lower() == 'parar':
+            eliminadas = self.watcher.remove_user(user_id)
+            await self.outbox.reply_text(update, f"🔕 Vigilancias detenidas: {eliminadas}")
+            return
+
+        consulta = parse_consulta_inline(" ".join(args))
+        if consulta is not None and consulta['referencia'] == '-':
+            consulta['referencia'] = None
+        if consulta is None or not (consulta['referencia'] or consulta['autorizacion']):
+            await self.outbox.reply_text(
+                update,
+                "❌ Uso: /vigilar kfc004 [hoy | ayer | DD/MM/AAAA] <referencia> [autorización]\n\n"
+                "Para vigilar solo por autorización usa '-' como referencia."
+            )
+            return
+        if merchant_catalog.is_loaded and consulta['local'] not in merchant_catalog:
+            await self.outbox.reply_text(update, f"❌ El local {consulta['local']} no existe.")
+            return
+        if len(self.watcher.of(user_id)) >= Config.VIGILAR_MAX_POR_USUARIO:
+            await self.outbox.reply_text(
+                update,
+                f"⚠️ Ya tienes {Config.VIGILAR_MAX_POR_USUARIO} vigilancias activas. "
+                "Usa /vigilar parar para liberarlas."
+            )
+            return
+
+        try:
+            watch, results = await self.watcher.add(update.effective_chat.id, user_id, consulta, owner=user_id)
+        except CircuitOpenError as e:
+            await self.outbox.reply_text(update, f"⏳ Servicio de consultas no disponible\n\n{e}")
+            return
+        except Exception as e:
+            logger.logger.error(f"Error registrando vigilancia {consulta['local']} {consulta['fecha']}: {e}")
+            await self.outbox.reply_text(update, f"❌ No se pudo registrar la vigilancia. Error: {e}")
+            return
+
+        estado = "".join(render_rows(islice(results, 3))) if results else "⏳ La transacción aún no aparece.\n"
+        await self.outbox.reply_text(
+            update,
+            f"🔔 **Vigilancia activada**\n{escape_markdown(watch.describe())}\n\n{estado}\n"
+            f"Te avisaré cuando aparezca o cambie de estado "
+            f"(durante {Config.VIGILAR_DURACION // 60} min).",
+            parse_mode='Markdown'
+        )
 
     # ========== MÉTODOS DE REPORTES ==========
 
+    def _parse_filtro_reporte(self, args):
+        """Interpreta el argumento de /suscribir y /desuscribir: un local o 'todos'"""
+        if not args or args[0].lower() == TODOS:
+            return TODOS
+
+        local = merchant_catalog.normalize(args[0])
+        if not re.match(r'^KFC\d{3}$', local):
+            return None
+        if merchant_catalog.is_loaded and local not in merchant_catalog:
+            return None
+        return local
+
+    async def suscribir(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Suscribe el chat al reporte diario de un local o de todos (/suscribir kfc004)"""
+        filtro = self._parse_filtro_reporte(context.args)
+        if filtro is None:
+            await self.outbox.reply_text(
+                update,
+                "❌ Local no válido.\n\nUso: /suscribir kfc004 o /suscribir todos"
+            )
+            return
+
+        self.report_scheduler.store.add(update.effective_chat.id, filtro)
+        await self.outbox.reply_text(
+            update,
+            f"✅ **Suscripción registrada**\n\n"
+            f"📊 Recibirás cada día a las {Config.REPORTES_HORA} el reporte de conexiones de: "
+            f"**{'todos los locales' if filtro == TODOS else filtro}**\n\n"
+            "Para cancelarla usa /desuscribir",
+            parse_mode='Markdown'
+        )
+
+    async def desuscribir(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Elimina una suscripción (/desuscribir kfc004) o todas (/desuscribir)"""
+        store = self.report_scheduler.store
+        filtro = None if not context.args else self._parse_filtro_reporte(context.args)
+        if context.args and filtro is None:
+            await self.outbox.reply_text(update, "❌ Local no válido.\n\nUso: /desuscribir kfc004 o /desuscribir")
+            return
+
+        eliminadas = store.remove(update.effective_chat.id, filtro)
+        restantes = store.of(update.effective_chat.id)
+        await self.outbox.reply_text(
+            update,
+            f"🗑️ Suscripciones eliminadas: {eliminadas}\n"
+            f"📋 Suscripciones activas: {', '.join(restantes) if restantes else 'ninguna'}"
+        )
+
     async def reportes_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Maneja el comando /reportes"""
         print(f"🔍 Comando /reportes recibido de usuario: {update.effective_user.id}")
@@ -397,7 +1094,8 @@ Todos los datos han sido descartados.
         ]
         reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
 
-        await update.message.reply_text(
+        await self.outbox.reply_text(
+            update,
             "📊 **Sistema de Reportes**\n\n"
             "Selecciona el tipo de reporte que deseas generar:\n\n"
             "• 📊 **Reporte CSV**: Archivo CSV con todos los datos de conexiones\n"
@@ -419,7 +1117,8 @@ Todos los datos han sido descartados.
         user_input = update.message.text
 
         if user_input == "❌ Cancelar":
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 "❌ Generación de reporte cancelada.",
                 reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
             )
@@ -432,7 +1131,8 @@ Todos los datos han sido descartados.
         locales = report_generator.get_available_locals()
 
         if not locales:
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 "📊 **Sistema de Reportes**\n\n"
                 "❌ No hay datos de conexiones registrados todavía.\n\n"
                 "Los reportes se generan automáticamente cuando los usuarios "
@@ -456,7 +1156,8 @@ Todos los datos han sido descartados.
 
         reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
 
-        await update.message.reply_text(
+        await self.outbox.reply_text(
+            update,
             f"📊 **{user_input}**\n\n"
             "Selecciona el local para el reporte:\n\n"
             f"📍 **Locales disponibles:** {len(locales)}",
@@ -466,6 +1167,22 @@ Todos los datos han sido descartados.
 
         return "WAITING_REPORT_LOCAL"
 
+    async def _actualizar_precalculado(self, update, filtro):
+        """Deja al día el reporte precalculado del filtro; devuelve cómo se obtuvo o None si falló.
+
+        Sin conexiones desde que se construyó se envía tal cual; si las hubo, se agregan las filas
+        nuevas al estado incremental y se vuelve a escribir.
+        """
+        if await self.report_scheduler.al_dia(filtro):
+            return "sin conexiones nuevas desde que se precalculó"
+
+        await self.outbox.reply_text(update, "⏳ Actualizando el reporte precalculado con las conexiones nuevas...")
+        filepath, message = await self.report_scheduler.build(filtro)
+        if not filepath:
+            logger.logger.warning(f"No se pudo actualizar el reporte precalculado '{filtro}': {message}")
+            return None
+        return "precalculado y actualizado con las conexiones nuevas"
+
     async def handle_report_local(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Maneja la selección de local para reporte"""
         print(f"🔍 Local seleccionado para reporte: {update.message.text}")
@@ -475,7 +1192,8 @@ Todos los datos han sido descartados.
         user_input = update.message.text
 
         if user_input == "❌ Cancelar":
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 "❌ Generación de reporte cancelada.",
                 reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
             )
@@ -489,26 +1207,51 @@ Todos los datos han sido descartados.
         local_filter = None if user_input == "🏪 Todos los locales" else user_input
         tipo_reporte = context.user_data.get('tipo_reporte', '📊 Reporte CSV')
 
-        await update.message.reply_text(
+        # Si el reporte ya se construyó hoy fuera de hora punta se reutiliza (actualizado si hace falta)
+        filtro = local_filter or TODOS
+        origen = None
+        if tipo_reporte == "📊 Reporte CSV" and self.report_scheduler.precalculado(filtro):
+            origen = await self._actualizar_precalculado(update, filtro)
+
+        if origen:
+            await self.report_scheduler.send(context.bot, update.effective_chat.id, filtro)
+            await self.outbox.reply_text(
+                update,
+                f"✅ **Reporte completado** ({origen})\n\n"
+                "¿Necesitas otro reporte? Usa /reportes nuevamente.",
+                parse_mode='Markdown',
+                reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
+            )
+            context.user_data.pop('reporte_pendiente', None)
+            context.user_data.pop('tipo_reporte', None)
+            return ConversationHandler.END
+
+        await self.outbox.reply_text(
+            update,
             f"⏳ **Generando {tipo_reporte}...**\n\n"
             f"🔍 **Local:** {user_input}\n"
             "Por favor espera mientras se procesan los datos...",
             parse_mode='Markdown'
         )
 
-        # Generar reporte según el tipo
+        # Generar reporte según el tipo (fuera del event loop: pandas y openpyxl son costosos)
         if tipo_reporte == "📊 Reporte CSV":
-            filepath, message = report_generator.generate_connections_report(local_filter=local_filter)
+            filepath, message = await asyncio.to_thread(
+                report_generator.generate_connections_report, local_filter=local_filter
+            )
             file_type = "document"
         else:  # Reporte Detallado
-            filepath, message = report_generator.generate_detailed_report(local_filter=local_filter)
+            filepath, message = await asyncio.to_thread(
+                report_generator.generate_detailed_report, local_filter=local_filter
+            )
             file_type = "document"
 
         if filepath:
             # Enviar archivo
             with open(filepath, 'rb') as file:
                 if file_type == "document":
-                    await update.message.reply_document(
+                    await self.outbox.reply_document(
+                        update,
                         document=file,
                         filename=os.path.basename(filepath),
                         caption=message,
@@ -522,14 +1265,16 @@ Todos los datos han sido descartados.
                 pass
 
             # Mensaje adicional
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 "✅ **Reporte completado**\n\n"
                 "¿Necesitas otro reporte? Usa /reportes nuevamente.",
                 parse_mode='Markdown',
                 reply_markup=self._create_base_keyboard(include_back=False, include_cancel=False)
             )
         else:
-            await update.message.reply_text(
+            await self.outbox.reply_text(
+                update,
                 f"❌ **Error al generar reporte**\n\n{message}",
                 parse_mode='Markdown'
             )
@@ -1,16 +1,32 @@
-from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+from telegram import Update
+from telegram.ext import (
+    Application, CommandHandler, ConversationHandler, InlineQueryHandler, MessageHandler, TypeHandler, filters
+)
 
 # Importaciones absolutas
 from config.settings import Config
+from bot.catalog import merchant_catalog
+from bot.concurrency import ChatOrderedUpdateProcessor
 from bot.handlers import BotHandlers, LOCAL, FECHA, REFERENCIA, AUTORIZACION
+from bot.sessions import SessionTracker
+from utils.helpers import parse_hora, prewarm_modules
+from utils.log_compaction import log_compactor
 from utils.logger import logger
 
 
 class KFCBot:
     def __init__(self):
         self.token = Config.TELEGRAM_TOKEN
-        self.application = Application.builder().token(self.token).build()
+        # Updates de distintos chats en paralelo; los de un mismo chat en orden (ConversationHandler)
+        self.application = (
+            Application.builder()
+            .token(self.token)
+            .concurrent_updates(ChatOrderedUpdateProcessor())
+            .post_init(self.post_init)
+            .build()
+        )
         self.handlers = BotHandlers()
+        self.sessions = SessionTracker()
 
         self.setup_handlers()
 
@@ -19,14 +35,50 @@ class KFCBot:
         await application.bot.set_my_commands([
             ("start", "Iniciar consulta de transacciones"),
             ("reportes", "Generar reportes de conexiones"),
+            ("resumen", "Totales del día de un local por estado"),
+            ("vigilar", "Avisar cuando una transacción aparezca o cambie"),
+            ("suscribir", "Recibir el reporte diario de un local"),
+            ("desuscribir", "Cancelar reportes programados"),
             ("help", "Mostrar ayuda"),
             ("cancel", "Cancelar operación actual")
         ])
 
+        # Carga y refresco periódico del catálogo de locales
+        merchant_catalog.start(self.handlers.db.fetch_merchant_ids)
+
+        # pandas/openpyxl/pyodbc se cargan fuera del event loop antes del primer uso
+        prewarm_modules(Config.PREWARM_MODULES)
+
+        # Reportes suscritos construidos fuera de hora punta
+        self.handlers.report_scheduler.schedule(application)
+
+        # Lectura periódica de cambios para todas las vigilancias de /vigilar
+        self.handlers.watcher.schedule(application)
+
+        # Sincronización incremental del espejo de hoy (MIRROR_ENABLED)
+        if self.handlers.mirror is not None:
+            self.handlers.mirror.schedule(application)
+
+        # Compactación diaria de los CSV de conexiones de meses cerrados
+        if application.job_queue is not None:
+            application.job_queue.run_daily(log_compactor.run_job, time=parse_hora(Config.COMPACTACION_HORA),
+                                            name="compactacion_conexiones")
+
+            # Limpieza periódica de user_data de usuarios inactivos
+            application.job_queue.run_repeating(self.sweep_sessions, interval=Config.SESSION_SWEEP_INTERVAL,
+                                                name="limpieza_sesiones")
+
+    async def sweep_sessions(self, context):
+        """Tarea periódica: libera la memoria de sesiones abandonadas"""
+        self.sessions.sweep(context.application, busy=self.handlers.usuarios_ocupados())
+
     def setup_handlers(self):
         """Configura los manejadores de comandos"""
         print("🔧 Configurando handlers...")
 
+        # Registro de actividad por usuario (grupo -1: antes que cualquier otro handler)
+        self.application.add_handler(TypeHandler(Update, self.sessions.touch), group=-1)
+
         # Conversation handler para consultas principales
         conv_handler = ConversationHandler(
             entry_points=[CommandHandler('start', self.handlers.start)],
@@ -41,8 +93,10 @@ class KFCBot:
                     MessageHandler(filters.TEXT & ~filters.COMMAND, self.handlers.get_autorizacion),
                     CommandHandler('skip', self.handlers.skip_autorizacion)
                 ],
+                ConversationHandler.TIMEOUT: [TypeHandler(Update, self.handlers.conversation_timeout)],
             },
-            fallbacks=[CommandHandler('cancel', self.handlers.cancel)]
+            fallbacks=[CommandHandler('cancel', self.handlers.cancel)],
+            conversation_timeout=Config.CONVERSATION_TIMEOUT
         )
 
         self.application.add_handler(conv_handler)
@@ -58,8 +112,10 @@ class KFCBot:
                 "WAITING_REPORT_LOCAL": [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, self.handlers.handle_report_local)
                 ],
+                ConversationHandler.TIMEOUT: [TypeHandler(Update, self.handlers.conversation_timeout)],
             },
-            fallbacks=[CommandHandler('cancel', self.handlers.cancel)]
+            fallbacks=[CommandHandler('cancel', self.handlers.cancel)],
+            conversation_timeout=Config.CONVERSATION_TIMEOUT
         )
 
         self.application.add_handler(report_conv_handler)
@@ -68,8 +124,19 @@ class KFCBot:
         # Comandos simples
         self.application.add_handler(CommandHandler('help', self.handlers.help_command))
         self.application.add_handler(CommandHandler('cancel', self.handlers.cancel))
+        self.application.add_handler(CommandHandler('resumen', self.handlers.resumen_command))
+        self.application.add_handler(CommandHandler('vigilar', self.handlers.vigilar_command))
+        self.application.add_handler(CommandHandler('suscribir', self.handlers.suscribir))
+        self.application.add_handler(CommandHandler('desuscribir', self.handlers.desuscribir))
+        self.application.add_handler(CommandHandler('memoria', self.handlers.memoria_command))
+        self.application.add_handler(CommandHandler('metricas', self.handlers.metricas_command))
+        self.application.add_handler(CommandHandler('logs', self.handlers.logs_command))
         print("✅ Comandos simples configurados")
 
+        # Consultas de una sola línea desde cualquier chat (requiere modo inline en BotFather)
+        self.application.add_handler(InlineQueryHandler(self.handlers.inline_query))
+        print("✅ Handler de consultas inline configurado")
+
         # Debug: listar todos los handlers
         print(f"📋 Total de handlers registrados: {len(self.application.handlers)}")
 
@@ -79,7 +146,7 @@ class KFCBot:
         """Inicia el bot"""
         logger.logger.info("Iniciando bot de KFC...")
         print("🤖 Bot de KFC iniciado...")
-        print("✅ Comandos disponibles: /start, /reportes, /help, /cancel")
+        print("✅ Comandos disponibles: /start, /reportes, /resumen, /vigilar, /suscribir, /desuscribir, /help, /cancel")
 
         self.application.run_polling()
 
@@ -0,0 +1,232 @@
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime
+
+from config.settings import Config
+from bot.watch import WatchRow, acumular, fila_agrupada, nuevo_acumulado
+from utils.logger import logger
+
+# Columna de TB_LOG_TRANSACCION usada como marca de la sincronización incremental
+COLUMNA_MARCA = 'Fecha_Transaccion'
+
+
+class _LocalIndex:
+    """Transacciones del día de un local agrupadas por referencia, con índice por autorización"""
+
+    def __init__(self, local, cargado_en):
+        self.local = local
+        self.cargado_en = cargado_en
+        # referencia -> acumulado (ver bot.watch.nuevo_acumulado)
+        self._acumulado = {}
+        # referencia -> TransactionRow agrupada
+        self.rows = {}
+        # autorización (de cualquier fila) -> referencias
+        self.por_autorizacion = {}
+        self._lista = None
+
+    def aplicar(self, fila):
+        acumulado = self._acumulado.get(fila.referencia)
+        if acumulado is None:
+            acumulado = self._acumulado[fila.referencia] = nuevo_acumulado(fila)
+        acumular(acumulado, fila)
+        if fila.autorizacion:
+            self.por_autorizacion.setdefault(fila.autorizacion, set()).add(fila.referencia)
+
+        row = fila_agrupada(self.local, fila.referencia, acumulado)
+        if self.rows.get(fila.referencia) != row:
+            self.rows[fila.referencia] = row
+            self._lista = None
+
+    def buscar(self, referencia=None, autorizacion=None):
+        """Mismo filtro que execute_query: referencia y/o una autorización de cualquier fila de la referencia"""
+        if not referencia and not autorizacion:
+            if self._lista is None:
+                self._lista = list(self.rows.values())
+            return self._lista
+
+        if referencia:
+            referencias = (referencia,) if referencia in self.rows else ()
+        else:
+            referencias = self.por_autorizacion.get(autorizacion, ())
+        if referencia and autorizacion:
+            referencias = [ref for ref in referencias if ref in self.por_autorizacion.get(autorizacion, ())]
+        return [self.rows[ref] for ref in referencias]
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class TodayMirror:
+    """Espejo en memoria de las transacciones de hoy de los locales más consultados.
+
+    Los locales con al menos MIRROR_MIN_CONSULTAS consultas del día (hasta MIRROR_MAX_LOCALES) se
+    cargan completos y luego se mantienen con una consulta incremental cada MIRROR_SYNC_INTERVAL
+    segundos que lee solo las filas con Fecha_Transaccion igual o posterior a la última leída.
+    Fecha_Transaccion es una fecha de negocio: los cambios de estado sobre filas ya leídas
+    (anulaciones, reversos) y las filas que llegan con fecha anterior a la marca solo se recogen
+    al recargar el local completo, lo que se hace cada MIRROR_RELOAD_INTERVAL segundos.
+
+    Por eso la antigüedad de una respuesta es la mayor entre la última sincronización y la última
+    recarga completa del local, y solo se responde desde el espejo mientras no supere
+    MIRROR_MAX_LAG segundos. Una búsqueda por referencia o autorización sin coincidencias tampoco
+    se responde: la consulta sigue el camino normal hacia la base de datos.
+    """
+
+    def __init__(self, db, max_locales=None, min_consultas=None, max_lag=None):
+        self.db = db
+        self.max_locales = max_locales or Config.MIRROR_MAX_LOCALES
+        self.min_consultas = min_consultas or Config.MIRROR_MIN_CONSULTAS
+        self.max_lag = max_lag or Config.MIRROR_MAX_LAG
+        self.reload_interval = Config.MIRROR_RELOAD_INTERVAL
+        if self.reload_interval >= self.max_lag:
+            logger.logger.warning(f"MIRROR_RELOAD_INTERVAL ({self.reload_interval}s) no es menor que "
+                                  f"MIRROR_MAX_LAG ({self.max_lag}s): el espejo casi nunca podrá responder")
+        self.fecha = datetime.now().strftime("%Y%m%d")
+        # local -> consultas del día (decide qué locales se reflejan)
+        self._consultas = Counter()
+        # local -> _LocalIndex
+        self._locales = {}
+        self.marca = None
+        # Inicio (monotonic) de la última sincronización completada
+        self.sincronizado = None
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.syncs = 0
+        self.recargas = 0
+
+    def schedule(self, application):
+        """Programa la sincronización incremental en la job queue de la aplicación"""
+        if application.job_queue is None:
+            logger.logger.warning("JobQueue no disponible: el espejo del día queda desactivado")
+            return
+
+        application.job_queue.run_repeating(self.run_job, interval=Config.MIRROR_SYNC_INTERVAL,
+                                            name="espejo_hoy")
+
+    def registrar(self, local, fecha):
+        """Cuenta una consulta del día en curso para elegir los locales a reflejar"""
+        if fecha == self.fecha:
+            self._consultas[local] += 1
+
+    def antiguedad(self):
+        """Segundos desde el inicio de la última sincronización, o None si nunca se sincronizó"""
+        return None if self.sincronizado is None else time.monotonic() - self.sincronizado
+
+    def lookup(self, local, fecha, referencia=None, autorizacion=None):
+        """Devuelve (resultados, antigüedad en segundos) o None si el espejo no puede responder"""
+        index = self._locales.get(local)
+        if index is None or fecha != self.fecha:
+            self.misses += 1
+            return None
+
+        # Los cambios de estado solo llegan con la recarga completa del local
+        sincronizado = self.antiguedad()
+        antiguedad = None if sincronizado is None else max(sincronizado, time.monotonic() - index.cargado_en)
+        if antiguedad is None or antiguedad > self.max_lag:
+            self.stale += 1
+            return None
+
+        results = index.buscar(referencia, autorizacion)
+        if not results and (referencia or autorizacion):
+            # Puede haber llegado con fecha anterior a la marca: lo confirma la base de datos
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return results, antiguedad
+
+    def _deseados(self):
+        return [local for local, n in self._consultas.most_common(self.max_locales) if n >= self.min_consultas]
+
+    def _cargar(self, locales, fecha):
+        """Carga completa (en un hilo) de los locales indicados en índices nuevos"""
+        # La antigüedad de la recarga cuenta desde el inicio de la consulta, no desde su llegada
+        inicio = time.monotonic()
+        rows = self.db.fetch_changes(COLUMNA_MARCA, None, locales, fecha=fecha, owner='espejo')
+        indices = {local: _LocalIndex(local, inicio) for local in locales}
+        marca = None
+        for row in rows:
+            fila = WatchRow.from_db(row)
+            indices[fila.local].aplicar(fila)
+            if fila.marca is not None and (marca is None or fila.marca > marca):
+                marca = fila.marca
+        return indices, marca
+
+    def _avanzar(self, marca):
+        if marca is not None and (self.marca is None or marca > self.marca):
+            self.marca = marca
+
+    async def run_job(self, context):
+        """Un ciclo: cambio de día, altas y bajas de locales, recargas completas vencidas y lectura incremental"""
+        hoy = datetime.now().strftime("%Y%m%d")
+        if hoy != self.fecha:
+            self.fecha = hoy
+            self._consultas.clear()
+            self._locales.clear()
+            self.marca = None
+            self.sincronizado = None
+
+        deseados = self._deseados()
+        for local in [local for local in self._locales if local not in deseados]:
+            del self._locales[local]
+
+        # Sin margen en la base de datos no se sincroniza; el espejo deja de responder al vencer
+        if not deseados or not self.db.breaker.is_closed:
+            return
+
+        # Locales nuevos y los que vencen su recarga completa, en una sola consulta
+        ahora = time.monotonic()
+        cargar = [local for local in deseados if local not in self._locales]
+        cargar.extend(index.local for index in self._locales.values()
+                      if ahora - index.cargado_en > self.reload_interval)
+
+        inicio = time.monotonic()
+        # La lectura incremental parte de la marca anterior a la carga completa: la marca de la
+        # carga puede ser posterior a filas de los demás locales que aún no se leyeron
+        marca_previa = self.marca
+        marcas = []
+        try:
+            if cargar:
+                indices, marca = await asyncio.to_thread(self._cargar, cargar, hoy)
+                self._locales.update(indices)
+                marcas.append(marca)
+                self.recargas += len(cargar)
+
+            incrementales = [local for local in self._locales if local not in cargar]
+            if incrementales:
+                rows = await asyncio.to_thread(self.db.fetch_changes, COLUMNA_MARCA, marca_previa,
+                                               incrementales, fecha=hoy, owner='espejo')
+                for row in rows:
+                    fila = WatchRow.from_db(row)
+                    index = self._locales.get(fila.local)
+                    if index is not None:
+                        index.aplicar(fila)
+                    marcas.append(fila.marca)
+        except Exception as e:
+            logger.logger.warning(f"Espejo del día: sincronización fallida: {e}")
+            return
+
+        # Solo con las dos lecturas completas avanza la marca
+        for marca in marcas:
+            self._avanzar(marca)
+        self.syncs += 1
+        self.sincronizado = inicio
+
+    def memory_objects(self):
+        """(transacciones reflejadas, objeto a medir) para el reporte de memoria"""
+        return sum(len(index) for index in self._locales.values()), (self._locales, self._consultas)
+
+    def stats(self):
+        antiguedad = self.antiguedad()
+        return {
+            'locales': len(self._locales),
+            'transacciones': sum(len(index) for index in self._locales.values()),
+            'aciertos': self.hits,
+            'fallos': self.misses,
+            'vencidas': self.stale,
+            'sincronizaciones': self.syncs,
+            'recargas': self.recargas,
+            'sincronizado_hace': f"{antiguedad:.1f} s" if antiguedad is not None else None,
+        }
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+import httpx
+from telegram import Chat
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from config.settings import Config
+from utils.logger import logger
+
+
+class _Envio:
+    """Mensaje pendiente en la cola de un chat"""
+
+    __slots__ = ('kind', 'kwargs', 'future', 'deferrable')
+
+    def __init__(self, kind, kwargs, future, deferrable):
+        self.kind = kind
+        self.kwargs = kwargs
+        self.future = future
+        self.deferrable = deferrable
+
+
+class MessageOutbox:
+    """Capa de envío con límite global y por chat, reintentos ante RetryAfter y unión de mensajes cortos"""
+
+    def __init__(self, global_rate=None, chat_interval=None, group_interval=None,
+                 merge_window=None, max_retries=None):
+        self.global_rate = global_rate or Config.OUTBOX_GLOBAL_RATE
+        self.chat_interval = chat_interval if chat_interval is not None else Config.OUTBOX_CHAT_INTERVAL
+        self.group_interval = group_interval if group_interval is not None else Config.OUTBOX_GROUP_INTERVAL
+        self.merge_window = merge_window if merge_window is not None else Config.OUTBOX_MERGE_WINDOW
+        self.max_retries = max_retries if max_retries is not None else Config.OUTBOX_MAX_RETRIES
+
+        self._queues = {}
+        self._workers = {}
+        self._last_sent = {}
+        self._global_sent = deque()
+        self._pause_until = 0.0
+
+        self.sent = 0
+        self.merged = 0
+        self.retries = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    # ========== API ==========
+
+    async def reply_text(self, update, text, wait=False, merge=False, **kwargs):
+        """Equivalente a update.message.reply_text pasando por la cola del chat.
+
+        No espera la entrega: una pausa por RetryAfter no deja al handler bloqueado.
+        """
+        self._quote(update, kwargs)
+        return await self.send_message(update.get_bot(), update.effective_chat.id, text,
+                                       wait=wait, merge=merge, **kwargs)
+
+    async def reply_document(self, update, document, wait=False, **kwargs):
+        """Equivalente a update.message.reply_document pasando por la cola del chat (sin esperar la entrega)"""
+        self._quote(update, kwargs)
+        return await self.send_document(update.get_bot(), update.effective_chat.id, document, wait=wait, **kwargs)
+
+    @staticmethod
+    def _quote(update, kwargs):
+        """Como Message.reply_*: fuera de los chats privados la respuesta cita el mensaje del usuario"""
+        message = update.effective_message
+        if message is None or update.effective_chat.type == Chat.PRIVATE:
+            return
+        if 'reply_to_message_id' not in kwargs:
+            kwargs['reply_to_message_id'] = message.message_id
+            # Si el mensaje se borró mientras estaba en cola, se envía igual sin citarlo
+            kwargs.setdefault('allow_sending_without_reply', True)
+
+    async def send_message(self, bot, chat_id, text, wait=True, merge=False, **kwargs):
+        """Encola un texto. Con wait=False no se espera la entrega; con merge=True puede unirse al siguiente"""
+        kwargs['text'] = text
+        return await self._enqueue(bot, chat_id, 'text', kwargs, wait, merge)
+
+    async def send_document(self, bot, chat_id, document, wait=True, **kwargs):
+        """Encola un documento (ruta, bytes, file_id o archivo abierto)"""
+        if hasattr(document, 'read'):
+            # Se lee ahora para poder reintentar el envío con el mismo contenido
+            kwargs.setdefault('filename', os.path.basename(getattr(document, 'name', 'documento')))
+            document = document.read()
+        kwargs['document'] = document
+        return await self._enqueue(bot, chat_id, 'document', kwargs, wait, merge=False)
+
+    # ========== Cola por chat ==========
+
+    async def _enqueue(self, bot, chat_id, kind, kwargs, wait, merge):
+        future = asyncio.get_running_loop().create_future()
+        if not wait:
+            future.add_done_callback(self._log_unobserved)
+
+        queue = self._queues.setdefault(chat_id, deque())
+        queue.append(_Envio(kind, kwargs, future, deferrable=merge))
+        self.max_depth = max(self.max_depth, len(queue))
+
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.get_running_loop().create_task(self._worker(bot, chat_id))
+
+        if wait:
+            return await future
+        return None
+
+    @staticmethod
+    def _log_unobserved(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.logger.error(f"Mensaje no entregado: {future.exception()}")
+
+    async def _worker(self, bot, chat_id):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                # Un texto que nadie espera se retiene un momento por si llega otro con el que unirse
+                if len(queue) == 1 and queue[0].deferrable and queue[0].kind == 'text':
+                    await asyncio.sleep(self.merge_window)
+
+                await self._wait_slot(chat_id)
+                kind, kwargs, futures = self._pop_batch(queue)
+                await self._deliver(bot, chat_id, kind, kwargs, futures)
+        finally:
+            del self._workers[chat_id]
+            if not queue:
+                self._queues.pop(chat_id, None)
+            self._prune_last_sent()
+
+    def _interval(self, chat_id):
+        return self.group_interval if chat_id < 0 else self.chat_interval
+
+    def _prune_last_sent(self):
+        """Olvida los chats sin cola cuyo último envío ya no limita al siguiente"""
+        now = time.monotonic()
+        vencidos = [chat_id for chat_id, sent in self._last_sent.items()
+                    if chat_id not in self._workers and now - sent >= self._interval(chat_id)]
+        for chat_id in vencidos:
+            del self._last_sent[chat_id]
+
+    def _pop_batch(self, queue):
+        """Saca el siguiente envío uniendo los textos consecutivos que quepan en un mensaje"""
+        first = queue.popleft()
+        if first.kind != 'text':
+            return first.kind, first.kwargs, [first.future]
+
+        kwargs = dict(first.kwargs)
+        futures = [first.future]
+        while queue and queue[0].kind == 'text':
+            siguiente = queue[0].kwargs
+            if siguiente.get('parse_mode') != kwargs.get('parse_mode'):
+                break
+            # Respuestas a mensajes distintos no se unen
+            if siguiente.get('reply_to_message_id') != kwargs.get('reply_to_message_id'):
+                break
+            if len(kwargs['text']) + len(siguiente['text']) + 2 > Config.OUTBOX_MERGE_MAX_CHARS:
+                break
+
+            item = queue.popleft()
+            kwargs['text'] = f"{kwargs['text'].rstrip()}\n\n{siguiente['text'].lstrip()}"
+            # El teclado que queda visible es el del último mensaje
+            if 'reply_markup' in siguiente:
+                kwargs['reply_markup'] = siguiente['reply_markup']
+            futures.append(item.future)
+            self.merged += 1
+
+        return 'text', kwargs, futures
+
+    async def _wait_slot(self, chat_id):
+        """Espera hasta respetar la pausa por RetryAfter, el intervalo del chat y el límite global"""
+        interval = self._interval(chat_id)
+        while True:
+            now = time.monotonic()
+            while self._global_sent and now - self._global_sent[0] >= 1:
+                self._global_sent.popleft()
+
+            wait = max(
+                self._pause_until - now,
+                self._last_sent.get(chat_id, 0) + interval - now,
+                (self._global_sent[0] + 1 - now) if len(self._global_sent) >= self.global_rate else 0,
+            )
+            if wait <= 0:
+                self._global_sent.append(now)
+                self._last_sent[chat_id] = now
+                return
+            await asyncio.sleep(wait)
+
+    async def _deliver(self, bot, chat_id, kind, kwargs, futures):
+        send = bot.send_message if kind == 'text' else bot.send_document
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                message = await send(chat_id=chat_id, **kwargs)
+                self.sent += 1
+                self._resolve(futures, result=message)
+                return
+            except RetryAfter as e:
+                # Límite de Telegram: se pausan todos los envíos el tiempo indicado
+                error = e
+                self.retries += 1
+                self._pause_until = max(self._pause_until, time.monotonic() + e.retry_after)
+                logger.logger.warning(f"RetryAfter de Telegram: pausa de {e.retry_after}s (chat {chat_id})")
+                # El reintento vuelve a ocupar un turno del límite global
+                await self._wait_slot(chat_id)
+            except BadRequest as e:
+                error = e
+                break
+            except TimedOut as e:
+                error = e
+                # Si la petición llegó a salir, Telegram pudo haberla entregado: reenviarla duplicaría
+                # el mensaje. Solo se reintenta si no se llegó a conectar o el pool estaba lleno
+                if not isinstance(e.__cause__, (httpx.ConnectTimeout, httpx.PoolTimeout)):
+                    break
+                self.retries += 1
+                await asyncio.sleep(Config.OUTBOX_BACKOFF_BASE * 2 ** attempt)
+            except NetworkError as e:
+                error = e
+                self.retries += 1
+                await asyncio.sleep(Config.OUTBOX_BACKOFF_BASE * 2 ** attempt)
+            except Exception as e:
+                error = e
+                break
+
+        self.failed += 1
+        self._resolve(futures, error=error)
+
+    @staticmethod
+    def _resolve(futures, result=None, error=None):
+        for future in futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def memory_objects(self):
+        """(mensajes en cola, objeto a medir) para el reporte de memoria"""
+        # _Envio usa __slots__: se miden sus kwargs, que es donde está el contenido
+        pendientes = [envio.kwargs for queue in self._queues.values() for envio in queue]
+        return len(pendientes), (pendientes, self._last_sent)
+
+    def stats(self):
+        """Métricas de la cola de salida"""
+        return {
+            'en_cola': sum(len(q) for q in self._queues.values()),
+            'chats_con_cola': len(self._queues),
+            'profundidad_maxima': self.max_depth,
+            'enviados': self.sent,
+            'unidos': self.merged,
+            'reintentos': self.retries,
+            'fallidos': self.failed,
+            'pausa_restante': max(0.0, round(self._pause_until - time.monotonic(), 1)),
+        }
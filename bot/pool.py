@@ -0,0 +1,77 @@
+import threading
+from collections import deque
+
+from config.settings import Config
+
+
+class ConnectionPool:
+    """Pool sencillo de conexiones reutilizables; las conexiones dañadas se descartan"""
+
+    def __init__(self, factory, max_idle=None):
+        self._factory = factory
+        self.max_idle = max_idle or Config.DB_POOL_SIZE
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.created = 0
+        self.discarded = 0
+
+    def acquire(self):
+        """Entrega una conexión libre o abre una nueva"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self.in_use += 1
+
+        if conn is None:
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._lock:
+                    self.in_use -= 1
+                raise
+            with self._lock:
+                self.created += 1
+
+        return conn
+
+    def release(self, conn, discard=False):
+        """Devuelve la conexión al pool, deshaciendo cualquier transacción pendiente"""
+        with self._lock:
+            self.in_use -= 1
+
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        if not discard:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    return
+
+        self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self.discarded += 1
+
+    def close_all(self):
+        """Cierra las conexiones libres (las que están en uso se cierran al devolverse)"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        return {
+            'libres': len(self._idle),
+            'en_uso': self.in_use,
+            'creadas': self.created,
+            'descartadas': self.discarded,
+        }
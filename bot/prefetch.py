@@ -0,0 +1,175 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from config.settings import Config
+from bot.cache import ResultCache
+from bot.database import QueryCancelledError
+from utils.logger import logger
+
+
+class SpeculativePrefetcher:
+    """Lanza en segundo plano las consultas de "Hoy" y "Ayer" apenas se conoce el local"""
+
+    def __init__(self, db, cache, max_concurrent=None):
+        self.db = db
+        self.cache = cache
+        self.max_concurrent = max_concurrent or Config.PREFETCH_MAX_CONCURRENT
+        # clave de caché -> (tarea asyncio, evento de cancelación)
+        self._tasks = {}
+        # clave de caché -> usuarios interesados en el resultado
+        self._interesados = {}
+        # clave de caché -> connection_id de precargas guardadas que ningún usuario usó todavía;
+        # se registran en el CSV de conexiones recién al usarse
+        self._sin_registrar = OrderedDict()
+        # Presupuesto global: precargas lanzadas que aún no han terminado
+        self._running = 0
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.cancelled = 0
+        self.skipped = 0
+
+    @staticmethod
+    def fechas_probables():
+        """Fechas que la mayoría de usuarios elige en el teclado (Hoy y Ayer)"""
+        hoy = datetime.now()
+        return [hoy.strftime("%Y%m%d"), (hoy - timedelta(days=1)).strftime("%Y%m%d")]
+
+    def start(self, application, user_id, local):
+        """Inicia la precarga de las fechas probables para el local indicado"""
+        # Sin margen en la base de datos no se lanzan consultas especulativas
+        if not self.db.breaker.is_closed:
+            return
+
+        for fecha in self.fechas_probables():
+            key = ResultCache.make_key(local, fecha)
+
+            if key not in self._tasks:
+                if self.cache.get(key) is not None:
+                    continue
+
+                if not self._reserve():
+                    self.skipped += 1
+                    continue
+
+                self.launched += 1
+                cancel_event = threading.Event()
+                task = application.create_task(self._prefetch(key, cancel_event))
+                self._tasks[key] = (task, cancel_event)
+
+            self._interesados.setdefault(key, set()).add(user_id)
+
+    def keep(self, user_id, key):
+        """El usuario eligió una fecha: se cancela la precarga de las demás"""
+        for other in list(self._interesados):
+            if other != key:
+                self._release_interest(user_id, other)
+
+    def cancel_user(self, user_id):
+        """Descarta todas las precargas pendientes de un usuario"""
+        for key in list(self._interesados):
+            self._release_interest(user_id, key)
+
+    async def registrar_uso(self, key):
+        """Un usuario usó el resultado de una precarga: se registra la conexión (una sola vez)"""
+        connection_id = self._sin_registrar.pop(key, None)
+        if connection_id is None:
+            return
+
+        local, fecha, _, _ = key
+        await asyncio.to_thread(self._registrar, local, fecha, connection_id)
+
+    @staticmethod
+    def _registrar(local, fecha, connection_id):
+        logger.log_connection("telegram_user", local, fecha, connection_id, "attempt")
+        logger.log_connection("telegram_user", local, fecha, connection_id, "success")
+        logger.log_query("telegram_user", local, fecha, None, None)
+
+    def pending(self, key):
+        """Indica si hay una precarga en curso para la clave"""
+        return key in self._tasks
+
+    async def wait(self, key):
+        """Espera el resultado de una precarga en curso; None si no hay o fue cancelada"""
+        entry = self._tasks.get(key)
+        if entry is None:
+            return None
+        try:
+            return await asyncio.shield(entry[0])
+        except Exception:
+            return None
+
+    def _release_interest(self, user_id, key):
+        interesados = self._interesados.get(key)
+        if interesados is None:
+            return
+
+        interesados.discard(user_id)
+        if interesados:
+            return
+
+        del self._interesados[key]
+        entry = self._tasks.pop(key, None)
+        if entry is not None and not entry[0].done():
+            # Se marca el evento para que no arranque si aún no lo ha hecho y,
+            # si ya está en SQL Server, se cancela la sentencia
+            entry[1].set()
+            self.db.cancel_owner(('prefetch', key))
+            self.cancelled += 1
+
+    def _reserve(self):
+        with self._lock:
+            if self._running >= self.max_concurrent:
+                return False
+            self._running += 1
+            return True
+
+    def _execute(self, key, cancel_event):
+        """Ejecuta la consulta en un hilo si la precarga no fue cancelada antes de empezar"""
+        if cancel_event.is_set():
+            return None
+
+        local, fecha, _, _ = key
+        # Sin registrar la conexión: una precarga que nadie usa no debe contar en los reportes
+        return self.db.execute_query(merchant_id=local, fecha_transaccion=fecha, owner=('prefetch', key),
+                                     registrar=False)
+
+    async def _prefetch(self, key, cancel_event):
+        try:
+            value = await asyncio.to_thread(self._execute, key, cancel_event)
+            if value is not None:
+                self.cache.set(key, value)
+                self._sin_registrar[key] = value[1]
+                self._sin_registrar.move_to_end(key)
+                # Lo que ya salió de la caché no se va a usar
+                while len(self._sin_registrar) > self.cache.max_entries:
+                    self._sin_registrar.popitem(last=False)
+            return value
+        except QueryCancelledError:
+            return None
+        except Exception as e:
+            logger.logger.warning(f"Precarga fallida para {key[0]} {key[1]}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._running -= 1
+
+            entry = self._tasks.get(key)
+            if entry is not None and entry[0] is asyncio.current_task():
+                del self._tasks[key]
+                self._interesados.pop(key, None)
+
+    def memory_objects(self):
+        """(precargas en curso, objeto a medir) para el reporte de memoria"""
+        return len(self._tasks), (self._interesados, self._sin_registrar)
+
+    def stats(self):
+        """Estadísticas de la precarga especulativa"""
+        return {
+            'en_curso': len(self._tasks),
+            'presupuesto_usado': self._running,
+            'lanzadas': self.launched,
+            'canceladas': self.cancelled,
+            'omitidas_por_presupuesto': self.skipped,
+        }
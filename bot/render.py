@@ -0,0 +1,69 @@
+from functools import lru_cache
+
+from config.settings import Config
+from bot.rows import format_centavos
+
+# Caracteres con significado en el Markdown (legacy) de Telegram
+_MARKDOWN_ESCAPE = str.maketrans({'_': '\\_', '*': '\\*', '`': '\\`', '[': '\\['})
+
+SEPARADOR = '-' * 30
+
+SIN_RESULTADOS = "❌ No se encontraron transacciones con los criterios especificados."
+
+
+def escape_markdown(texto):
+    """Escapa un valor para mostrarlo literal dentro de un mensaje con parse_mode='Markdown'"""
+    texto = str(texto)
+    if '_' in texto or '*' in texto or '`' in texto or '[' in texto:
+        return texto.translate(_MARKDOWN_ESCAPE)
+    return texto
+
+
+# Local, TID, fecha y estado se repiten en casi todas las filas: se escapan una sola vez
+_escape_repetido = lru_cache(maxsize=1024)(escape_markdown)
+
+
+def render_row(row):
+    """Bloque Markdown de una TransactionRow"""
+    return (
+        f"🏪 **Local:** {_escape_repetido(row.local)}\n"
+        f"🆔 **TID:** {_escape_repetido(row.tid)}\n"
+        f"📅 **Fecha:** {_escape_repetido(row.fecha)}\n"
+        f"📊 **Estado:** {_escape_repetido(row.estado or 'Sin estado')}\n"
+        f"🔢 **Referencia:** {escape_markdown(row.referencia)}\n"
+        f"✅ **Autorización:** {escape_markdown(row.autorizacion or 'No disponible')}\n"
+        f"💰 **Valor:** {format_centavos(row.centavos)}\n"
+        f"{SEPARADOR}\n"
+    )
+
+
+def render_rows(rows):
+    """Genera los bloques de cada fila a medida que se consumen"""
+    for row in rows:
+        yield render_row(row)
+
+
+def chunk_messages(bloques, header="", footer="", limit=None):
+    """Agrupa bloques en mensajes de hasta `limit` caracteres sin cortar ningún bloque.
+
+    Los mensajes se producen a medida que se llenan; el encabezado va en el primero y el pie
+    en el último.
+    """
+    limit = limit or Config.MENSAJE_MAX_CHARS
+    partes = [header] if header else []
+    largo = len(header)
+
+    for bloque in bloques:
+        if partes and largo + len(bloque) + 1 > limit:
+            yield "\n".join(partes)
+            partes, largo = [], 0
+        partes.append(bloque)
+        largo += len(bloque) + 1
+
+    if footer:
+        if partes and largo + len(footer) + 1 > limit:
+            yield "\n".join(partes)
+            partes = []
+        partes.append(footer)
+    if partes:
+        yield "\n".join(partes)
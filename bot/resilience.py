@@ -0,0 +1,90 @@
+import threading
+import time
+
+from config.settings import Config
+from utils.logger import logger
+
+
+class CircuitOpenError(Exception):
+    """La base de datos se considera caída: la consulta se rechaza sin intentar conectar"""
+
+
+class CircuitBreaker:
+    """Corta las consultas tras varios fallos seguidos y prueba de nuevo pasado un tiempo"""
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, name="database", failure_threshold=None, reset_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds or Config.CIRCUIT_RESET_SECONDS
+        self.state = self.CERRADO
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Indica si se puede intentar una consulta; en semiabierto solo pasa una prueba"""
+        with self._lock:
+            if self.state == self.CERRADO:
+                return True
+
+            if self.state == self.ABIERTO:
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    return False
+                self.state = self.SEMIABIERTO
+                self._probe_in_flight = False
+                logger.logger.info(f"Circuito {self.name}: semiabierto, probando conexión")
+
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def check(self):
+        """Lanza CircuitOpenError si el circuito no permite la consulta"""
+        if not self.allow_request():
+            raise CircuitOpenError(
+                f"Base de datos no disponible temporalmente (reintento en {self.retry_in()}s)"
+            )
+
+    def retry_in(self):
+        """Segundos que faltan para la próxima prueba de reconexión"""
+        return max(0, int(self.reset_seconds - (time.monotonic() - (self.opened_at or 0))))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CERRADO:
+                logger.logger.info(f"Circuito {self.name}: cerrado, conexión restablecida")
+            self.state = self.CERRADO
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_cancelled(self):
+        """Consulta cancelada por el usuario o con error del SQL: no cuenta como éxito ni como fallo"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+
+            if self.state == self.SEMIABIERTO or self.failures >= self.failure_threshold:
+                if self.state != self.ABIERTO:
+                    logger.logger.warning(f"Circuito {self.name}: abierto tras {self.failures} fallos")
+                self.state = self.ABIERTO
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_closed(self):
+        return self.state == self.CERRADO
+
+    def stats(self):
+        return {
+            'estado': self.state,
+            'fallos': self.failures,
+        }
@@ -0,0 +1,96 @@
+import random
+import threading
+
+from bot.pool import ConnectionPool
+from bot.resilience import CircuitBreaker, CircuitOpenError
+
+
+def parse_endpoints(texto):
+    """Interpreta 'servidor1=3;servidor2=1' como [(servidor, peso)]; el peso por defecto es 1"""
+    endpoints = []
+    for entrada in (texto or '').split(';'):
+        entrada = entrada.strip()
+        if not entrada:
+            continue
+        destino, _, peso = entrada.rpartition('=') if '=' in entrada else (entrada, '', '1')
+        endpoints.append((destino.strip(), max(1, int(peso))))
+    return endpoints
+
+
+class Endpoint:
+    """Servidor de base de datos con su propio pool, circuit breaker y consultas en curso"""
+
+    def __init__(self, name, backend, weight=1, primary=False):
+        self.name = name
+        self.backend = backend
+        self.weight = weight
+        self.primary = primary
+        self.pool = ConnectionPool(backend.connect)
+        self.breaker = CircuitBreaker(name=name)
+        self.outstanding = 0
+        self.served = 0
+
+    def load(self):
+        """Carga relativa al peso: la consulta va al endpoint con menor valor"""
+        return (self.outstanding + 1) / self.weight
+
+    def stats(self):
+        return {
+            **self.breaker.stats(),
+            **self.pool.stats(),
+            'peso': self.weight,
+            'en_curso': self.outstanding,
+            'atendidas': self.served,
+        }
+
+
+class EndpointRouter:
+    """Envía las consultas del día en curso al primario y las de días cerrados a las réplicas.
+
+    Entre réplicas se elige la de menos consultas en curso relativas a su peso; las que tienen
+    el circuito abierto quedan fuera hasta que su prueba de reconexión tenga éxito. Si no queda
+    ninguna réplica disponible se usa el primario.
+    """
+
+    def __init__(self, primary, replicas=()):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self._lock = threading.Lock()
+
+    @property
+    def endpoints(self):
+        return [self.primary, *self.replicas]
+
+    def candidates(self, historico):
+        """Endpoints a intentar, en orden de preferencia"""
+        if not historico or not self.replicas:
+            return [self.primary]
+
+        with self._lock:
+            # Desempate aleatorio para no cargar siempre la primera réplica con igual carga
+            replicas = sorted(self.replicas, key=lambda e: (e.load(), random.random()))
+        return [*replicas, self.primary]
+
+    def acquire(self, historico=False, exclude=()):
+        """Reserva el mejor endpoint disponible; CircuitOpenError si todos están fuera de servicio"""
+        for endpoint in self.candidates(historico):
+            if endpoint in exclude:
+                continue
+            if endpoint.breaker.allow_request():
+                with self._lock:
+                    endpoint.outstanding += 1
+                return endpoint
+
+        if historico and self.replicas:
+            raise CircuitOpenError("Ningún servidor de base de datos disponible temporalmente")
+        raise CircuitOpenError(
+            f"Base de datos no disponible temporalmente (reintento en {self.primary.breaker.retry_in()}s)"
+        )
+
+    def release(self, endpoint):
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.served += 1
+
+    def stats(self):
+        return {endpoint.name: endpoint.stats() for endpoint in self.endpoints}
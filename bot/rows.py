@@ -0,0 +1,50 @@
+import sys
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple
+
+
+def to_centavos(valor):
+    """Convierte Decimal/float/str a centavos enteros (sin errores de redondeo binario)"""
+    if not valor:
+        return 0
+    if not isinstance(valor, Decimal):
+        valor = Decimal(str(valor))
+    return int(valor.scaleb(2).to_integral_value(ROUND_HALF_UP))
+
+
+def format_centavos(centavos):
+    """12345 -> '$123.45'"""
+    signo = '-' if centavos < 0 else ''
+    centavos = abs(centavos)
+    return f"{signo}${centavos // 100:,}.{centavos % 100:02d}"
+
+
+def _texto(valor):
+    # Local, TID, fecha y estado se repiten en muchas filas: se comparte una sola cadena
+    return sys.intern(str(valor).strip()) if valor is not None else ''
+
+
+class TransactionRow(NamedTuple):
+    """Fila de resultado compacta: tupla sin __dict__ y valor en centavos enteros"""
+
+    local: str
+    tid: str
+    fecha: str
+    estado: str
+    referencia: str
+    autorizacion: str
+    centavos: int
+
+    @classmethod
+    def from_db(cls, row):
+        """Crea la fila a partir de un Row de pyodbc (o tupla) de execute_query"""
+        local, tid, fecha, estado, referencia, autorizacion, valor = row
+        return cls(
+            _texto(local),
+            _texto(tid),
+            _texto(fecha),
+            _texto(estado),
+            str(referencia).strip() if referencia is not None else '',
+            str(autorizacion).strip() if autorizacion is not None else '',
+            to_centavos(valor),
+        )
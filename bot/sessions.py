@@ -0,0 +1,58 @@
+import time
+
+from config.settings import Config
+from utils.logger import logger
+
+
+class SessionTracker:
+    """Registra la última actividad por usuario y libera los user_data inactivos"""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or Config.USER_DATA_TTL
+        # Liberar user_data antes de que venza la conversación la dejaría sin sus datos
+        minimo = Config.CONVERSATION_TIMEOUT + Config.SESSION_SWEEP_INTERVAL
+        if self.ttl <= Config.CONVERSATION_TIMEOUT:
+            logger.logger.warning(f"USER_DATA_TTL ({self.ttl}s) no supera CONVERSATION_TIMEOUT "
+                                  f"({Config.CONVERSATION_TIMEOUT}s): se usa {minimo}s")
+            self.ttl = minimo
+        self._last_seen = {}
+        self.evicted = 0
+
+    async def touch(self, update, context):
+        """Handler de grupo -1: se ejecuta antes que el resto para cada update"""
+        if update.effective_user:
+            self._last_seen[update.effective_user.id] = time.monotonic()
+
+    def sweep(self, application, busy=()):
+        """Elimina user_data (y chat_data del chat privado) de usuarios inactivos más de ttl segundos"""
+        now = time.monotonic()
+        expirados = [
+            user_id for user_id, last in self._last_seen.items()
+            if now - last > self.ttl and user_id not in busy
+        ]
+
+        for user_id in expirados:
+            del self._last_seen[user_id]
+            if user_id in application.user_data:
+                application.drop_user_data(user_id)
+            if user_id in application.chat_data:
+                application.drop_chat_data(user_id)
+
+        # user_data creados sin pasar por touch (p. ej. desde jobs) también se liberan
+        for user_id in [u for u in application.user_data if u not in self._last_seen and u not in busy]:
+            application.drop_user_data(user_id)
+            expirados.append(user_id)
+
+        self.evicted += len(expirados)
+        if expirados:
+            logger.logger.info(f"Sesiones inactivas liberadas: {len(expirados)}")
+        return len(expirados)
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def stats(self):
+        return {
+            'usuarios_activos': len(self._last_seen),
+            'liberados': self.evicted,
+        }
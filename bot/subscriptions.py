@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+
+from config.settings import Config
+from utils.helpers import parse_hora
+from utils.logger import logger
+
+TODOS = "todos"
+
+
+class SubscriptionStore:
+    """Suscripciones a reportes programados: chat -> locales (o 'todos'), persistidas en JSON"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.SUBSCRIPTIONS_FILE
+        self._lock = threading.Lock()
+        self._subs = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return {int(chat_id): set(filtros) for chat_id, filtros in json.load(f).items()}
+        except Exception as e:
+            logger.logger.error(f"Error leyendo suscripciones: {e}")
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({str(chat_id): sorted(filtros) for chat_id, filtros in self._subs.items()}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, chat_id, filtro=TODOS):
+        with self._lock:
+            self._subs.setdefault(chat_id, set()).add(filtro)
+            self._save()
+
+    def remove(self, chat_id, filtro=None):
+        """Elimina una suscripción o, sin filtro, todas las del chat. Devuelve cuántas eliminó"""
+        with self._lock:
+            filtros = self._subs.get(chat_id, set())
+            eliminadas = len(filtros) if filtro is None else int(filtro in filtros)
+            if filtro is None:
+                filtros = set()
+            else:
+                filtros.discard(filtro)
+
+            if filtros:
+                self._subs[chat_id] = filtros
+            else:
+                self._subs.pop(chat_id, None)
+            self._save()
+            return eliminadas
+
+    def of(self, chat_id):
+        return sorted(self._subs.get(chat_id, ()))
+
+    def of_all(self):
+        return dict(self._subs)
+
+    def groups(self):
+        """Agrupa los chats por filtro para construir cada reporte una sola vez"""
+        with self._lock:
+            grupos = {}
+            for chat_id, filtros in self._subs.items():
+                for filtro in filtros:
+                    grupos.setdefault(filtro, []).append(chat_id)
+            return grupos
+
+
+class ReportScheduler:
+    """Construye fuera de hora punta los reportes suscritos y los envía a sus suscriptores"""
+
+    def __init__(self, store, outbox):
+        self.store = store
+        self.outbox = outbox
+        # filtro -> (fecha YYYYMMDD, ruta del archivo, file_id de Telegram o None, mensaje)
+        self._precalculados = {}
+        # filtro -> tamaño de cada CSV de conexiones antes de construir el reporte
+        self._tamanos = {}
+        # Una sola construcción a la vez por filtro: comparten el estado incremental
+        self._locks = {}
+
+    def schedule(self, application):
+        """Programa la ejecución diaria en la job queue de la aplicación"""
+        if application.job_queue is None:
+            logger.logger.warning("JobQueue no disponible: instala python-telegram-bot[job-queue]")
+            return
+
+        application.job_queue.run_daily(self.run_job, time=parse_hora(Config.REPORTES_HORA),
+                                        name="reportes_programados")
+        logger.logger.info(f"Reportes programados diariamente a las {Config.REPORTES_HORA} ({Config.TIMEZONE})")
+
+    async def run_job(self, context):
+        """Construye cada reporte suscrito una vez y lo envía a todos sus suscriptores"""
+        for filtro, chats in self.store.groups().items():
+            filepath, message = await self.build(filtro)
+            if not filepath:
+                logger.logger.warning(f"Reporte programado '{filtro}' sin generar: {message}")
+                continue
+
+            for chat_id in chats:
+                try:
+                    await self.send(context.bot, chat_id, filtro)
+                except Exception as e:
+                    logger.logger.error(f"Error enviando reporte programado a {chat_id}: {e}")
+
+    async def build(self, filtro):
+        """Genera (incrementalmente) el reporte del filtro en un hilo"""
+        from utils.report_generator import report_generator
+
+        local_filter = None if filtro == TODOS else filtro
+        async with self._locks.setdefault(filtro, asyncio.Lock()):
+            # Se toma antes de leer: una conexión registrada durante la construcción cuenta como nueva
+            tamanos = await asyncio.to_thread(logger.connection_log_sizes)
+            filepath, message = await asyncio.to_thread(report_generator.build_incremental_report, local_filter)
+            if filepath:
+                self._precalculados[filtro] = (datetime.now().strftime("%Y%m%d"), filepath, None, message)
+                self._tamanos[filtro] = tamanos
+        return filepath, message
+
+    def precalculado(self, filtro):
+        """Devuelve (ruta, file_id, mensaje) del reporte de hoy si ya fue construido"""
+        entry = self._precalculados.get(filtro)
+        if entry is None or entry[0] != datetime.now().strftime("%Y%m%d"):
+            return None
+        return entry[1:]
+
+    async def al_dia(self, filtro):
+        """Indica si no se registraron conexiones desde que se construyó el reporte del filtro"""
+        tamanos = await asyncio.to_thread(logger.connection_log_sizes)
+        return self._tamanos.get(filtro) == tamanos
+
+    async def send(self, bot, chat_id, filtro):
+        """Envía el reporte precalculado reutilizando el file_id tras la primera subida"""
+        entry = self._precalculados.get(filtro)
+        if entry is None:
+            return None
+
+        fecha, filepath, file_id, message = entry
+        if file_id:
+            return await self.outbox.send_document(bot, chat_id, file_id, caption=message)
+
+        with open(filepath, 'rb') as f:
+            sent = await self.outbox.send_document(
+                bot,
+                chat_id,
+                f,
+                filename=os.path.basename(filepath),
+                caption=message
+            )
+        self._precalculados[filtro] = (fecha, filepath, sent.document.file_id, message)
+        return sent
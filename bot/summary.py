@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from config.settings import Config
+from bot.rows import to_centavos
+from utils.logger import logger
+
+ESTADOS = ('Compra Vigente', 'Compra Rechazada', 'Pago Anulado', 'Pago Reversado')
+SIN_ESTADO = 'Sin estado'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    local TEXT NOT NULL,
+    fecha INTEGER NOT NULL,
+    estado TEXT NOT NULL,
+    tid TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    total_centavos INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_resumen_local_fecha ON resumen_diario (local, fecha);
+CREATE TABLE IF NOT EXISTS dias_cerrados (
+    local TEXT NOT NULL,
+    fecha INTEGER NOT NULL,
+    calculado_en TEXT NOT NULL,
+    PRIMARY KEY (local, fecha)
+);
+"""
+
+
+def estado_base(estado):
+    """Agrupa 'Compra Rechazada <motivo>' en 'Compra Rechazada'"""
+    if not estado:
+        return SIN_ESTADO
+    estado = str(estado).strip()
+    for base in ESTADOS:
+        if estado.startswith(base):
+            return base
+    return estado
+
+
+def _agrupar(filas):
+    """(estado, tid, cantidad, centavos) -> filas agrupadas por estado base y TID"""
+    grupos = {}
+    for estado, tid, cantidad, centavos in filas:
+        clave = (estado_base(estado), str(tid).strip() if tid is not None else '')
+        actual = grupos.get(clave, (0, 0))
+        grupos[clave] = (actual[0] + int(cantidad), actual[1] + centavos)
+    return sorted((estado, tid, cantidad, total) for (estado, tid), (cantidad, total) in grupos.items())
+
+
+def resumir_filas(filas):
+    """Filas (estado, tid, cantidad, valor) de execute_summary -> (estado, tid, cantidad, total_centavos)"""
+    return _agrupar((estado, tid, cantidad, to_centavos(valor)) for estado, tid, cantidad, valor in filas)
+
+
+def resumir_resultados(results):
+    """Resumen a partir de las TransactionRow de execute_query (sin consultar la base de datos)"""
+    return _agrupar((row.estado, row.tid, 1, row.centavos) for row in results)
+
+
+def dia_cerrado(fecha, now=None):
+    """Un día (YYYYMMDD) está cerrado RESUMEN_CIERRE_HORAS después de su medianoche final"""
+    now = now or datetime.now()
+    cierre = datetime.strptime(fecha, "%Y%m%d") + timedelta(days=1, hours=Config.RESUMEN_CIERRE_HORAS)
+    return now >= cierre
+
+
+class SummarySnapshot:
+    """Resúmenes materializados de días cerrados en SQLite local"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.RESUMEN_DB
+        self._lock = threading.Lock()
+        self._ready = False
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+        return conn
+
+    def get(self, local, fecha):
+        """Filas (estado, tid, cantidad, total_centavos) del día o None si no está materializado"""
+        if not os.path.exists(self.path):
+            self.misses += 1
+            return None
+
+        conn = self._connect()
+        try:
+            if conn.execute("SELECT 1 FROM dias_cerrados WHERE local = ? AND fecha = ?",
+                            (local, int(fecha))).fetchone() is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return conn.execute(
+                "SELECT estado, tid, cantidad, total_centavos FROM resumen_diario "
+                "WHERE local = ? AND fecha = ? ORDER BY estado, tid",
+                (local, int(fecha))
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def put(self, local, fecha, filas):
+        """Guarda (o reemplaza) el resumen de un día cerrado, incluso si no tuvo transacciones"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM resumen_diario WHERE local = ? AND fecha = ?", (local, int(fecha)))
+                conn.executemany(
+                    "INSERT INTO resumen_diario VALUES (?, ?, ?, ?, ?, ?)",
+                    [(local, int(fecha), *fila) for fila in filas]
+                )
+                conn.execute("INSERT OR REPLACE INTO dias_cerrados VALUES (?, ?, ?)",
+                             (local, int(fecha), datetime.now().isoformat(timespec='seconds')))
+        except Exception as e:
+            logger.logger.error(f"Error guardando resumen {local} {fecha}: {e}")
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {
+            'aciertos': self.hits,
+            'fallos': self.misses,
+        }
+
+
+# Instancia global de los resúmenes materializados
+summary_snapshot = SummarySnapshot()
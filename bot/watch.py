@@ -0,0 +1,273 @@
+import asyncio
+import itertools
+import time
+from typing import NamedTuple
+
+from config.settings import Config
+from bot.render import escape_markdown, render_row
+from bot.rows import TransactionRow, _texto, to_centavos
+from utils.logger import logger
+
+
+class WatchRow(NamedTuple):
+    """Fila individual (sin agrupar) devuelta por DatabaseManager.fetch_watched y fetch_changes"""
+
+    local: str
+    tid: str
+    fecha_display: str
+    fecha: str
+    estado: str
+    tipo: str
+    referencia: str
+    autorizacion: str
+    centavos: int
+    marca: object
+
+    @classmethod
+    def from_db(cls, row):
+        local, tid, fecha_display, fecha, estado, tipo, referencia, autorizacion, valor, marca = row
+        return cls(
+            _texto(local),
+            _texto(tid),
+            _texto(fecha_display),
+            _texto(fecha),
+            str(estado).strip() if estado is not None else '',
+            _texto(tipo),
+            str(referencia).strip() if referencia is not None else '',
+            str(autorizacion).strip() if autorizacion is not None else '',
+            to_centavos(valor),
+            marca,
+        )
+
+
+def _max(actual, nuevo):
+    # MAX de SQL: los vacíos (NULL) no cuentan
+    if not nuevo:
+        return actual
+    return nuevo if not actual or nuevo > actual else actual
+
+
+def nuevo_acumulado(fila):
+    """[tid, fecha, estado, autorización de la compra, otra autorización, centavos] de una referencia"""
+    return [fila.tid, fila.fecha_display, '', '', '', 0]
+
+
+def acumular(acumulado, fila):
+    """Aplica una fila al acumulado de su referencia con el mismo MAX que execute_query (idempotente)"""
+    acumulado[2] = _max(acumulado[2], fila.estado)
+    if fila.tipo == '01':
+        acumulado[3] = _max(acumulado[3], fila.autorizacion)
+    else:
+        acumulado[4] = _max(acumulado[4], fila.autorizacion)
+    acumulado[5] = max(acumulado[5], fila.centavos)
+
+
+def fila_agrupada(local, referencia, acumulado):
+    """TransactionRow equivalente a la fila agrupada de execute_query"""
+    tid, fecha, estado, aut_compra, aut_otra, centavos = acumulado
+    return TransactionRow(local, tid, fecha, estado, referencia, aut_compra or aut_otra, centavos)
+
+
+class Watch:
+    """Vigilancia de una transacción de un local y día por referencia y/o autorización.
+
+    Por cada referencia encontrada acumula el mismo MAX que execute_query sobre todas sus filas,
+    así volver a leer una fila no cambia el resultado.
+    """
+
+    def __init__(self, watch_id, chat_id, user_id, consulta):
+        self.id = watch_id
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.local = consulta['local']
+        self.fecha = consulta['fecha']
+        self.fecha_display = consulta['fecha_display']
+        self.referencia = consulta.get('referencia')
+        self.autorizacion = consulta.get('autorizacion')
+        self.creada = time.monotonic()
+        # referencia -> [tid, fecha, estado, autorización de la compra, otra autorización, centavos]
+        self._acumulado = {}
+        # referencia -> última TransactionRow mostrada al usuario
+        self._notificadas = {}
+
+    @property
+    def referencias(self):
+        return self._acumulado.keys()
+
+    def seed(self, results):
+        """Estado inicial a partir de las TransactionRow de execute_query (ya mostradas al usuario)"""
+        for row in results:
+            self._acumulado[row.referencia] = [row.tid, row.fecha, row.estado, row.autorizacion, '', row.centavos]
+            self._notificadas[row.referencia] = row
+
+    def _coincide(self, fila):
+        if fila.local != self.local or fila.fecha != self.fecha:
+            return False
+        if self.referencia and fila.referencia != self.referencia:
+            return False
+        return not self.autorizacion or fila.autorizacion == self.autorizacion
+
+    def aplicar(self, filas):
+        """Acumula las filas nuevas; devuelve las TransactionRow que aparecieron o cambiaron"""
+        # Primero se descubren las referencias: una anulación puede llegar antes que la compra
+        for fila in filas:
+            if fila.referencia not in self._acumulado and self._coincide(fila):
+                self._acumulado[fila.referencia] = nuevo_acumulado(fila)
+
+        tocadas = set()
+        for fila in filas:
+            acumulado = self._acumulado.get(fila.referencia)
+            if acumulado is None or fila.local != self.local or fila.fecha != self.fecha:
+                continue
+            acumular(acumulado, fila)
+            tocadas.add(fila.referencia)
+
+        cambios = []
+        for referencia in sorted(tocadas):
+            row = fila_agrupada(self.local, referencia, self._acumulado[referencia])
+            if self._notificadas.get(referencia) != row:
+                self._notificadas[referencia] = row
+                cambios.append(row)
+        return cambios
+
+    def describe(self):
+        partes = [self.local, self.fecha_display]
+        if self.referencia:
+            partes.append(f"Ref {self.referencia}")
+        if self.autorizacion:
+            partes.append(f"Aut {self.autorizacion}")
+        return " · ".join(partes)
+
+
+class TransactionWatcher:
+    """Vigilancias de transacciones atendidas por una sola consulta periódica.
+
+    Cada ciclo lee, acotado al local y al día de cada vigilancia, las filas con su propia
+    referencia y/o autorización mientras no aparezca la transacción, y después todas las filas
+    de las referencias encontradas (un cambio de estado actualiza la fila original sin insertar
+    otra). No depende de ninguna marca de tiempo: vigilar un día pasado o una fila registrada con
+    fecha anterior a las de otros locales funciona igual.
+    """
+
+    def __init__(self, db, outbox):
+        self.db = db
+        self.outbox = outbox
+        self._watches = {}
+        self._ids = itertools.count(1)
+        self.ciclos = 0
+        self.filas_leidas = 0
+        self.avisos = 0
+
+    def schedule(self, application):
+        """Programa la consulta periódica en la job queue de la aplicación"""
+        if application.job_queue is None:
+            logger.logger.warning("JobQueue no disponible: /vigilar no enviará avisos")
+            return
+
+        application.job_queue.run_repeating(self.run_job, interval=Config.VIGILAR_INTERVALO, name="vigilancias")
+
+    def __len__(self):
+        return len(self._watches)
+
+    def of(self, user_id):
+        return [watch for watch in self._watches.values() if watch.user_id == user_id]
+
+    def remove_user(self, user_id):
+        """Elimina las vigilancias de un usuario; devuelve cuántas eliminó"""
+        ids = [watch.id for watch in self.of(user_id)]
+        for watch_id in ids:
+            del self._watches[watch_id]
+        return len(ids)
+
+    async def add(self, chat_id, user_id, consulta, owner=None):
+        """Registra la vigilancia y devuelve (vigilancia, resultados actuales).
+
+        La consulta inicial se hace sin caché; cada ciclo vuelve a leer la transacción completa,
+        así que lo que llegue mientras tanto no se pierde.
+        """
+        results, _ = await asyncio.to_thread(
+            self.db.execute_query,
+            merchant_id=consulta['local'],
+            fecha_transaccion=consulta['fecha'],
+            numero_referencia=consulta.get('referencia'),
+            numero_autorizacion=consulta.get('autorizacion'),
+            owner=owner
+        )
+
+        watch = Watch(next(self._ids), chat_id, user_id, consulta)
+        watch.seed(results)
+        self._watches[watch.id] = watch
+        return watch, results
+
+    async def run_job(self, context):
+        """Un ciclo: expira vigilancias vencidas y lee los cambios de todas las activas"""
+        await self._expirar(context.bot)
+        if not self._watches:
+            return
+
+        watches = list(self._watches.values())
+        # Sin transacción encontrada se busca por los datos de la vigilancia; después, por sus referencias
+        busquedas = list(dict.fromkeys(
+            (watch.local, watch.fecha, watch.referencia, watch.autorizacion)
+            for watch in watches if not watch.referencias
+        ))
+        encontradas = {}
+        for watch in watches:
+            if watch.referencias:
+                encontradas.setdefault((watch.local, watch.fecha), set()).update(watch.referencias)
+        try:
+            rows = await asyncio.to_thread(
+                self.db.fetch_watched, busquedas,
+                {clave: sorted(referencias) for clave, referencias in encontradas.items()}
+            )
+        except Exception as e:
+            # Circuito abierto o error puntual: se reintenta en el próximo ciclo
+            logger.logger.warning(f"Vigilancias: no se pudieron leer cambios: {e}")
+            return
+
+        filas = [WatchRow.from_db(row) for row in rows]
+        self.ciclos += 1
+        self.filas_leidas += len(filas)
+        avisos = [(watch, row) for watch in watches for row in watch.aplicar(filas)]
+
+        for watch, row in avisos:
+            self.avisos += 1
+            try:
+                await self.outbox.send_message(
+                    context.bot,
+                    watch.chat_id,
+                    f"🔔 **Novedad en la transacción vigilada**\n{escape_markdown(watch.describe())}\n\n"
+                    f"{render_row(row)}\nℹ️ La vigilancia sigue activa. Usa /vigilar parar para detenerla.",
+                    wait=False,
+                    merge=True,
+                    parse_mode='Markdown'
+                )
+            except Exception as e:
+                logger.logger.error(f"Error enviando aviso de vigilancia a {watch.chat_id}: {e}")
+
+    async def _expirar(self, bot):
+        limite = time.monotonic() - Config.VIGILAR_DURACION
+        for watch in [w for w in self._watches.values() if w.creada < limite]:
+            del self._watches[watch.id]
+            try:
+                await self.outbox.send_message(
+                    bot,
+                    watch.chat_id,
+                    f"⌛ Terminó la vigilancia de {watch.describe()}.",
+                    wait=False,
+                    merge=True
+                )
+            except Exception as e:
+                logger.logger.error(f"Error avisando fin de vigilancia a {watch.chat_id}: {e}")
+
+    def memory_objects(self):
+        """(vigilancias, objeto a medir) para el reporte de memoria"""
+        return len(self._watches), self._watches
+
+    def stats(self):
+        return {
+            'activas': len(self._watches),
+            'ciclos': self.ciclos,
+            'filas_leidas': self.filas_leidas,
+            'avisos': self.avisos,
+        }
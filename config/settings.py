@@ -13,9 +13,122 @@ class Config:
     DB_USER = os.getenv('DATABASE_USER', 'ConsultaSD')
     DB_PASSWORD = os.getenv('DATABASE_PASSWORD', 'soporte*88')
 
+    # Réplicas de lectura para días cerrados: 'servidor=peso;servidor=peso' (peso por defecto 1).
+    # El día en curso siempre se consulta en DATABASE_SERVER
+    DB_READ_REPLICAS = os.getenv('DB_READ_REPLICAS', '')
+
+    # Backend de base de datos: 'sqlserver' (producción) o 'sqlite' (base local generada con
+    # python -m utils.synthetic_data para pruebas y mediciones sin conexión al servidor)
+    DB_BACKEND = os.getenv('DB_BACKEND', 'sqlserver')
+    DB_SQLITE_PATH = os.getenv('DB_SQLITE_PATH', os.path.join('data', 'bd_engine_kfc.sqlite'))
+
+    # Timeouts (segundos) de conexión y de ejecución de cada consulta;
+    # al vencer DB_QUERY_TIMEOUT la sentencia se cancela en el servidor
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+    DB_QUERY_TIMEOUT = int(os.getenv('DB_QUERY_TIMEOUT', '30'))
+
+    # Conexiones libres que se mantienen abiertas para reutilizar
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+
+    # Circuit breaker: fallos seguidos para abrir y segundos antes de probar de nuevo
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+    CIRCUIT_RESET_SECONDS = int(os.getenv('CIRCUIT_RESET_SECONDS', '30'))
+
+    # Updates procesados a la vez (los de un mismo chat siempre en orden) y máximo aceptados en espera
+    CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '16'))
+    UPDATES_MAX_PENDING = int(os.getenv('UPDATES_MAX_PENDING', '256'))
+
+    # Envío de mensajes: mensajes/segundo globales, segundos entre mensajes a un mismo chat
+    # (privado y grupo), espera para unir textos cortos, tamaño máximo unido y reintentos
+    OUTBOX_GLOBAL_RATE = int(os.getenv('OUTBOX_GLOBAL_RATE', '25'))
+    OUTBOX_CHAT_INTERVAL = float(os.getenv('OUTBOX_CHAT_INTERVAL', '0.5'))
+    OUTBOX_GROUP_INTERVAL = float(os.getenv('OUTBOX_GROUP_INTERVAL', '3'))
+    OUTBOX_MERGE_WINDOW = float(os.getenv('OUTBOX_MERGE_WINDOW', '0.3'))
+    OUTBOX_MERGE_MAX_CHARS = int(os.getenv('OUTBOX_MERGE_MAX_CHARS', '3800'))
+    OUTBOX_MAX_RETRIES = int(os.getenv('OUTBOX_MAX_RETRIES', '3'))
+    OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', '0.5'))
+
+    # Resultados de consultas: caracteres por mensaje (Telegram admite 4096) y filas mostradas como máximo
+    MENSAJE_MAX_CHARS = int(os.getenv('MENSAJE_MAX_CHARS', '3800'))
+    RESULTADOS_MAX_FILAS = int(os.getenv('RESULTADOS_MAX_FILAS', '100'))
+
+    # Vigilancia de transacciones (/vigilar): segundos entre lecturas, duración de cada vigilancia
+    # y máximo por usuario
+    VIGILAR_INTERVALO = int(os.getenv('VIGILAR_INTERVALO', '60'))
+    VIGILAR_DURACION = int(os.getenv('VIGILAR_DURACION', '7200'))
+    VIGILAR_MAX_POR_USUARIO = int(os.getenv('VIGILAR_MAX_POR_USUARIO', '5'))
+
+    # Administradores (IDs de Telegram separados por comas) para comandos internos
+    ADMIN_IDS = {int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()}
+
+    # Sesiones: expiración de conversaciones abandonadas y limpieza de user_data inactivos (segundos);
+    # USER_DATA_TTL debe superar CONVERSATION_TIMEOUT (si no, se ajusta al arrancar)
+    CONVERSATION_TIMEOUT = int(os.getenv('CONVERSATION_TIMEOUT', '600'))
+    USER_DATA_TTL = int(os.getenv('USER_DATA_TTL', '3600'))
+    SESSION_SWEEP_INTERVAL = int(os.getenv('SESSION_SWEEP_INTERVAL', '300'))
+
     # Logging configuration
     LOG_DIR = 'logs'
 
+    # /logs (administradores): registros mostrados por defecto y como máximo, y caracteres por registro
+    LOGS_LINEAS_DEFECTO = int(os.getenv('LOGS_LINEAS_DEFECTO', '20'))
+    LOGS_LINEAS_MAX = int(os.getenv('LOGS_LINEAS_MAX', '200'))
+    LOGS_MAX_CHARS_REGISTRO = int(os.getenv('LOGS_MAX_CHARS_REGISTRO', '600'))
+
+    # Zona horaria para tareas programadas
+    TIMEZONE = os.getenv('TIMEZONE', 'America/Guayaquil')
+
+    # Reportes programados: hora de generación (HH:MM) y archivo de suscripciones
+    REPORTES_HORA = os.getenv('REPORTES_HORA', '05:30')
+    SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE', os.path.join(LOG_DIR, 'suscripciones.json'))
+
+    # Resumen diario (/resumen): base SQLite con los días cerrados y horas tras la medianoche
+    # en que un día se considera cerrado (reversos y anulaciones tardías)
+    RESUMEN_DB = os.getenv('RESUMEN_DB', os.path.join(LOG_DIR, 'resumenes.sqlite'))
+    RESUMEN_CIERRE_HORAS = int(os.getenv('RESUMEN_CIERRE_HORAS', '2'))
+
+    # Compactación de los CSV mensuales de conexiones: hora diaria, días de margen tras el
+    # cierre del mes, meses a conservar (0 = sin límite) y bytes mapeados en memoria al leer
+    COMPACTACION_HORA = os.getenv('COMPACTACION_HORA', '04:30')
+    COMPACTACION_GRACIA_DIAS = int(os.getenv('COMPACTACION_GRACIA_DIAS', '3'))
+    REPORTES_RETENCION_MESES = int(os.getenv('REPORTES_RETENCION_MESES', '12'))
+    COMPACTACION_MMAP_BYTES = int(os.getenv('COMPACTACION_MMAP_BYTES', str(256 * 1024 * 1024)))
+
+    # Módulos pesados que se precargan en segundo plano tras post_init
+    PREWARM_MODULES = ('pyodbc', 'pandas', 'openpyxl')
+
+    # Caché de resultados de consultas (segundos)
+    RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', '900'))
+    RESULT_CACHE_TTL_HOY = int(os.getenv('RESULT_CACHE_TTL_HOY', '60'))
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '500'))
+    # Antigüedad máxima de un resultado vencido que se muestra si la base de datos está caída
+    RESULT_CACHE_STALE_MAX = int(os.getenv('RESULT_CACHE_STALE_MAX', '86400'))
+
+    # Precarga especulativa de "Hoy" y "Ayer" al ingresar el local
+    PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'false').lower() == 'true'
+    PREFETCH_MAX_CONCURRENT = int(os.getenv('PREFETCH_MAX_CONCURRENT', '4'))
+
+    # Espejo en memoria de las transacciones de hoy de los locales más consultados: máximo de
+    # locales, consultas del día para entrar, segundos entre sincronizaciones incrementales,
+    # antigüedad máxima con la que se responde (incluye la última recarga completa del local, la
+    # única que recoge cambios de estado) y segundos entre recargas completas (menor que la anterior)
+    MIRROR_ENABLED = os.getenv('MIRROR_ENABLED', 'false').lower() == 'true'
+    MIRROR_MAX_LOCALES = int(os.getenv('MIRROR_MAX_LOCALES', '20'))
+    MIRROR_MIN_CONSULTAS = int(os.getenv('MIRROR_MIN_CONSULTAS', '3'))
+    MIRROR_SYNC_INTERVAL = int(os.getenv('MIRROR_SYNC_INTERVAL', '10'))
+    MIRROR_MAX_LAG = int(os.getenv('MIRROR_MAX_LAG', '60'))
+    MIRROR_RELOAD_INTERVAL = int(os.getenv('MIRROR_RELOAD_INTERVAL', '40'))
+
+    # Consultas inline (@bot kfc004 06/10/2025 ...)
+    INLINE_DEBOUNCE_SECONDS = float(os.getenv('INLINE_DEBOUNCE_SECONDS', '0.6'))
+    INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+    INLINE_CACHE_TIME_HOY = int(os.getenv('INLINE_CACHE_TIME_HOY', '30'))
+    INLINE_MAX_RESULTS = int(os.getenv('INLINE_MAX_RESULTS', '20'))
+
+    # Catálogo de locales válidos (refresco en segundos y ventana de días consultada)
+    CATALOG_REFRESH_SECONDS = int(os.getenv('CATALOG_REFRESH_SECONDS', '3600'))
+    CATALOG_DIAS = int(os.getenv('CATALOG_DIAS', '90'))
+
 
 # Instancia global de configuración
 config = Config()
\ No newline at end of file
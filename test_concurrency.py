@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.concurrency import ChatOrderedUpdateProcessor
+
+
+def update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=None)
+
+
+def test_mismo_chat_en_orden_de_llegada():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_concurrent=4, max_pending=10)
+        orden, en_curso, maximo = [], [0], [0]
+
+        async def handler(n, demora):
+            en_curso[0] += 1
+            maximo[0] = max(maximo[0], en_curso[0])
+            await asyncio.sleep(demora)
+            orden.append(n)
+            en_curso[0] -= 1
+
+        # El primero es el más lento: aun así los siguientes esperan su turno
+        await asyncio.gather(*(
+            processor.process_update(update(1), handler(n, demora))
+            for n, demora in enumerate((0.05, 0.01, 0))
+        ))
+        return processor, orden, maximo[0]
+
+    processor, orden, maximo = asyncio.run(run())
+    assert orden == [0, 1, 2]
+    assert maximo == 1
+    assert processor.stats()['chats_activos'] == 0
+    assert processor.processed == 3
+
+
+def test_chats_distintos_en_paralelo():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_concurrent=4, max_pending=10)
+        evento = asyncio.Event()
+
+        async def espera():
+            await evento.wait()
+
+        async def libera():
+            evento.set()
+
+        # Si los chats se atendieran en serie, el primero no terminaría nunca
+        await asyncio.wait_for(asyncio.gather(
+            processor.process_update(update(1), espera()),
+            processor.process_update(update(2), libera()),
+        ), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_limite_de_ejecucion_simultanea():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_concurrent=2, max_pending=10)
+        en_curso, maximo = [0], [0]
+
+        async def handler():
+            en_curso[0] += 1
+            maximo[0] = max(maximo[0], en_curso[0])
+            await asyncio.sleep(0.02)
+            en_curso[0] -= 1
+
+        await asyncio.gather(*(processor.process_update(update(chat), handler()) for chat in range(6)))
+        return processor, maximo[0]
+
+    processor, maximo = asyncio.run(run())
+    assert maximo == 2
+    assert processor.processed == 6
+
+
+if __name__ == "__main__":
+    print("🧪 Probando el procesamiento concurrente de updates...")
+    test_mismo_chat_en_orden_de_llegada()
+    test_chats_distintos_en_paralelo()
+    test_limite_de_ejecucion_simultanea()
+    print("✅ Updates: orden por chat y paralelismo entre chats correctos")
@@ -0,0 +1,147 @@
+import os
+import sys
+
+import pytest
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import log_search
+from utils.log_search import LogIndex, LogSearcher
+
+
+def registro(hora, nivel, mensaje):
+    return f"2026-10-19 {hora},123 - KFCBot - {nivel} - {mensaje}\n"
+
+
+def escribir(path, texto, modo='a'):
+    with open(path, modo, encoding='utf-8') as f:
+        f.write(texto)
+
+
+def log_del_dia(tmp_path):
+    carpeta = tmp_path / '2026-10'
+    carpeta.mkdir(exist_ok=True)
+    return str(carpeta / '2026-10-19.log')
+
+
+class RecordStartEspia:
+    """Envuelve RECORD_START para registrar desde qué byte se recorre el log"""
+
+    def __init__(self, original):
+        self.original = original
+        self.desde = []
+
+    def finditer(self, data, pos, endpos):
+        self.desde.append(pos)
+        return self.original.finditer(data, pos, endpos)
+
+
+def test_actualizacion_incremental_solo_recorre_lo_agregado(tmp_path, monkeypatch):
+    path = log_del_dia(tmp_path)
+    escribir(path, registro('10:00:00', 'INFO', 'inicio') + registro('10:00:01', 'ERROR', 'falla'))
+
+    espia = RecordStartEspia(log_search.RECORD_START)
+    monkeypatch.setattr(log_search, 'RECORD_START', espia)
+
+    index = LogIndex(path)
+    primera = index.update()
+    assert len(index.entries) == 2
+    assert primera == os.path.getsize(path)
+
+    escribir(path, registro('10:00:02', 'WARNING', 'lento') + "Traceback (most recent call last):\n")
+    assert index.update() == os.path.getsize(path)
+    assert espia.desde == [0, primera]
+
+    # El traceback pertenece al registro anterior
+    assert [index.level(i) for i in range(len(index.entries))] == [1, 3, 2]
+    inicio, fin = index.bounds(2)
+    assert fin == index.covered and fin - inicio > len(registro('10:00:02', 'WARNING', 'lento'))
+
+    # Sin cambios no se vuelve a leer el log
+    index.update()
+    assert espia.desde == [0, primera]
+
+
+def test_linea_a_medio_escribir_queda_para_la_proxima(tmp_path):
+    path = log_del_dia(tmp_path)
+    completo = registro('10:00:00', 'INFO', 'inicio')
+    escribir(path, completo + "2026-10-19 10:00:01,123 - KFCBot - ERR")
+
+    index = LogIndex(path)
+    assert index.update() == len(completo)
+    assert len(index.entries) == 1
+
+    escribir(path, "OR - falla\n")
+    assert index.update() == os.path.getsize(path)
+    assert index.level(1) == 3
+
+
+def test_log_truncado_reconstruye_el_indice(tmp_path):
+    path = log_del_dia(tmp_path)
+    escribir(path, ''.join(registro(f'10:00:0{n}', 'INFO', f'mensaje {n}') for n in range(5)))
+    index = LogIndex(path)
+    index.update()
+    assert len(index.entries) == 5
+
+    # Rotado o truncado: el log queda más corto que lo ya indexado
+    escribir(path, registro('11:00:00', 'ERROR', 'nuevo'), modo='w')
+    assert index.update() == os.path.getsize(path)
+    assert len(index.entries) == 1 and index.level(0) == 3
+
+    # El índice persistido también refleja la reconstrucción
+    recargado = LogIndex(path)
+    assert list(recargado.entries) == list(index.entries)
+    assert recargado.covered == index.covered
+
+
+def test_indice_borrado_se_reconstruye(tmp_path):
+    path = log_del_dia(tmp_path)
+    escribir(path, registro('10:00:00', 'INFO', 'uno') + registro('10:00:01', 'INFO', 'dos'))
+    index = LogIndex(path)
+    index.update()
+
+    os.remove(index.idx_path)
+    escribir(path, registro('10:00:02', 'INFO', 'tres'))
+    index.update()
+    assert len(index.entries) == 3
+
+    recargado = LogIndex(path)
+    assert len(recargado.entries) == 3
+    assert recargado.covered == os.path.getsize(path)
+
+
+def test_indice_persistido_se_retoma_sin_releer(tmp_path):
+    path = log_del_dia(tmp_path)
+    escribir(path, registro('10:00:00', 'INFO', 'uno') + registro('10:00:01', 'WARNING', 'dos'))
+    index = LogIndex(path)
+    index.update()
+
+    recargado = LogIndex(path)
+    assert list(recargado.entries) == list(index.entries)
+    assert recargado.covered == index.covered
+
+    escribir(path, registro('10:00:02', 'ERROR', 'tres'))
+    recargado.update()
+    assert [recargado.level(i) for i in range(3)] == [1, 2, 3]
+
+
+def test_busqueda_por_nivel_y_texto(tmp_path):
+    path = log_del_dia(tmp_path)
+    escribir(path, registro('10:00:00', 'INFO', 'consulta KFC001')
+             + registro('10:00:01', 'ERROR', 'timeout KFC001')
+             + registro('10:00:02', 'ERROR', 'timeout KFC002')
+             + registro('10:00:03', 'WARNING', 'lento kfc001'))
+
+    searcher = LogSearcher(str(tmp_path))
+    assert [r.split(' - ')[-1] for r in searcher.search(nivel='warning', limite=10)] == [
+        'timeout KFC001', 'timeout KFC002', 'lento kfc001']
+    assert [r.split(' - ')[-1] for r in searcher.search(textos=('kfc001',), nivel='ERROR', limite=10)] == [
+        'timeout KFC001']
+    assert [r.split(' - ')[-1] for r in searcher.search(textos=('KFC001',), limite=2)] == [
+        'timeout KFC001', 'lento kfc001']
+
+
+if __name__ == "__main__":
+    print("🧪 Probando el índice de los logs...")
+    sys.exit(pytest.main([__file__, '-q']))
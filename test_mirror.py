@@ -0,0 +1,129 @@
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.mirror import TodayMirror
+
+
+class FakeDatabase:
+    """Base de datos en memoria con la misma interfaz de fetch_changes que DatabaseManager"""
+
+    def __init__(self):
+        self.breaker = SimpleNamespace(is_closed=True)
+        self.filas = []
+        self.falla = False
+
+    def insertar(self, local, fecha, referencia, marca, estado='Compra Vigente'):
+        self.filas.append((local, '11111111', f"{fecha[6:]}/{fecha[4:6]}/{fecha[:4]}", fecha, estado,
+                           '01', referencia, f"A{referencia}", '10.00', marca))
+
+    def fetch_changes(self, columna, desde, locales, fecha=None, owner=None):
+        if self.falla:
+            raise RuntimeError("sin conexión")
+        return [
+            fila for fila in self.filas
+            if fila[0] in locales
+            and (fecha is None or fila[3] == fecha)
+            and (desde is None or fila[9] >= desde)
+        ]
+
+
+def sincronizar(mirror):
+    asyncio.run(mirror.run_job(None))
+
+
+def test_carga_de_local_nuevo_no_salta_filas_de_los_demas():
+    db = FakeDatabase()
+    mirror = TodayMirror(db, max_locales=10, min_consultas=1, max_lag=60)
+    hoy = mirror.fecha
+
+    db.insertar('KFC001', hoy, 'r1', marca=1)
+    mirror.registrar('KFC001', hoy)
+    sincronizar(mirror)
+    assert mirror.marca == 1
+
+    # Llega una fila de KFC001 y, con marca posterior, una de KFC003 que además pasa a reflejarse
+    db.insertar('KFC001', hoy, 'r2', marca=4)
+    db.insertar('KFC003', hoy, 'r3', marca=5)
+    mirror.registrar('KFC003', hoy)
+    sincronizar(mirror)
+
+    resultados, _ = mirror.lookup('KFC001', hoy, 'r2')
+    assert [row.referencia for row in resultados] == ['r2']
+    resultados, _ = mirror.lookup('KFC003', hoy, 'r3')
+    assert [row.referencia for row in resultados] == ['r3']
+    assert mirror.marca == 5
+
+
+def test_sincronizacion_fallida_no_avanza_la_marca():
+    db = FakeDatabase()
+    mirror = TodayMirror(db, max_locales=10, min_consultas=1, max_lag=60)
+    hoy = mirror.fecha
+
+    db.insertar('KFC001', hoy, 'r1', marca=1)
+    mirror.registrar('KFC001', hoy)
+    sincronizar(mirror)
+
+    db.insertar('KFC001', hoy, 'r2', marca=4)
+    db.falla = True
+    sincronizar(mirror)
+    assert mirror.marca == 1
+
+    db.falla = False
+    sincronizar(mirror)
+    resultados, _ = mirror.lookup('KFC001', hoy, 'r2')
+    assert [row.referencia for row in resultados] == ['r2']
+
+
+def test_referencia_ausente_no_responde_desde_el_espejo():
+    db = FakeDatabase()
+    mirror = TodayMirror(db, max_locales=10, min_consultas=1, max_lag=60)
+    hoy = mirror.fecha
+
+    db.insertar('KFC001', hoy, 'r1', marca=5)
+    mirror.registrar('KFC001', hoy)
+    sincronizar(mirror)
+
+    # Una fila con fecha atrasada no entra por la lectura incremental: decide la base de datos
+    db.insertar('KFC001', hoy, 'r0', marca=2)
+    sincronizar(mirror)
+    assert mirror.lookup('KFC001', hoy, 'r0') is None
+    resultados, _ = mirror.lookup('KFC001', hoy)
+    assert [row.referencia for row in resultados] == ['r1']
+
+
+def test_antiguedad_incluye_la_ultima_recarga_completa():
+    db = FakeDatabase()
+    mirror = TodayMirror(db, max_locales=10, min_consultas=1, max_lag=60)
+    hoy = mirror.fecha
+
+    db.insertar('KFC001', hoy, 'r1', marca=1)
+    mirror.registrar('KFC001', hoy)
+    sincronizar(mirror)
+
+    # Sincronizado al día, pero sin recarga completa desde hace más de MIRROR_MAX_LAG
+    mirror._locales['KFC001'].cargado_en -= 120
+    mirror.sincronizado = time.monotonic()
+    assert mirror.lookup('KFC001', hoy, 'r1') is None
+    assert mirror.stale == 1
+
+    # La recarga vencida devuelve el local al espejo con el estado al día
+    db.filas[0] = db.filas[0][:4] + ('Compra Anulada',) + db.filas[0][5:]
+    sincronizar(mirror)
+    resultados, antiguedad = mirror.lookup('KFC001', hoy, 'r1')
+    assert [row.estado for row in resultados] == ['Compra Anulada']
+    assert antiguedad < 60
+
+
+if __name__ == "__main__":
+    print("🧪 Probando la sincronización del espejo del día...")
+    test_carga_de_local_nuevo_no_salta_filas_de_los_demas()
+    test_sincronizacion_fallida_no_avanza_la_marca()
+    test_referencia_ausente_no_responde_desde_el_espejo()
+    test_antiguedad_incluye_la_ultima_recarga_completa()
+    print("✅ Espejo del día: sin filas perdidas ni respuestas más viejas que MIRROR_MAX_LAG")
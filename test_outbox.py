@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import httpx
+from telegram.error import RetryAfter, TimedOut
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.outbox import MessageOutbox
+
+
+class FakeBot:
+    """Bot que registra los envíos y falla con los errores indicados, en orden"""
+
+    def __init__(self, errores=()):
+        self.errores = list(errores)
+        self.enviados = []
+
+    async def send_message(self, chat_id, **kwargs):
+        if self.errores:
+            error, causa = self.errores.pop(0)
+            raise error from causa
+        self.enviados.append((chat_id, kwargs))
+        return SimpleNamespace(chat_id=chat_id, text=kwargs['text'])
+
+
+def outbox(**kwargs):
+    kwargs.setdefault('chat_interval', 0)
+    kwargs.setdefault('group_interval', 0)
+    kwargs.setdefault('merge_window', 0.05)
+    return MessageOutbox(**kwargs)
+
+
+def update(bot, chat_id, tipo, message_id):
+    return SimpleNamespace(
+        get_bot=lambda: bot,
+        effective_chat=SimpleNamespace(id=chat_id, type=tipo),
+        effective_message=SimpleNamespace(message_id=message_id),
+    )
+
+
+async def esperar_cola(cola):
+    while cola.stats()['en_cola'] or cola._workers:
+        await asyncio.sleep(0.01)
+
+
+def test_textos_cortos_se_unen():
+    async def run():
+        bot, cola = FakeBot(), outbox()
+        await cola.send_message(bot, 1, "resumen", wait=False, merge=True)
+        mensaje = await cola.send_message(bot, 1, "resultado")
+        return bot, cola, mensaje
+
+    bot, cola, mensaje = asyncio.run(run())
+    assert [kwargs['text'] for _, kwargs in bot.enviados] == ["resumen\n\nresultado"]
+    assert mensaje.text == "resumen\n\nresultado"
+    assert cola.merged == 1
+
+
+def test_retry_after_pausa_y_reintenta():
+    async def run():
+        bot, cola = FakeBot(errores=[(RetryAfter(1), None)]), outbox()
+        inicio = time.monotonic()
+        await cola.send_message(bot, 1, "hola")
+        return bot, cola, time.monotonic() - inicio
+
+    bot, cola, duracion = asyncio.run(run())
+    assert duracion >= 1
+    assert [kwargs['text'] for _, kwargs in bot.enviados] == ["hola"]
+    assert cola.retries == 1 and cola.failed == 0
+
+
+def test_timeout_de_lectura_no_reenvia():
+    async def run():
+        bot = FakeBot(errores=[(TimedOut(), httpx.ReadTimeout("lectura")),
+                               (TimedOut(), httpx.ConnectTimeout("conexión"))])
+        cola = outbox(max_retries=3)
+        try:
+            await cola.send_message(bot, 1, "puede haber llegado")
+        except TimedOut:
+            pass
+        else:
+            raise AssertionError("se esperaba TimedOut")
+        # Si no llegó a conectar, el reintento es seguro
+        await cola.send_message(bot, 1, "no salió")
+        return bot
+
+    bot = asyncio.run(run())
+    assert [kwargs['text'] for _, kwargs in bot.enviados] == ["no salió"]
+
+
+def test_respuesta_cita_el_mensaje_solo_en_grupos():
+    async def run():
+        bot, cola = FakeBot(), outbox()
+        await cola.reply_text(update(bot, 5, 'private', 10), "privado")
+        await cola.reply_text(update(bot, -100, 'group', 11), "primera", merge=True)
+        await cola.reply_text(update(bot, -100, 'group', 12), "segunda")
+        await esperar_cola(cola)
+        return bot
+
+    bot = asyncio.run(run())
+    enviados = {kwargs['text']: kwargs for _, kwargs in bot.enviados}
+    assert 'reply_to_message_id' not in enviados["privado"]
+    # Respuestas a preguntas distintas no se unen
+    assert enviados["primera"]['reply_to_message_id'] == 11
+    assert enviados["segunda"]['reply_to_message_id'] == 12
+
+
+if __name__ == "__main__":
+    print("🧪 Probando la cola de salida...")
+    test_textos_cortos_se_unen()
+    test_retry_after_pausa_y_reintenta()
+    test_timeout_de_lectura_no_reenvia()
+    test_respuesta_cita_el_mensaje_solo_en_grupos()
+    print("✅ Cola de salida: unión, RetryAfter, timeouts y citas correctos")
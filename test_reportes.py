@@ -1,5 +1,6 @@
-import sys
+import csv
 import os
+import sys
 
 # Agregar el directorio actual al path
 sys.path.append(os.path.dirname(__file__))
@@ -32,5 +33,49 @@ def test_imports():
         return False
 
 
+def _escribir_csv(path, filas):
+    from utils.log_compaction import CSV_COLUMNS
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(filas)
+
+
+def test_reporte_programado_incluye_meses_compactados(tmp_path, monkeypatch):
+    from config.settings import Config
+    from utils.log_compaction import log_compactor
+    from utils.logger import logger
+    from utils.report_generator import report_generator
+
+    report_dir = tmp_path / 'logs' / 'reportes'
+    report_dir.mkdir(parents=True)
+    monkeypatch.setattr(Config, 'LOG_DIR', str(tmp_path / 'logs'))
+    monkeypatch.setattr(Config, 'REPORTES_RETENCION_MESES', 0)
+    monkeypatch.setattr(log_compactor, 'report_dir', str(report_dir))
+    monkeypatch.setattr(report_generator, 'reports_dir', str(tmp_path / 'reports'))
+
+    # Mes cerrado y compactado (el CSV desaparece) y mes en curso todavía en CSV
+    cerrado = report_dir / 'conexiones_2025-10.csv'
+    _escribir_csv(cerrado, [
+        [f'c{i}', 'KFC004', '20251005', '2025-10-05', '10:00:00', 'u', 'success'] for i in range(4)
+    ] + [['c9', 'KFC001', '20251005', '2025-10-05', '10:00:00', 'u', 'success']])
+    log_compactor.compact_file(str(cerrado))
+    assert not cerrado.exists()
+    _escribir_csv(report_dir / 'conexiones_2025-11.csv', [
+        ['c10', 'KFC004', '20251102', '2025-11-02', '09:00:00', 'u', 'success'],
+    ])
+
+    # Estado nuevo creado después de la compactación (suscripción nueva)
+    assert len(logger.get_connection_data(local_filter='KFC004')) == 5
+    filepath, message = report_generator.build_incremental_report('KFC004')
+    assert filepath, message
+    assert '5 registros (5 nuevos)' in message
+
+    # La siguiente ejecución no vuelve a sumar el mes compactado
+    filepath, message = report_generator.build_incremental_report('KFC004')
+    assert '5 registros (0 nuevos)' in message
+
+
 if __name__ == "__main__":
     test_imports()
\ No newline at end of file
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.resilience import CircuitBreaker, CircuitOpenError
+from bot.routing import Endpoint, EndpointRouter, parse_endpoints
+
+RESET = 0.05
+
+
+def abrir(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def endpoint(nombre, peso=1, primary=False):
+    backend = SimpleNamespace(connect=lambda: None)
+    destino = Endpoint(nombre, backend, weight=peso, primary=primary)
+    destino.breaker = CircuitBreaker(name=nombre, failure_threshold=2, reset_seconds=RESET)
+    return destino
+
+
+# ========== CircuitBreaker ==========
+
+def test_circuito_se_abre_tras_fallos_seguidos():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.ABIERTO
+    assert not breaker.allow_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_exito_reinicia_la_cuenta_de_fallos():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.is_closed
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba_y_se_cierra_con_exito():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=RESET)
+    abrir(breaker)
+    time.sleep(RESET * 1.5)
+
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.SEMIABIERTO
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.is_closed
+    assert breaker.allow_request()
+
+
+def test_prueba_fallida_vuelve_a_abrir_y_cancelada_libera_la_prueba():
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=RESET)
+    abrir(breaker)
+    time.sleep(RESET * 1.5)
+
+    # Una prueba cancelada (o con error del SQL) no decide el estado
+    assert breaker.allow_request()
+    breaker.record_cancelled()
+    assert breaker.state == CircuitBreaker.SEMIABIERTO
+    assert breaker.allow_request()
+
+    # Un fallo en semiabierto abre de inmediato, sin esperar el umbral
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.ABIERTO
+    assert not breaker.allow_request()
+
+
+# ========== EndpointRouter ==========
+
+def test_parse_endpoints():
+    assert parse_endpoints("r1=3; r2 ;;r3=0") == [('r1', 3), ('r2', 1), ('r3', 1)]
+
+
+def test_dia_en_curso_va_al_primario_y_dias_cerrados_a_las_replicas():
+    primario, replica = endpoint('primario', primary=True), endpoint('replica')
+    router = EndpointRouter(primario, [replica])
+
+    assert router.acquire(historico=False) is primario
+    assert router.acquire(historico=True) is replica
+
+
+def test_replicas_segun_consultas_en_curso_y_peso():
+    primario = endpoint('primario', primary=True)
+    pesada, liviana = endpoint('pesada', peso=3), endpoint('liviana', peso=1)
+    router = EndpointRouter(primario, [pesada, liviana])
+
+    elegidos = [router.acquire(historico=True).name for _ in range(4)]
+    assert elegidos.count('pesada') == 3
+    assert elegidos.count('liviana') == 1
+
+    router.release(pesada)
+    assert pesada.outstanding == 2 and pesada.served == 1
+
+
+def test_replica_con_circuito_abierto_queda_fuera_hasta_recuperarse():
+    primario = endpoint('primario', primary=True)
+    r1, r2 = endpoint('r1'), endpoint('r2')
+    router = EndpointRouter(primario, [r1, r2])
+
+    abrir(r1.breaker)
+    assert {router.acquire(historico=True).name for _ in range(3)} == {'r2'}
+
+    # Sin réplicas disponibles se usa el primario
+    abrir(r2.breaker)
+    assert router.acquire(historico=True) is primario
+
+    # Pasado el tiempo de reinicio, la réplica vuelve con una consulta de prueba
+    time.sleep(RESET * 1.5)
+    probada = router.acquire(historico=True)
+    assert probada in (r1, r2)
+    probada.breaker.record_success()
+    assert probada.breaker.is_closed
+
+
+def test_todos_fuera_de_servicio():
+    primario, replica = endpoint('primario', primary=True), endpoint('replica')
+    router = EndpointRouter(primario, [replica])
+    abrir(primario.breaker)
+    abrir(replica.breaker)
+
+    with pytest.raises(CircuitOpenError):
+        router.acquire(historico=True)
+    with pytest.raises(CircuitOpenError):
+        router.acquire(historico=False)
+
+
+def test_reintento_excluye_el_servidor_que_fallo():
+    primario = endpoint('primario', primary=True)
+    r1, r2 = endpoint('r1'), endpoint('r2')
+    router = EndpointRouter(primario, [r1, r2])
+
+    assert router.acquire(historico=True, exclude=(r1,)) is r2
+    assert router.acquire(historico=True, exclude=(r1, r2)) is primario
+
+
+if __name__ == "__main__":
+    print("🧪 Probando circuit breaker y enrutamiento a réplicas...")
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+# Tiempo máximo (segundos) desde el arranque del intérprete hasta tener el bot listo para run_polling
+STARTUP_BUDGET_SECONDS = float(os.getenv('STARTUP_BUDGET_SECONDS', '1.5'))
+
+# Módulos que no deben cargarse durante el arranque
+HEAVY_MODULES = ('pyodbc', 'pandas', 'openpyxl')
+
+COLD_START_SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+from bot.main import KFCBot
+bot = KFCBot()
+listo = time.perf_counter() - inicio
+print(json.dumps({
+    'segundos': listo,
+    'pesados': [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_cold_start():
+    """Mide en un proceso nuevo el tiempo hasta construir KFCBot (sin red)"""
+    result = subprocess.run(
+        [sys.executable, '-c', COLD_START_SCRIPT],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_cold_start():
+    # Se toma el mejor de varios arranques para reducir el ruido del sistema
+    mediciones = [measure_cold_start() for _ in range(3)]
+    mejor = min(m['segundos'] for m in mediciones)
+
+    assert not mediciones[0]['pesados'], f"Módulos pesados cargados al arrancar: {mediciones[0]['pesados']}"
+    assert mejor < STARTUP_BUDGET_SECONDS, (
+        f"Arranque en frío de {mejor:.3f}s supera el presupuesto de {STARTUP_BUDGET_SECONDS}s"
+    )
+
+
+if __name__ == "__main__":
+    print("⏱️ Midiendo arranque en frío...")
+    medicion = measure_cold_start()
+    print(f"✅ Bot listo en {medicion['segundos']:.3f}s (presupuesto: {STARTUP_BUDGET_SECONDS}s)")
+    print(f"📦 Módulos pesados cargados: {medicion['pesados'] or 'ninguno'}")
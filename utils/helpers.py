@@ -0,0 +1,119 @@
+import importlib
+import re
+import sys
+import threading
+from collections.abc import Mapping
+from datetime import datetime, timedelta, time as dtime
+
+import pytz
+
+from config.settings import Config
+
+LOCAL_PATTERN = re.compile(r'^KFC(\d{1,3})$')
+
+
+def parse_fecha(texto):
+    """Convierte 'hoy', 'ayer' o DD/MM/AAAA a (YYYYMMDD, DD/MM/AAAA); None si no es válida"""
+    texto = texto.strip().lower()
+    if texto == "hoy":
+        fecha = datetime.now()
+    elif texto == "ayer":
+        fecha = datetime.now() - timedelta(days=1)
+    else:
+        try:
+            fecha = datetime.strptime(texto, "%d/%m/%Y")
+        except ValueError:
+            return None
+    return fecha.strftime("%Y%m%d"), fecha.strftime("%d/%m/%Y")
+
+
+def parse_consulta_inline(texto):
+    """Interpreta 'kfc004 06/10/2025 [referencia] [autorizacion]' en un solo mensaje"""
+    partes = texto.split()
+    if len(partes) < 2 or len(partes) > 4:
+        return None
+
+    match = LOCAL_PATTERN.match(partes[0].upper())
+    if not match:
+        return None
+
+    fecha = parse_fecha(partes[1])
+    if fecha is None:
+        return None
+
+    return {
+        'local': f"KFC{int(match.group(1)):03d}",
+        'fecha': fecha[0],
+        'fecha_display': fecha[1],
+        'referencia': partes[2] if len(partes) > 2 else None,
+        'autorizacion': partes[3] if len(partes) > 3 else None,
+    }
+
+
+def format_antiguedad(segundos):
+    """Texto legible para la antigüedad de un resultado: '45 s', '12 min', '3 h'"""
+    segundos = int(segundos)
+    if segundos < 60:
+        return f"{segundos} s"
+    if segundos < 3600:
+        return f"{segundos // 60} min"
+    return f"{segundos // 3600} h {segundos % 3600 // 60} min"
+
+
+def parse_hora(texto):
+    """Convierte 'HH:MM' en un datetime.time con la zona horaria configurada (para la job queue)"""
+    hora, minuto = (int(x) for x in texto.split(':'))
+    return dtime(hora, minuto, tzinfo=pytz.timezone(Config.TIMEZONE))
+
+
+def deep_sizeof(obj, _seen=None):
+    """Tamaño aproximado en bytes de un objeto y todo lo que contiene"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, Mapping):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in list(obj.items()))
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def format_bytes(num):
+    """Texto legible para un tamaño en bytes"""
+    for unit in ('B', 'KB', 'MB'):
+        if num < 1024:
+            return f"{num:.0f} {unit}" if unit == 'B' else f"{num:.1f} {unit}"
+        num /= 1024
+    return f"{num:.1f} GB"
+
+
+def process_rss_bytes():
+    """Memoria residente actual del proceso (Linux); None si no se puede obtener"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def prewarm_modules(module_names):
+    """Importa módulos pesados en un hilo en segundo plano para que el primer uso sea rápido"""
+    def _warm():
+        for name in module_names:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                # El módulo se volverá a importar (y fallará con un error claro) cuando se use
+                pass
+
+    thread = threading.Thread(target=_warm, name="prewarm-modules", daemon=True)
+    thread.start()
+    return thread
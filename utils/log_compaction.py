@@ -0,0 +1,208 @@
+import asyncio
+import csv
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from config.settings import Config
+from utils.logger import logger
+
+MONTH_FILE = re.compile(r'^conexiones_(\d{4})-(\d{2})\.(csv|sqlite)$')
+
+CSV_COLUMNS = ['ID_Conexion', 'Local', 'Fecha_Consulta', 'Fecha_Solicitud', 'Hora_Solicitud', 'Usuario', 'Estado']
+
+# Columna del CSV -> (columna SQLite, expresión SQL que la devuelve en el formato del CSV)
+SQL_COLUMNS = {
+    'ID_Conexion': ('id_conexion', 'id_conexion'),
+    'Local': ('local', 'local'),
+    'Fecha_Consulta': ('fecha_consulta', 'CAST(fecha_consulta AS TEXT)'),
+    'Fecha_Solicitud': ('fecha_solicitud',
+                        "substr(fecha_solicitud, 1, 4) || '-' || substr(fecha_solicitud, 5, 2) || '-' "
+                        "|| substr(fecha_solicitud, 7, 2)"),
+    'Hora_Solicitud': ('hora_solicitud',
+                       "printf('%02d:%02d:%02d', hora_solicitud / 3600, hora_solicitud % 3600 / 60, "
+                       "hora_solicitud % 60)"),
+    'Usuario': ('usuario', 'usuario'),
+    'Estado': ('estado', 'estado'),
+}
+
+SCHEMA = """
+CREATE TABLE conexiones (
+    id_conexion TEXT NOT NULL,
+    local TEXT NOT NULL,
+    fecha_consulta INTEGER,
+    fecha_solicitud INTEGER NOT NULL,
+    hora_solicitud INTEGER NOT NULL,
+    usuario TEXT,
+    estado TEXT
+);
+CREATE INDEX ix_conexiones_local_fecha ON conexiones (local, fecha_solicitud);
+CREATE INDEX ix_conexiones_fecha ON conexiones (fecha_solicitud);
+"""
+
+
+def month_key(year, month):
+    return int(year) * 12 + int(month) - 1
+
+
+class ConnectionLogCompactor:
+    """Convierte los CSV mensuales cerrados en SQLite tipado e indexado y aplica la retención"""
+
+    def __init__(self, report_dir=None):
+        self.report_dir = report_dir or os.path.join(Config.LOG_DIR, 'reportes')
+
+    def month_files(self):
+        """Lista (año, mes, extensión, ruta) de los archivos mensuales de conexiones"""
+        if not os.path.exists(self.report_dir):
+            return []
+
+        files = []
+        for name in sorted(os.listdir(self.report_dir)):
+            match = MONTH_FILE.match(name)
+            if match:
+                year, month, ext = match.groups()
+                files.append((int(year), int(month), ext, os.path.join(self.report_dir, name)))
+        return files
+
+    def run(self, now=None):
+        """Compacta los meses cerrados y elimina los que superan la retención"""
+        now = now or datetime.now()
+        compactados = self.compact_closed_months(now)
+        eliminados = self.apply_retention(now)
+        if compactados or eliminados:
+            logger.logger.info(f"Compactación de conexiones: {compactados} meses compactados, "
+                               f"{eliminados} archivos eliminados por retención")
+        return compactados, eliminados
+
+    async def run_job(self, context):
+        """Tarea de la job queue: la compactación se ejecuta en un hilo"""
+        await asyncio.to_thread(self.run)
+
+    def compact_closed_months(self, now):
+        """Compacta los CSV de meses cerrados hace más de COMPACTACION_GRACIA_DIAS.
+
+        El margen deja que el reporte programado incremental lea las últimas filas del mes antes
+        de que el CSV desaparezca.
+        """
+        current = month_key(now.year, now.month)
+        compactados = 0
+
+        for year, month, ext, path in self.month_files():
+            if ext != 'csv':
+                continue
+
+            key = month_key(year, month)
+            closed = key < current - 1 or (key == current - 1 and now.day > Config.COMPACTACION_GRACIA_DIAS)
+            if not closed:
+                continue
+
+            try:
+                self.compact_file(path)
+                compactados += 1
+            except Exception as e:
+                logger.logger.error(f"Error compactando {path}: {e}")
+
+        return compactados
+
+    def compact_file(self, csv_path):
+        """Convierte un CSV mensual a SQLite y, una vez verificado, elimina el CSV"""
+        sqlite_path = csv_path[:-len('.csv')] + '.sqlite'
+        tmp_path = sqlite_path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            # Si ya había un mes compactado (filas tardías), se conserva su contenido
+            if os.path.exists(sqlite_path):
+                conn.execute("ATTACH DATABASE ? AS previo", (sqlite_path,))
+                conn.executescript(SCHEMA)
+                conn.execute("INSERT INTO conexiones SELECT * FROM previo.conexiones")
+                conn.commit()
+                conn.execute("DETACH DATABASE previo")
+            else:
+                conn.executescript(SCHEMA)
+
+            with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.DictReader(f)
+                conn.executemany(
+                    "INSERT INTO conexiones VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self._typed_row(row) for row in reader)
+                )
+            conn.commit()
+
+            total = conn.execute("SELECT COUNT(*) FROM conexiones").fetchone()[0]
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, sqlite_path)
+        os.remove(csv_path)
+        logger.logger.info(f"Compactado {os.path.basename(csv_path)} -> {os.path.basename(sqlite_path)} "
+                           f"({total} filas)")
+        return sqlite_path
+
+    @staticmethod
+    def _typed_row(row):
+        hora = row.get('Hora_Solicitud') or '00:00:00'
+        h, m, s = (int(x) for x in hora.split(':'))
+        fecha_consulta = row.get('Fecha_Consulta') or None
+        return (
+            row['ID_Conexion'],
+            row['Local'],
+            int(fecha_consulta) if fecha_consulta and fecha_consulta.isdigit() else fecha_consulta,
+            int(row['Fecha_Solicitud'].replace('-', '')),
+            h * 3600 + m * 60 + s,
+            row.get('Usuario'),
+            row.get('Estado'),
+        )
+
+    def apply_retention(self, now):
+        """Elimina los meses más antiguos que REPORTES_RETENCION_MESES (0 = sin límite)"""
+        if Config.REPORTES_RETENCION_MESES <= 0:
+            return 0
+
+        limite = month_key(now.year, now.month) - Config.REPORTES_RETENCION_MESES
+        eliminados = 0
+        for year, month, ext, path in self.month_files():
+            if month_key(year, month) < limite:
+                try:
+                    os.remove(path)
+                    eliminados += 1
+                except OSError as e:
+                    logger.logger.error(f"Error aplicando retención a {path}: {e}")
+        return eliminados
+
+    def read_compacted(self, path, local_filter=None, fecha_inicio=None, fecha_fin=None, columns=None):
+        """Lee un mes compactado filtrando en SQL y proyectando solo las columnas pedidas"""
+        columns = columns or CSV_COLUMNS
+        select = ", ".join(f"{SQL_COLUMNS[c][1]} AS {c}" for c in columns)
+
+        where, params = [], []
+        if local_filter:
+            where.append("local = ?")
+            params.append(local_filter)
+        if fecha_inicio:
+            where.append("fecha_solicitud >= ?")
+            params.append(int(fecha_inicio.replace('-', '')))
+        if fecha_fin:
+            where.append("fecha_solicitud <= ?")
+            params.append(int(fecha_fin.replace('-', '')))
+
+        query = f"SELECT {select} FROM conexiones"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            # Lectura mediante memoria mapeada en lugar de read() por página
+            conn.execute(f"PRAGMA mmap_size = {Config.COMPACTACION_MMAP_BYTES}")
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+
+
+# Instancia global del compactador de conexiones
+log_compactor = ConnectionLogCompactor()
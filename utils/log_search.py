@@ -0,0 +1,240 @@
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from collections import deque
+
+from config.settings import Config
+
+DAY_FILE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})\.log$')
+
+# Inicio de cada registro de BotLogger: '2025-10-06 19:45:55,697 - KFCBot - INFO - ...'.
+# Las líneas que no empiezan así (tracebacks) pertenecen al registro anterior.
+RECORD_START = re.compile(
+    rb'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - [^\n]*? - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - ',
+    re.MULTILINE
+)
+
+NIVELES = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+_NIVEL_CODIGO = {nivel.encode(): codigo for codigo, nivel in enumerate(NIVELES)}
+
+# Índice lateral '<archivo>.log.idx': cabecera (firma, bytes del log ya indexados) y una entrada
+# uint64 por registro con (offset << 3) | código de nivel
+_IDX_HEADER = struct.Struct('<4sQ')
+_IDX_MAGIC = b'KLX1'
+
+# Tokens de bots en las URLs de httpx: no deben salir en un mensaje de Telegram
+_TOKEN_PATTERN = re.compile(r'bot\d+:[\w-]+')
+
+
+def redact(texto):
+    return _TOKEN_PATTERN.sub('bot<token>', texto)
+
+
+class LogIndex:
+    """Offsets de inicio y nivel de cada registro de un archivo de log, persistidos junto a él"""
+
+    def __init__(self, path):
+        self.path = path
+        self.idx_path = path + '.idx'
+        self.entries = array('Q')
+        self.covered = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.idx_path):
+            return
+        try:
+            with open(self.idx_path, 'rb') as f:
+                magic, covered = _IDX_HEADER.unpack(f.read(_IDX_HEADER.size))
+                data = f.read()
+        except (OSError, struct.error):
+            return
+        if magic != _IDX_MAGIC:
+            return
+
+        entries = array('Q')
+        entries.frombytes(data[:len(data) - len(data) % entries.itemsize])
+        # Entradas escritas tras la última cabecera (p. ej. corte durante update) se descartan
+        while entries and entries[-1] >> 3 >= covered:
+            entries.pop()
+        self.entries = entries
+        self.covered = covered
+
+    def update(self):
+        """Indexa solo lo agregado al log desde la última vez; reconstruye si el log se truncó.
+
+        Devuelve el tamaño del log cubierto por el índice (hasta el último salto de línea).
+        """
+        size = os.path.getsize(self.path)
+        if size < self.covered or (self.covered and not os.path.exists(self.idx_path)):
+            self.entries = array('Q')
+            self.covered = 0
+        if size == self.covered:
+            return self.covered
+
+        nuevas = array('Q')
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Una línea a medio escribir se indexa en la próxima actualización
+            end = mm.rfind(b'\n', self.covered, size) + 1
+            if end <= self.covered:
+                return self.covered
+            for match in RECORD_START.finditer(mm, self.covered, end):
+                nuevas.append(match.start() << 3 | _NIVEL_CODIGO[match.group(1)])
+
+        self._append(nuevas, end, rebuild=self.covered == 0)
+        self.entries.extend(nuevas)
+        self.covered = end
+        return end
+
+    def _append(self, nuevas, covered, rebuild):
+        with open(self.idx_path, 'wb' if rebuild or not os.path.exists(self.idx_path) else 'r+b') as f:
+            if rebuild:
+                f.write(_IDX_HEADER.pack(_IDX_MAGIC, 0))
+            f.seek(0, os.SEEK_END)
+            nuevas.tofile(f)
+            # La cabecera se actualiza al final: si el proceso se corta, las entradas sobrantes se ignoran
+            f.seek(0)
+            f.write(_IDX_HEADER.pack(_IDX_MAGIC, covered))
+
+    def record_at(self, offset):
+        """Índice del registro que contiene el byte offset (o -1 si es anterior al primero)"""
+        return bisect_right(self.entries, offset << 3 | 7) - 1
+
+    def bounds(self, i):
+        inicio = self.entries[i] >> 3
+        fin = self.entries[i + 1] >> 3 if i + 1 < len(self.entries) else self.covered
+        return inicio, fin
+
+    def level(self, i):
+        return self.entries[i] & 7
+
+
+class LogSearcher:
+    """Búsqueda en los logs diarios de BotLogger (logs/AAAA-MM/AAAA-MM-DD.log) sin cargarlos en memoria.
+
+    Cada archivo se lee con mmap y un índice lateral de offsets por registro que se amplía a medida
+    que el archivo crece: el nivel se filtra desde el índice y el texto se busca con re sobre el
+    mapa de memoria; solo se decodifican los registros devueltos.
+    """
+
+    def __init__(self, log_dir=None):
+        self.log_dir = log_dir or Config.LOG_DIR
+        self._indices = {}
+        self._lock = threading.Lock()
+
+    def day_files(self):
+        """Lista (AAAAMMDD, ruta) de los logs diarios, del más antiguo al más reciente"""
+        if not os.path.exists(self.log_dir):
+            return []
+
+        files = []
+        for month_dir in os.listdir(self.log_dir):
+            month_path = os.path.join(self.log_dir, month_dir)
+            if not os.path.isdir(month_path):
+                continue
+            for name in os.listdir(month_path):
+                match = DAY_FILE.match(name)
+                if match:
+                    files.append((''.join(match.groups()), os.path.join(month_path, name)))
+        return sorted(files)
+
+    def _index(self, path):
+        # Un lock por archivo: dos búsquedas simultáneas no escriben el mismo índice a la vez
+        with self._lock:
+            entry = self._indices.get(path)
+            if entry is None:
+                entry = self._indices[path] = (LogIndex(path), threading.Lock())
+        return entry
+
+    def search(self, textos=(), nivel=None, desde=None, hasta=None, limite=None):
+        """Últimos `limite` registros que cumplen los filtros, en orden cronológico.
+
+        textos: subcadenas que deben aparecer todas, sin distinguir mayúsculas (connection_id,
+        local, mensaje...); nivel: nivel mínimo ('WARNING' incluye ERROR y CRITICAL);
+        desde/hasta: AAAAMMDD.
+        """
+        limite = limite or Config.LOGS_LINEAS_DEFECTO
+        minimo = NIVELES.index(nivel.upper()) if nivel else 0
+        patrones = [re.compile(re.escape(texto.encode('utf-8')), re.IGNORECASE) for texto in textos if texto]
+        desde_b = f"{desde[:4]}-{desde[4:6]}-{desde[6:]}".encode() if desde else None
+        hasta_b = f"{hasta[:4]}-{hasta[4:6]}-{hasta[6:]}".encode() if hasta else None
+
+        files = [(fecha, path) for fecha, path in self.day_files() if not hasta or fecha <= hasta]
+        if desde:
+            # Un log abierto un día anterior sigue recibiendo registros de días posteriores
+            anteriores = [f for f in files if f[0] < desde]
+            files = anteriores[-1:] + [f for f in files if f[0] >= desde]
+
+        resultados = []
+        for _, path in reversed(files):
+            faltan = limite - len(resultados)
+            if faltan <= 0:
+                break
+            resultados = self._search_file(path, patrones, minimo, desde_b, hasta_b, faltan) + resultados
+        return resultados
+
+    def _search_file(self, path, patrones, minimo, desde_b, hasta_b, limite):
+        index, lock = self._index(path)
+        with lock:
+            try:
+                end = index.update()
+            except OSError:
+                return []
+            if not index.entries:
+                return []
+
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                def cumple(i):
+                    if index.level(i) < minimo:
+                        return False
+                    inicio, fin = index.bounds(i)
+                    fecha = mm[inicio:inicio + 10]
+                    if (desde_b and fecha < desde_b) or (hasta_b and fecha > hasta_b):
+                        return False
+                    return all(patron.search(mm, inicio, fin) for patron in patrones[1:])
+
+                if not patrones:
+                    # Sin texto basta recorrer el índice desde el final
+                    elegidos = []
+                    for i in range(len(index.entries) - 1, -1, -1):
+                        if cumple(i):
+                            elegidos.append(i)
+                            if len(elegidos) >= limite:
+                                break
+                    elegidos.reverse()
+                else:
+                    # Solo se recuerdan los últimos `limite` registros con coincidencias
+                    elegidos = deque(maxlen=limite)
+                    ultimo = -1
+                    for match in patrones[0].finditer(mm, 0, end):
+                        i = index.record_at(match.start())
+                        if i != ultimo:
+                            ultimo = i
+                            if i >= 0 and cumple(i):
+                                elegidos.append(i)
+
+                return [self._texto(mm, *index.bounds(i)) for i in elegidos]
+
+    @staticmethod
+    def _texto(mm, inicio, fin):
+        maximo = Config.LOGS_MAX_CHARS_REGISTRO
+        texto = mm[inicio:min(fin, inicio + maximo)].decode('utf-8', errors='replace').rstrip()
+        if fin - inicio > maximo:
+            texto += ' …'
+        return redact(texto)
+
+    def stats(self):
+        with self._lock:
+            indices = [index for index, _ in self._indices.values()]
+        return {
+            'archivos_indexados': len(indices),
+            'registros_indexados': sum(len(index.entries) for index in indices),
+        }
+
+
+# Instancia global del buscador de logs
+log_searcher = LogSearcher()
@@ -10,7 +10,14 @@ from config.settings import Config
 
 class BotLogger:
     def __init__(self):
-        self.setup_logging()
+        # La configuración se difiere hasta el primer uso para no tocar disco al importar
+        self._logger = None
+
+    @property
+    def logger(self):
+        if self._logger is None:
+            self.setup_logging()
+        return self._logger
 
     def setup_logging(self):
         """Configura el sistema de logging"""
@@ -36,7 +43,7 @@ class BotLogger:
             ]
         )
 
-        self.logger = logging.getLogger('KFCBot')
+        self._logger = logging.getLogger('KFCBot')
 
     def log_connection(self, user_id, local, fecha, connection_id, status="success"):
         """Log de conexiones a la base de datos"""
@@ -98,19 +105,28 @@ class BotLogger:
         except Exception as e:
             self.logger.error(f"Error guardando en CSV: {e}")
 
-    def get_connection_data(self, local_filter=None, fecha_inicio=None, fecha_fin=None):
-        """Obtiene datos de conexiones para reportes"""
-        try:
-            report_dir = os.path.join(Config.LOG_DIR, 'reportes')
-            if not os.path.exists(report_dir):
-                return []
+    def get_connection_data(self, local_filter=None, fecha_inicio=None, fecha_fin=None, columns=None):
+        """Obtiene datos de conexiones para reportes.
 
-            # Buscar todos los archivos CSV de reportes
-            csv_files = [f for f in os.listdir(report_dir) if f.startswith('conexiones_') and f.endswith('.csv')]
+        Los meses cerrados se leen de su versión compactada (SQLite) filtrando en SQL;
+        columns limita las columnas devueltas.
+        """
+        try:
+            from utils.log_compaction import log_compactor, month_key
 
             all_data = []
-            for csv_file in csv_files:
-                file_path = os.path.join(report_dir, csv_file)
+            for year, month, ext, file_path in log_compactor.month_files():
+                # Descartar meses completos fuera del rango pedido
+                if fecha_inicio and month_key(year, month) < month_key(*fecha_inicio.split('-')[:2]):
+                    continue
+                if fecha_fin and month_key(year, month) > month_key(*fecha_fin.split('-')[:2]):
+                    continue
+
+                if ext == 'sqlite':
+                    all_data.extend(log_compactor.read_compacted(
+                        file_path, local_filter, fecha_inicio, fecha_fin, columns
+                    ))
+                    continue
 
                 with open(file_path, 'r', encoding='utf-8') as f:
                     reader = csv.DictReader(f)
@@ -126,6 +142,9 @@ class BotLogger:
                         if fecha_fin and row['Fecha_Solicitud'] > fecha_fin:
                             continue
 
+                        if columns:
+                            row = {c: row[c] for c in columns}
+
                         all_data.append(row)
 
             return all_data
@@ -134,6 +153,52 @@ class BotLogger:
             self.logger.error(f"Error leyendo datos de conexiones: {e}")
             return []
 
+    def connection_log_sizes(self):
+        """Tamaño actual de cada CSV mensual de conexiones (cambia al registrarse una conexión)"""
+        report_dir = os.path.join(Config.LOG_DIR, 'reportes')
+        if not os.path.exists(report_dir):
+            return {}
+        return {
+            f: os.path.getsize(os.path.join(report_dir, f))
+            for f in os.listdir(report_dir) if f.startswith('conexiones_') and f.endswith('.csv')
+        }
+
+    def read_new_connection_rows(self, offsets):
+        """Lee solo las filas agregadas a los CSV desde los offsets indicados.
+
+        Devuelve (filas, offsets_actualizados). Una línea a medio escribir se deja para la próxima lectura.
+        """
+        offsets = dict(offsets)
+        rows = []
+        report_dir = os.path.join(Config.LOG_DIR, 'reportes')
+        if not os.path.exists(report_dir):
+            return rows, offsets
+
+        csv_files = sorted(f for f in os.listdir(report_dir) if f.startswith('conexiones_') and f.endswith('.csv'))
+        for csv_file in csv_files:
+            file_path = os.path.join(report_dir, csv_file)
+            try:
+                with open(file_path, 'rb') as f:
+                    header_line = f.readline()
+                    start = max(offsets.get(csv_file, 0), f.tell())
+                    f.seek(start)
+                    data = f.read()
+            except OSError as e:
+                self.logger.error(f"Error leyendo {csv_file}: {e}")
+                continue
+
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                offsets[csv_file] = start
+                continue
+
+            header = next(csv.reader([header_line.decode('utf-8')]))
+            reader = csv.DictReader(data[:end].decode('utf-8').splitlines(), fieldnames=header)
+            rows.extend(reader)
+            offsets[csv_file] = start + end
+
+        return rows, offsets
+
 
 # Instancia global del logger
 logger = BotLogger()
\ No newline at end of file
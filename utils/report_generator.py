@@ -1,8 +1,24 @@
 import os
-import pandas as pd
+import sqlite3
 from datetime import datetime
+from config.settings import Config
+from utils.log_compaction import CSV_COLUMNS, log_compactor
 from utils.logger import logger
 
+# Estado del reporte programado: filas acumuladas, offsets leídos de cada CSV mensual y meses
+# compactados ya incorporados
+STATE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS offsets (
+    archivo TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS compactados (
+    archivo TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS conexiones ({', '.join(f'{c} TEXT' for c in CSV_COLUMNS)});
+CREATE INDEX IF NOT EXISTS ix_conexiones_fecha ON conexiones (Fecha_Solicitud);
+"""
+
 
 class ReportGenerator:
     def __init__(self):
@@ -18,54 +34,130 @@ class ReportGenerator:
             if not connection_data:
                 return None, "No se encontraron datos de conexiones para los filtros aplicados"
 
-            # Convertir a DataFrame de pandas
-            df = pd.DataFrame(connection_data)
-
-            # Ordenar por fecha de solicitud (más reciente primero)
-            df['Fecha_Solicitud'] = pd.to_datetime(df['Fecha_Solicitud'])
-            df = df.sort_values('Fecha_Solicitud', ascending=False)
-
             # Crear nombre del archivo
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             local_suffix = f"_{local_filter}" if local_filter else "_todos"
             filename = f"reporte_conexiones{local_suffix}_{timestamp}.xlsx"
             filepath = os.path.join(self.reports_dir, filename)
 
-            # Crear Excel con múltiples hojas
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                # Hoja de datos completos
-                df.to_excel(writer, sheet_name='Conexiones', index=False)
+            self._write_excel(connection_data, local_filter, filepath)
 
-                # Hoja de resumen por local
-                if not local_filter:
-                    summary = df.groupby('Local').agg({
-                        'ID_Conexion': 'count',
-                        'Fecha_Solicitud': ['min', 'max']
-                    }).round(2)
+            return filepath, f"Reporte generado exitosamente. {len(connection_data)} registros encontrados."
 
-                    summary.columns = ['Total_Conexiones', 'Primera_Conexion', 'Ultima_Conexion']
-                    summary = summary.sort_values('Total_Conexiones', ascending=False)
-                    summary.to_excel(writer, sheet_name='Resumen_Por_Local')
+        except Exception as e:
+            error_msg = f"Error generando reporte: {str(e)}"
+            logger.logger.error(error_msg)
+            return None, error_msg
 
-                # Hoja de resumen por fecha
-                daily_summary = df.groupby('Fecha_Solicitud').agg({
-                    'ID_Conexion': 'count'
-                }).rename(columns={'ID_Conexion': 'Conexiones_Dia'})
+    def build_incremental_report(self, local_filter=None):
+        """Genera el reporte programado a partir del estado del día anterior más las filas nuevas del log"""
+        try:
+            suffix = local_filter or "todos"
+            state_dir = os.path.join(self.reports_dir, 'programados')
+            os.makedirs(state_dir, exist_ok=True)
+            state_path = os.path.join(state_dir, f"estado_{suffix}.sqlite")
+
+            conn = sqlite3.connect(state_path)
+            try:
+                conn.executescript(STATE_SCHEMA)
+                offsets = dict(conn.execute("SELECT archivo, offset FROM offsets"))
+                compactados = {archivo for (archivo,) in conn.execute("SELECT archivo FROM compactados")}
+
+                # Meses compactados (su CSV ya no está) que este estado nunca leyó, p. ej. un filtro
+                # suscrito después de la compactación o un estado borrado: se leen de su SQLite
+                new_rows, meses = [], []
+                for _, _, ext, path in log_compactor.month_files():
+                    archivo = os.path.basename(path)
+                    if ext != 'sqlite' or archivo in compactados:
+                        continue
+                    if archivo[:-len('.sqlite')] + '.csv' not in offsets:
+                        new_rows.extend(log_compactor.read_compacted(path, local_filter))
+                    meses.append(archivo)
+
+                # De los CSV solo se leen los bytes agregados desde la última ejecución
+                csv_rows, offsets = logger.read_new_connection_rows(offsets)
+                if local_filter:
+                    csv_rows = [row for row in csv_rows if row['Local'] == local_filter]
+                new_rows.extend(csv_rows)
+
+                # Filas nuevas y offsets se guardan en la misma transacción
+                with conn:
+                    conn.executemany(
+                        f"INSERT INTO conexiones VALUES ({', '.join('?' * len(CSV_COLUMNS))})",
+                        ([row.get(c) for c in CSV_COLUMNS] for row in new_rows)
+                    )
+                    conn.executemany("INSERT OR REPLACE INTO offsets VALUES (?, ?)", offsets.items())
+                    conn.executemany("INSERT INTO compactados VALUES (?)", ((archivo,) for archivo in meses))
+
+                    # Misma retención que los archivos mensuales de conexiones
+                    if Config.REPORTES_RETENCION_MESES > 0:
+                        now = datetime.now()
+                        meses = now.year * 12 + now.month - 1 - Config.REPORTES_RETENCION_MESES
+                        desde = f"{meses // 12:04d}-{meses % 12 + 1:02d}-01"
+                        conn.execute("DELETE FROM conexiones WHERE Fecha_Solicitud < ?", (desde,))
+
+                conn.row_factory = sqlite3.Row
+                rows = [dict(row) for row in conn.execute("SELECT * FROM conexiones")]
+            finally:
+                conn.close()
+
+            if not rows:
+                return None, "No se encontraron datos de conexiones para los filtros aplicados"
 
-                daily_summary = daily_summary.sort_index(ascending=False)
-                daily_summary.to_excel(writer, sheet_name='Resumen_Por_Fecha')
+            # Un solo archivo vigente por filtro: se reemplaza el del día anterior
+            filepath = os.path.join(state_dir, f"reporte_conexiones_{suffix}.xlsx")
+            self._write_excel(rows, local_filter, filepath)
 
-            return filepath, f"Reporte generado exitosamente. {len(connection_data)} registros encontrados."
+            return filepath, (
+                f"Reporte programado del {datetime.now().strftime('%d/%m/%Y %H:%M')}. "
+                f"{len(rows)} registros ({len(new_rows)} nuevos)."
+            )
 
         except Exception as e:
-            error_msg = f"Error generando reporte: {str(e)}"
+            error_msg = f"Error generando reporte programado: {str(e)}"
             logger.logger.error(error_msg)
             return None, error_msg
 
+    def _write_excel(self, connection_data, local_filter, filepath):
+        """Escribe el Excel de conexiones con sus hojas de resumen"""
+        # pandas se importa al generar el reporte (o en el precalentamiento tras el arranque)
+        import pandas as pd
+
+        # Convertir a DataFrame de pandas
+        df = pd.DataFrame(connection_data)
+
+        # Ordenar por fecha de solicitud (más reciente primero)
+        df['Fecha_Solicitud'] = pd.to_datetime(df['Fecha_Solicitud'])
+        df = df.sort_values('Fecha_Solicitud', ascending=False)
+
+        # Crear Excel con múltiples hojas
+        with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+            # Hoja de datos completos
+            df.to_excel(writer, sheet_name='Conexiones', index=False)
+
+            # Hoja de resumen por local
+            if not local_filter:
+                summary = df.groupby('Local').agg({
+                    'ID_Conexion': 'count',
+                    'Fecha_Solicitud': ['min', 'max']
+                }).round(2)
+
+                summary.columns = ['Total_Conexiones', 'Primera_Conexion', 'Ultima_Conexion']
+                summary = summary.sort_values('Total_Conexiones', ascending=False)
+                summary.to_excel(writer, sheet_name='Resumen_Por_Local')
+
+            # Hoja de resumen por fecha
+            daily_summary = df.groupby('Fecha_Solicitud').agg({
+                'ID_Conexion': 'count'
+            }).rename(columns={'ID_Conexion': 'Conexiones_Dia'})
+
+            daily_summary = daily_summary.sort_index(ascending=False)
+            daily_summary.to_excel(writer, sheet_name='Resumen_Por_Fecha')
+
     def get_available_locals(self):
-        """Obtiene lista de locales disponibles en los reportes"""
+        """Obtiene lista de locales con datos de conexiones (para el teclado de /reportes)"""
         try:
-            connection_data = logger.get_connection_data()
+            connection_data = logger.get_connection_data(columns=['Local'])
             locales = set(row['Local'] for row in connection_data)
             return sorted(locales)
         except Exception as e:
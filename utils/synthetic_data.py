@@ -0,0 +1,151 @@
+"""Genera una base SQLite con transacciones sintéticas para probar y medir consultas sin SQL Server.
+
+Uso:
+    python -m utils.synthetic_data --filas 2000000 --locales 300 --dias 60
+    DB_BACKEND=sqlite python main.py
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+from config.settings import Config
+from bot.backends import SQLITE_INDEXES, SQLITE_SCHEMA
+
+MENSAJES = [
+    ('00', 'Aprobada'),
+    ('05', 'No honrar'),
+    ('14', 'Tarjeta invalida'),
+    ('51', 'Fondos insuficientes'),
+    ('54', 'Tarjeta expirada'),
+    ('55', 'PIN incorrecto'),
+    ('57', 'Transaccion no permitida'),
+    ('61', 'Excede limite de monto'),
+    ('91', 'Emisor no disponible'),
+    ('96', 'Error del sistema'),
+]
+RECHAZOS = [codigo for codigo, _ in MENSAJES if codigo != '00']
+
+# Distribución de resultados de cada compra: vigente, rechazada, anulada, reversada
+RESULTADOS = ('vigente', 'rechazada', 'anulada', 'reversada')
+PESOS_RESULTADOS = (0.86, 0.08, 0.035, 0.025)
+ACUMULADOS_RESULTADOS = list(accumulate(PESOS_RESULTADOS))
+
+# Peso relativo de cada hora del día (picos de almuerzo y cena)
+PESOS_HORA = [0, 0, 0, 0, 0, 0, 0.2, 0.5, 1, 1.2, 1.5, 3, 5, 5.5, 3.5, 2, 2, 2.5, 4, 4.5, 3.5, 2, 1, 0.4]
+# Pesos acumulados: rnd.choices no los recalcula en cada fila
+ACUMULADOS_HORA = list(accumulate(PESOS_HORA))
+HORAS = range(24)
+
+
+def generar_filas(filas, locales, dias, hasta, seed=42):
+    """Produce filas de TB_LOG_TRANSACCION de forma reproducible (misma semilla = mismos datos)"""
+    rnd = random.Random(seed)
+    codigos = [f"000000KFC{i:03d}" for i in range(1, locales + 1)]
+    # Pocos locales concentran la mayor parte del volumen
+    acumulados_local = list(accumulate(1 / (i + 1) ** 0.8 for i in range(locales)))
+    terminales = {codigo: [f"{rnd.randrange(10**7, 10**8)}" for _ in range(rnd.randint(2, 6))] for codigo in codigos}
+    inicio = datetime.combine(hasta - timedelta(days=dias - 1), datetime.min.time())
+
+    id_log = 0
+    referencia = 100000
+    generadas = 0
+    while generadas < filas:
+        merchant = rnd.choices(codigos, cum_weights=acumulados_local)[0]
+        fecha = (inicio
+                 + timedelta(days=rnd.randrange(dias))
+                 + timedelta(hours=rnd.choices(HORAS, cum_weights=ACUMULADOS_HORA)[0],
+                             minutes=rnd.randrange(60), seconds=rnd.randrange(60)))
+        tid = rnd.choice(terminales[merchant])
+        referencia += 1
+        autorizacion = f"{rnd.randrange(10**6):06d}"
+        valor = round(min(rnd.lognormvariate(2.4, 0.6), 250), 2)
+        resultado = rnd.choices(RESULTADOS, cum_weights=ACUMULADOS_RESULTADOS)[0]
+        if resultado == 'anulada' and filas - generadas < 2:
+            # La anulación ocupa dos filas: si solo queda una, la compra queda vigente
+            resultado = 'vigente'
+        fecha_txt = fecha.strftime("%Y-%m-%d %H:%M:%S")
+
+        if resultado == 'rechazada':
+            id_log += 1
+            yield (id_log, merchant, tid, fecha_txt, '01', 0, rnd.choice(RECHAZOS), str(referencia), None, valor)
+            generadas += 1
+            continue
+
+        estado = {'vigente': 0, 'anulada': 1, 'reversada': 2}[resultado]
+        id_log += 1
+        yield (id_log, merchant, tid, fecha_txt, '01', estado, '00', str(referencia), autorizacion, valor)
+        generadas += 1
+
+        if resultado == 'anulada':
+            # La anulación queda registrada como un mensaje propio sobre la misma referencia
+            id_log += 1
+            anulacion = (fecha + timedelta(minutes=rnd.randint(1, 30))).strftime("%Y-%m-%d %H:%M:%S")
+            yield (id_log, merchant, tid, anulacion, '02', 0, '00', str(referencia),
+                   f"{rnd.randrange(10**6):06d}", valor)
+            generadas += 1
+
+
+def generar(path, filas, locales, dias, hasta, seed=42, lote=50000):
+    """Crea (o reemplaza) la base SQLite y devuelve las filas insertadas.
+
+    hasta es el último día generado; se pide explícito para que la misma semilla dé los mismos datos.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        # Carga masiva: sin diario ni sincronización, índices al final
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SQLITE_SCHEMA)
+        conn.executemany("INSERT INTO TB_MENSAJE_02 VALUES (?, ?)", MENSAJES)
+
+        insertadas = 0
+        buffer = []
+        for fila in generar_filas(filas, locales, dias, hasta, seed):
+            buffer.append(fila)
+            if len(buffer) >= lote:
+                conn.executemany("INSERT INTO TB_LOG_TRANSACCION VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", buffer)
+                insertadas += len(buffer)
+                buffer = []
+        if buffer:
+            conn.executemany("INSERT INTO TB_LOG_TRANSACCION VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", buffer)
+            insertadas += len(buffer)
+        conn.commit()
+
+        conn.executescript(SQLITE_INDEXES)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return insertadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera TB_LOG_TRANSACCION/TB_MENSAJE_02 sintéticas en SQLite")
+    parser.add_argument('--salida', default=Config.DB_SQLITE_PATH, help="Ruta de la base SQLite")
+    parser.add_argument('--filas', type=int, default=1_000_000, help="Filas de TB_LOG_TRANSACCION")
+    parser.add_argument('--locales', type=int, default=300, help="Cantidad de locales (KFC001...)")
+    parser.add_argument('--dias', type=int, default=60, help="Días hacia atrás desde --hasta")
+    parser.add_argument('--hasta', type=date.fromisoformat, default=date.today(),
+                        help="Último día generado (AAAA-MM-DD, por defecto hoy)")
+    parser.add_argument('--seed', type=int, default=42, help="Semilla para obtener siempre los mismos datos")
+    args = parser.parse_args()
+
+    print(f"🏗️ Generando {args.filas:,} filas para {args.locales} locales y {args.dias} días en {args.salida}...")
+    inicio = time.perf_counter()
+    insertadas = generar(args.salida, args.filas, args.locales, args.dias, args.hasta, seed=args.seed)
+    print(f"✅ {insertadas:,} filas generadas en {time.perf_counter() - inicio:.1f}s "
+          f"(para repetirlas: --seed {args.seed} --hasta {args.hasta.isoformat()})")
+    print("ℹ️ Para usarla: DB_BACKEND=sqlite "
+          f"DB_SQLITE_PATH={args.salida} python main.py")
+
+
+if __name__ == '__main__':
+    main()